@@ -0,0 +1,30 @@
+from wsi_service.api.v3.singletons import api_integration
+from wsi_service.custom_models.admin import SlideHandle, SlideHandleCache
+from wsi_service.utils.memory_utils import get_rss_bytes
+
+
+def add_routes_admin(app, settings, slide_manager):
+    @app.get("/admin/slide_handles", response_model=SlideHandleCache, tags=["Admin"])
+    async def _(payload=api_integration.global_depends()):
+        """
+        (Only if admin routes are enabled) Get the open slide handles of this worker, least recently used first,
+        with their estimated memory footprint.
+        """
+        slide_cache = slide_manager.slide_cache
+        handles = [
+            SlideHandle(
+                cache_id=cache_id,
+                plugin=exp_slide.slide.plugin,
+                filepath=exp_slide.slide.filepath,
+                memory_footprint=slide_cache.get_size(cache_id),
+            )
+            for cache_id, exp_slide in slide_cache.get_all().items()
+        ]
+        return SlideHandleCache(
+            handles=handles,
+            max_count=slide_cache.maxSize,
+            total_bytes=slide_cache.current_bytes,
+            max_bytes=slide_cache.max_bytes,
+            rss_bytes=get_rss_bytes(),
+            max_rss_bytes=slide_manager.max_rss_bytes,
+        )
@@ -2,6 +2,7 @@ from typing import List, Optional
 
 from fastapi import Query
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 from wsi_service.api.v3.singletons import api_integration, localmapper
 from wsi_service.custom_models.local_mapper_models import CaseLocalMapper, SlideLocalMapper, SlideStorage
@@ -61,5 +62,6 @@ def add_routes_local_mode(app, settings):
         """
         (Only in standalone mode) Refresh available files by scanning for new files.
         """
-        localmapper.refresh()
+        # scanning large data directories takes a while and must not block other requests
+        await run_in_threadpool(localmapper.refresh)
         return JSONResponse({"detail": "Local mapper has been refreshed."}, status_code=200)
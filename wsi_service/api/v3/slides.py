@@ -1,8 +1,9 @@
+from contextlib import nullcontext
+from functools import partial
 from typing import List
 
-from fastapi import Path
-from fastapi.responses import StreamingResponse
-from PIL import Image
+from fastapi import Path, Request
+from fastapi.responses import Response, StreamingResponse
 from zipfly import ZipFly
 from wsi_service.singletons import logger
 
@@ -17,8 +18,10 @@ from wsi_service.custom_models.queries import (
 from wsi_service.custom_models.responses import ImageRegionResponse, ImageResponses
 from wsi_service.models.v3.slide import SlideInfo
 from wsi_service.utils.app_utils import (
+    get_channel_selection,
     is_passthrough_format,
     make_response,
+    make_scaled_response,
     validate_hex_color_string,
     validate_image_channels,
     validate_image_level,
@@ -32,7 +35,11 @@ from wsi_service.custom_models.batch_queries import (
     TileXListQuery,
     TileYListQuery, IdListQuery2,
 )
+from wsi_service.tile_cache import CachedResponse, TileResponseCache, get_region_cache_key, get_tile_cache_key
+from wsi_service.tile_prefetcher import TilePrefetcher, get_viewer_key
+from wsi_service.utils.disk_cache_utils import DiskCache
 from wsi_service.utils.download_utils import expand_folders, get_zipfly_paths, remove_folders
+from wsi_service.utils.shared_cache_utils import SharedMemoryCache
 from wsi_service.utils.image_utils import (
     check_complete_region_overlap,
     check_complete_tile_overlap,
@@ -44,15 +51,33 @@ from .slides_batch_api_helpers import thumbnail, info, tile, macro, label, batch
 
 
 def add_routes_slides(app, settings, slide_manager):
+    shared_tile_cache = None
+    if settings.shared_tile_cache_max_bytes > 0:
+        shared_tile_cache = SharedMemoryCache(settings.shared_tile_cache_path, settings.shared_tile_cache_max_bytes)
+    disk_tile_cache = None
+    if settings.tile_cache_disk_dir:
+        disk_tile_cache = DiskCache(settings.tile_cache_disk_dir, settings.tile_cache_disk_max_bytes)
+    tile_cache = TileResponseCache(
+        settings.tile_cache_max_bytes, shared_cache=shared_tile_cache, disk_cache=disk_tile_cache
+    )
+    tile_prefetcher = None
+    if settings.tile_prefetch and tile_cache.enabled:
+        # prefetching must leave reader threads for foreground requests
+        tile_prefetcher = TilePrefetcher(
+            settings.tile_prefetch_max_in_flight, max(settings.executor_threads_per_plugin - 1, 1)
+        )
+
     @app.get("/slides/info", response_model=SlideInfo, tags=["Main Routes"])
     async def _(slide_id=IdQuery, plugin: str = PluginQuery, payload=api_integration.global_depends()):
         """
         Get metadata information for a slide given its ID
         """
-        slide = await slide_manager.get_slide_info(slide_id, slide_info_model=SlideInfo, plugin=plugin)
+        # returned as serialized by the slide manager (or read from the slide info store), the slide
+        # info is only parsed if an integration needs it
+        info_json, slide = await slide_manager.get_slide_info_json(slide_id, plugin=plugin)
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin, slide=slide)
-        return slide
+        return Response(info_json, media_type="application/json")
 
     @app.get(
         "/slides/thumbnail/max_size/{max_x}/{max_y}",
@@ -87,11 +112,13 @@ def add_routes_slides(app, settings, slide_manager):
         validate_image_request(image_format, image_quality)
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin)
-        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
-        thumbnail = await slide.get_thumbnail(
-            max_x, max_y, icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict
-        )
-        return make_response(slide, thumbnail, image_format, image_quality)
+        async with slide_manager.get_slide(slide_id, plugin=plugin) as slide:
+            thumbnail = await slide.get_thumbnail(
+                max_x, max_y, icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict
+            )
+            return await slide_manager.executor.run_sync(
+                slide.plugin, make_response, slide, thumbnail, image_format, image_quality
+            )
 
     @app.get(
         "/slides/label/max_size/{max_x}/{max_y}",
@@ -120,10 +147,11 @@ def add_routes_slides(app, settings, slide_manager):
         validate_image_request(image_format, image_quality)
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin)
-        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
-        label = await slide.get_label()
-        label.thumbnail((max_x, max_y), Image.Resampling.LANCZOS)
-        return make_response(slide, label, image_format, image_quality)
+        async with slide_manager.get_slide(slide_id, plugin=plugin) as slide:
+            label = await slide.get_label()
+            return await slide_manager.executor.run_sync(
+                slide.plugin, make_scaled_response, slide, label, max_x, max_y, image_format, image_quality
+            )
 
     @app.get(
         "/slides/macro/max_size/{max_x}/{max_y}",
@@ -154,10 +182,11 @@ def add_routes_slides(app, settings, slide_manager):
         validate_image_request(image_format, image_quality)
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin)
-        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
-        macro = await slide.get_macro(icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict)
-        macro.thumbnail((max_x, max_y), Image.Resampling.LANCZOS)
-        return make_response(slide, macro, image_format, image_quality)
+        async with slide_manager.get_slide(slide_id, plugin=plugin) as slide:
+            macro = await slide.get_macro(icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict)
+            return await slide_manager.executor.run_sync(
+                slide.plugin, make_scaled_response, slide, macro, max_x, max_y, image_format, image_quality
+            )
 
     @app.get(
         "/slides/region/level/{level}/start/{start_x}/{start_y}/size/{size_x}/{size_y}",
@@ -227,33 +256,66 @@ def add_routes_slides(app, settings, slide_manager):
         validate_image_size(size_x, size_y)
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin)
-        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
-        slide_info = await slide.get_info()
-        validate_image_level(slide_info, level)
-        validate_image_z(slide_info, z)
-        validate_image_channels(slide_info, image_channels)
-        if is_passthrough_format(image_format):
-            image_region = await slide.get_region(
-                level, start_x, start_y, size_x, size_y,
-                padding_color=vp_color, z=z,
-                icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
-            )
-        elif not settings.apply_padding or check_complete_region_overlap(
-                slide_info, level, start_x, start_y, size_x, size_y):
-            image_region = await slide.get_region(
-                level, start_x, start_y, size_x, size_y,
-                padding_color=vp_color, z=z,
-                icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
-            )
-        else:
-            # edge/out-of-bounds path: pick extend vs shrink based on settings
-            image_region = await get_extended_region(
-                slide.get_region, slide_info, level, start_x, start_y, size_x, size_y,
-                padding_color=vp_color, z=z,
-                icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
-                extend=True if settings.apply_padding else False,  # mirror tile behavior
+
+        request_key = get_region_cache_key(
+            slide_id, plugin, level, start_x, start_y, size_x, size_y, z, image_format, image_quality,
+            image_channels, vp_color, icc_profile_intent, icc_profile_strict,
+        )
+        use_cache = tile_cache.enabled and not is_passthrough_format(image_format)
+        if use_cache:
+            cached_response = await tile_cache.get(request_key, partial(slide_manager.get_slide_filepath, slide_id))
+            if cached_response is not None:
+                return cached_response.to_response()
+
+        cached_response = await slide_manager.in_flight.run(
+            request_key, read_region, request_key if use_cache else None, slide_id, level, start_x, start_y,
+            size_x, size_y, image_channels, z, vp_color, image_format, image_quality, icc_profile_intent,
+            icc_profile_strict, plugin,
+        )
+        return cached_response.to_response()
+
+    async def read_region(
+            cache_key, slide_id, level, start_x, start_y, size_x, size_y, image_channels, z, vp_color, image_format,
+            image_quality, icc_profile_intent, icc_profile_strict, plugin,
+    ):
+        async with slide_manager.get_slide(slide_id, plugin=plugin) as slide:
+            slide_info = await slide.get_info()
+            validate_image_level(slide_info, level)
+            validate_image_z(slide_info, z)
+            validate_image_channels(slide_info, image_channels)
+            # plugins supporting it only read the channels needed for the response
+            read_channels, response_channels = get_channel_selection(slide, slide_info, image_channels, image_format)
+            channel_kwargs = {} if read_channels is None else {"channels": read_channels}
+            if is_passthrough_format(image_format):
+                image_region = await slide.get_region(
+                    level, start_x, start_y, size_x, size_y,
+                    padding_color=vp_color, z=z,
+                    icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
+                )
+            elif not settings.apply_padding or check_complete_region_overlap(
+                    slide_info, level, start_x, start_y, size_x, size_y):
+                image_region = await slide.get_region(
+                    level, start_x, start_y, size_x, size_y,
+                    padding_color=vp_color, z=z,
+                    icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
+                    **channel_kwargs,
+                )
+            else:
+                # edge/out-of-bounds path: pick extend vs shrink based on settings
+                image_region = await get_extended_region(
+                    slide.get_region, slide_info, level, start_x, start_y, size_x, size_y,
+                    padding_color=vp_color, z=z,
+                    icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
+                    extend=True if settings.apply_padding else False,  # mirror tile behavior
+                    channels=read_channels,
+                )
+            response = await slide_manager.executor.run_sync(
+                slide.plugin, make_response, slide, image_region, image_format, image_quality, response_channels
             )
-        return make_response(slide, image_region, image_format, image_quality, image_channels)
+            if cache_key is not None:
+                tile_cache.put(cache_key, slide.filepath, response)
+            # the response is shared by all coalesced requests, each one sends its own copy
+            return CachedResponse.from_response(response)
 
     @app.get(
         "/slides/tile/level/{level}/tile/{tile_x}/{tile_y}",
@@ -275,6 +337,7 @@ def add_routes_slides(app, settings, slide_manager):
             icc_profile_strict: bool = ICCProfileIsStrictQuery,
             plugin: str = PluginQuery,
             payload=api_integration.global_depends(),
+            request: Request = None,
     ):
         """
         Get a tile of a slide given its ID and by providing the following parameters:
@@ -318,43 +381,112 @@ def add_routes_slides(app, settings, slide_manager):
         validate_image_request(image_format, image_quality)
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin)
-        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
-        slide_info = await slide.get_info()
-        validate_image_level(slide_info, level)
-        validate_image_z(slide_info, z)
-        validate_image_channels(slide_info, image_channels)
-
-        if is_passthrough_format(image_format):
-            image_tile = await slide.get_tile(
-                level, tile_x, tile_y,
-                padding_color=vp_color,
-                z=z,
-                icc_profile_intent=icc_profile_intent,
-                icc_profile_strict=icc_profile_strict,
+
+        request_key = get_tile_cache_key(
+            slide_id, plugin, level, tile_x, tile_y, z, image_format, image_quality, image_channels,
+            vp_color, icc_profile_intent, icc_profile_strict,
+        )
+        # encoded tiles are cached, passthrough data is returned as stored by the plugin anyway
+        use_cache = tile_cache.enabled and not is_passthrough_format(image_format)
+        if use_cache and tile_prefetcher is not None:
+            viewer_key = get_viewer_key(
+                request.client.host if request.client else None, request.headers.get("user-agent"), slide_id,
+                plugin, z, image_format, image_quality, image_channels, vp_color, icc_profile_intent,
+                icc_profile_strict,
             )
-        elif check_complete_tile_overlap(slide_info, level, tile_x, tile_y):
-            image_tile = await slide.get_tile(
-                level, tile_x, tile_y,
-                padding_color=vp_color,
-                z=z,
-                icc_profile_intent=icc_profile_intent,
-                icc_profile_strict=icc_profile_strict,
+            tile_prefetcher.tile_requested(
+                viewer_key, level, tile_x, tile_y,
+                partial(get_slide_info, slide_id, plugin),
+                partial(
+                    prefetch_tile, slide_id, image_channels, z, vp_color, image_format, image_quality,
+                    icc_profile_intent, icc_profile_strict, plugin,
+                ),
             )
-        elif settings.get_tile_apply_padding:
-            image_tile = await get_extended_tile(
-                slide.get_tile, slide_info, level, tile_x, tile_y,
-                padding_color=vp_color, z=z,
-                icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
-                extend=True,  # pad to full tile
+        if use_cache:
+            cached_response = await tile_cache.get(request_key, partial(slide_manager.get_slide_filepath, slide_id))
+            if cached_response is not None:
+                return cached_response.to_response()
+
+        with tile_prefetcher.foreground_read() if tile_prefetcher is not None else nullcontext():
+            cached_response = await slide_manager.in_flight.run(
+                request_key, read_tile, request_key if use_cache else None, slide_id, level, tile_x, tile_y,
+                image_channels, z, vp_color, image_format, image_quality, icc_profile_intent, icc_profile_strict,
+                plugin,
             )
-        else:
-            image_tile = await get_extended_tile(
-                slide.get_tile, slide_info, level, tile_x, tile_y,
-                padding_color=vp_color, z=z,
-                icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
-                extend=False,  # pad to full tile
+        return cached_response.to_response()
+
+    async def get_slide_info(slide_id, plugin):
+        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
+        return await slide.get_info()
+
+    async def prefetch_tile(
+            slide_id, image_channels, z, vp_color, image_format, image_quality, icc_profile_intent,
+            icc_profile_strict, plugin, level, tile_x, tile_y,
+    ):
+        cache_key = get_tile_cache_key(
+            slide_id, plugin, level, tile_x, tile_y, z, image_format, image_quality, image_channels,
+            vp_color, icc_profile_intent, icc_profile_strict,
+        )
+        if tile_cache.contains(cache_key):
+            return False
+        await slide_manager.in_flight.run(
+            cache_key, read_tile, cache_key, slide_id, level, tile_x, tile_y, image_channels, z, vp_color,
+            image_format, image_quality, icc_profile_intent, icc_profile_strict, plugin,
+        )
+        return True
+
+    async def read_tile(
+            cache_key, slide_id, level, tile_x, tile_y, image_channels, z, vp_color, image_format, image_quality,
+            icc_profile_intent, icc_profile_strict, plugin,
+    ):
+        async with slide_manager.get_slide(slide_id, plugin=plugin) as slide:
+            slide_info = await slide.get_info()
+            validate_image_level(slide_info, level)
+            validate_image_z(slide_info, z)
+            validate_image_channels(slide_info, image_channels)
+            # plugins supporting it only read the channels needed for the response
+            read_channels, response_channels = get_channel_selection(slide, slide_info, image_channels, image_format)
+            channel_kwargs = {} if read_channels is None else {"channels": read_channels}
+
+            if is_passthrough_format(image_format):
+                image_tile = await slide.get_tile(
+                    level, tile_x, tile_y,
+                    padding_color=vp_color,
+                    z=z,
+                    icc_profile_intent=icc_profile_intent,
+                    icc_profile_strict=icc_profile_strict,
+                )
+            elif check_complete_tile_overlap(slide_info, level, tile_x, tile_y):
+                image_tile = await slide.get_tile(
+                    level, tile_x, tile_y,
+                    padding_color=vp_color,
+                    z=z,
+                    icc_profile_intent=icc_profile_intent,
+                    icc_profile_strict=icc_profile_strict,
+                    **channel_kwargs,
+                )
+            elif settings.get_tile_apply_padding:
+                image_tile = await get_extended_tile(
+                    slide.get_tile, slide_info, level, tile_x, tile_y,
+                    padding_color=vp_color, z=z,
+                    icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
+                    extend=True,  # pad to full tile
+                    channels=read_channels,
+                )
+            else:
+                image_tile = await get_extended_tile(
+                    slide.get_tile, slide_info, level, tile_x, tile_y,
+                    padding_color=vp_color, z=z,
+                    icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
+                    extend=False,  # pad to full tile
+                    channels=read_channels,
+                )
+            response = await slide_manager.executor.run_sync(
+                slide.plugin, make_response, slide, image_tile, image_format, image_quality, response_channels
             )
-        return make_response(slide, image_tile, image_format, image_quality, image_channels)
+            if cache_key is not None:
+                tile_cache.put(cache_key, slide.filepath, response)
+            return CachedResponse.from_response(response)
 
     @app.get("/slides/download", tags=["Main Routes"])
     async def _(slide_id=IdQuery, plugin: str = PluginQuery, payload=api_integration.global_depends()):
@@ -385,9 +517,11 @@ def add_routes_slides(app, settings, slide_manager):
         """
         await api_integration.allow_access_slide(auth_payload=payload, slide_id=slide_id, manager=slide_manager,
                                                  plugin=plugin)
-        slide = await slide_manager.get_slide(slide_id, plugin=plugin)
-        profile = await slide.get_icc_profile()
-        return make_response(slide, profile, "raw", None, None)
+        async with slide_manager.get_slide(slide_id, plugin=plugin) as slide:
+            profile = await slide.get_icc_profile()
+            return await slide_manager.executor.run_sync(
+                slide.plugin, make_response, slide, profile, "raw", None, None
+            )
 
     ##
     # NEW API ALLOWING BATCH ACCESS
@@ -1,9 +1,10 @@
 from typing import List
 import asyncio
+from contextlib import AsyncExitStack
 
 from PIL import Image
+from starlette.responses import Response
 
-from wsi_service.models.v3.slide import SlideInfo
 from wsi_service.utils.app_utils import (
     validate_hex_color_string,
     validate_image_request,
@@ -24,13 +25,15 @@ async def info(paths: str, plugin: str, payload, slide_manager):
     Get metadata information for a slide set (see description above sister function)
     """
     slide_ids = paths.split(",")
-    requests = map(lambda sid: slide_manager.get_slide_info(sid, slide_info_model=SlideInfo, plugin=plugin),
-                   slide_ids)
-    slide_list = await asyncio.gather(*requests)
-    requests = [api_integration.allow_access_slide(auth_payload=payload, slide_id=slide.id, manager=slide_manager,
-                                                   plugin=plugin, slide=slide) for slide in slide_list]
+    await slide_manager.prefetch_storage_addresses(slide_ids)
+    # infos are returned as serialized by the slide manager (or read from the slide info store)
+    requests = map(lambda sid: slide_manager.get_slide_info_json(sid, plugin=plugin), slide_ids)
+    info_list = await asyncio.gather(*requests)
+    requests = [api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager,
+                                                   plugin=plugin, slide=slide)
+                for sid, (_, slide) in zip(slide_ids, info_list)]
     await asyncio.gather(*requests)
-    return slide_list
+    return Response("[" + ",".join(info_json for info_json, _ in info_list) + "]", media_type="application/json")
 
 
 async def thumbnail(
@@ -40,6 +43,7 @@ async def thumbnail(
     Get slide SET thumbnails image  given its ID. (see description above sister function)
     """
     slide_ids = paths.split(",")
+    await slide_manager.prefetch_storage_addresses(slide_ids)
     requests = [
         api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager, plugin=plugin)
         for sid in slide_ids
@@ -47,12 +51,15 @@ async def thumbnail(
     await asyncio.gather(*requests)
 
     validate_image_request(image_format, image_quality)
-    requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids)
-    slides = await asyncio.gather(*requests)
+    async with AsyncExitStack() as leases:
+        requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin, leases=leases), slide_ids)
+        slides = await asyncio.gather(*requests)
 
-    requests = map(lambda slide: slide.get_thumbnail(max_x, max_y, icc_profile_intent, icc_profile_strict), slides)
-    thumbnails = await asyncio.gather(*requests)
-    return batch_safe_make_response(slides, thumbnails, image_format, image_quality)
+        requests = map(lambda slide: slide.get_thumbnail(max_x, max_y, icc_profile_intent, icc_profile_strict), slides)
+        thumbnails = await asyncio.gather(*requests)
+        return await slide_manager.executor.run_sync(
+            None, batch_safe_make_response, slides, thumbnails, image_format, image_quality
+        )
 
 
 async def label(
@@ -69,6 +76,7 @@ async def label(
         Get the label image of a slide set given path(s). (see description above sister function)
         """
         slide_ids = paths.split(",")
+        await slide_manager.prefetch_storage_addresses(slide_ids)
         requests = [
             api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager, plugin=plugin)
             for sid in slide_ids
@@ -76,18 +84,21 @@ async def label(
         await asyncio.gather(*requests)
 
         validate_image_request(image_format, image_quality)
-        requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids)
-        slides = await asyncio.gather(*requests)
+        async with AsyncExitStack() as leases:
+            requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin, leases=leases), slide_ids)
+            slides = await asyncio.gather(*requests)
 
-        requests = map(lambda slide: slide.get_label(), slides)
-        labels = await asyncio.gather(*requests)
-        map(lambda l: l.thumbnail((max_x, max_y), Image.ANTIALIAS), labels)
-        return batch_safe_make_response(
-            slides,
-            labels,
-            image_format,
-            image_quality
-        )
+            requests = map(lambda slide: slide.get_label(), slides)
+            labels = await asyncio.gather(*requests)
+            map(lambda l: l.thumbnail((max_x, max_y), Image.ANTIALIAS), labels)
+            return await slide_manager.executor.run_sync(
+                None,
+                batch_safe_make_response,
+                slides,
+                labels,
+                image_format,
+                image_quality
+            )
 
 
 async def macro(
@@ -106,24 +117,28 @@ async def macro(
     Get the macro image of a slide set given path(s). (see description above sister function)
     """
     slide_ids = paths.split(",")
+    await slide_manager.prefetch_storage_addresses(slide_ids)
     requests = [
         api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager, plugin=plugin)
         for sid in slide_ids]
     await asyncio.gather(*requests)
 
     validate_image_request(image_format, image_quality)
-    requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids)
-    slides = await asyncio.gather(*requests)
+    async with AsyncExitStack() as leases:
+        requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin, leases=leases), slide_ids)
+        slides = await asyncio.gather(*requests)
 
-    requests = map(lambda slide: slide.get_macro(icc_profile_intent, icc_profile_strict), slides)
-    macros = await asyncio.gather(*requests)
-    map(lambda m: m.thumbnail((max_x, max_y), Image.ANTIALIAS), macros)
-    return batch_safe_make_response(
-        slides,
-        macros,
-        image_format,
-        image_quality
-    )
+        requests = map(lambda slide: slide.get_macro(icc_profile_intent, icc_profile_strict), slides)
+        macros = await asyncio.gather(*requests)
+        map(lambda m: m.thumbnail((max_x, max_y), Image.ANTIALIAS), macros)
+        return await slide_manager.executor.run_sync(
+            None,
+            batch_safe_make_response,
+            slides,
+            macros,
+            image_format,
+            image_quality
+        )
 
 
 async def tile(
@@ -146,6 +161,7 @@ async def tile(
     Get a tile of a slide given its path (see description above sister function)
     """
     slide_ids = paths.split(",")
+    await slide_manager.prefetch_storage_addresses(slide_ids)
     requests = [
         api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager, plugin=plugin)
         for sid in slide_ids]
@@ -154,17 +170,22 @@ async def tile(
     vp_color = validate_hex_color_string(padding_color)
     validate_image_request(image_format, image_quality)
 
-    requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids)
-    slides = await asyncio.gather(*requests)
+    async with AsyncExitStack() as leases:
+        requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin, leases=leases), slide_ids)
+        slides = await asyncio.gather(*requests)
 
-    requests = map(safe_get_slide_info, slides)
-    slide_infos = await asyncio.gather(*requests)
-    requests = map(lambda i: batch_safe_get_tile(slides[i], slide_infos[i],
-                                                 level, tile_x, tile_y,
-                                                 image_channels, vp_color, z, icc_profile_intent, icc_profile_strict),
-                   range(slides.__len__()))
-    regions = await asyncio.gather(*requests)
-    return batch_safe_make_response(slides, regions, image_format, image_quality, image_channels)
+        requests = map(safe_get_slide_info, slides)
+        slide_infos = await asyncio.gather(*requests)
+        requests = map(lambda i: batch_safe_get_tile(slides[i], slide_infos[i],
+                                                     level, tile_x, tile_y,
+                                                     image_channels, vp_color, z,
+                                                     icc_profile_intent, icc_profile_strict,
+                                                     in_flight=slide_manager.in_flight),
+                       range(slides.__len__()))
+        regions = await asyncio.gather(*requests)
+        return await slide_manager.executor.run_sync(
+            None, batch_safe_make_response, slides, regions, image_format, image_quality, image_channels
+        )
 
 
 async def batch(
@@ -187,6 +208,7 @@ async def batch(
     Get a tile of a slide given its path (see description above sister function)
     """
     slide_ids = paths.split(",")
+    await slide_manager.prefetch_storage_addresses(slide_ids)
     requests = [
         api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager, plugin=plugin)
         for sid in slide_ids]
@@ -194,22 +216,27 @@ async def batch(
 
     vp_color = validate_hex_color_string(padding_color)
     validate_image_request(image_format, image_quality)
-    requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids)
-    slides = await asyncio.gather(*requests)
+    async with AsyncExitStack() as leases:
+        requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin, leases=leases), slide_ids)
+        slides = await asyncio.gather(*requests)
 
-    requests = map(safe_get_slide_info, slides)
-    slide_infos = await asyncio.gather(*requests)
+        requests = map(safe_get_slide_info, slides)
+        slide_infos = await asyncio.gather(*requests)
 
-    xs = [int(x) for x in xs.split(',')]
-    ys = [int(x) for x in ys.split(',')]
-    levels = [int(x) for x in levels.split(',')]
-    requests = map(lambda i: batch_safe_get_tile(slides[i], slide_infos[i],
-                                                 levels[i], xs[i], ys[i],
-                                                 image_channels, vp_color, z, icc_profile_intent, icc_profile_strict),
-                   range(slides.__len__()))
+        xs = [int(x) for x in xs.split(',')]
+        ys = [int(x) for x in ys.split(',')]
+        levels = [int(x) for x in levels.split(',')]
+        requests = map(lambda i: batch_safe_get_tile(slides[i], slide_infos[i],
+                                                     levels[i], xs[i], ys[i],
+                                                     image_channels, vp_color, z,
+                                                     icc_profile_intent, icc_profile_strict,
+                                                     in_flight=slide_manager.in_flight),
+                       range(slides.__len__()))
 
-    regions = await asyncio.gather(*requests)
-    return batch_safe_make_response(slides, regions, image_format, image_quality, image_channels)
+        regions = await asyncio.gather(*requests)
+        return await slide_manager.executor.run_sync(
+            None, batch_safe_make_response, slides, regions, image_format, image_quality, image_channels
+        )
 
 
 async def icc_profile(
@@ -219,14 +246,18 @@ async def icc_profile(
         slide_manager
 ):
     slide_ids = paths.split(",")
+    await slide_manager.prefetch_storage_addresses(slide_ids)
     requests = [
         api_integration.allow_access_slide(auth_payload=payload, slide_id=sid, manager=slide_manager, plugin=plugin)
         for sid in slide_ids]
     await asyncio.gather(*requests)
 
-    requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids)
-    slides = await asyncio.gather(*requests)
+    async with AsyncExitStack() as leases:
+        requests = map(lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin, leases=leases), slide_ids)
+        slides = await asyncio.gather(*requests)
 
-    requests = map(safe_get_slide_icc_profile, slides)
-    profiles = await asyncio.gather(*requests)
-    return batch_safe_make_response(slides, profiles, "raw", None, None)
\ No newline at end of file
+        requests = map(safe_get_slide_icc_profile, slides)
+        profiles = await asyncio.gather(*requests)
+        return await slide_manager.executor.run_sync(
+            None, batch_safe_make_response, slides, profiles, "raw", None, None
+        )
\ No newline at end of file
@@ -19,6 +19,15 @@ slide_manager = SlideManager(
     settings.data_dir,
     settings.inactive_histo_image_timeout_seconds,
     settings.image_handle_cache_size,
+    settings.executor_threads_per_plugin,
+    settings.executor_max_concurrency_per_slide,
+    cache_max_bytes=settings.image_handle_cache_max_bytes,
+    max_rss_bytes=settings.max_rss_bytes,
+    connection_limit_per_host=settings.connection_limit_per_host,
+    mapper_cache_ttl=settings.mapper_cache_ttl_seconds,
+    mapper_not_found_ttl=settings.mapper_not_found_ttl_seconds,
+    mapper_bulk_address=settings.mapper_bulk_address,
+    slide_info_store_path=settings.slide_info_store_path,
 )
 
 
@@ -1,16 +1,13 @@
 import csv
-import hashlib
 import os
-import pickle
 import uuid
 
 from fastapi import HTTPException
-from filelock import FileLock
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from wsi_service.base_mapper import BaseMapper
 from wsi_service.custom_models.local_mapper_models import CaseLocalMapper, SlideLocalMapper
 from wsi_service.custom_models.old_v3.storage import SlideStorage, StorageAddress
+from wsi_service.local_mapper_index import IndexedMapper
 from wsi_service.singletons import logger
 from wsi_service.utils.app_utils import local_mode_collect_secondary_files_v3
 
@@ -90,7 +87,7 @@ def create_slide_object(settings, case, row, server_root):
     return slide
 
 
-class CSVMapper(BaseMapper):
+class CSVMapper(IndexedMapper):
     """
     CSV Mapper will read CSV file definitions: (indexes are configurable)
     GROUP_1       GROUP_2     SLIDE_ID     CASE        PATH
@@ -103,42 +100,22 @@ class CSVMapper(BaseMapper):
     of a case should be within same group_2 and group_1.
     """
 
+    case_model = IteratedCaseLocalMapper
+    slide_model = IteratedSlideLocalMapper
+
     def __init__(self, data_dir):
         self.settings = CSVMapperSettings()
         super().__init__(data_dir)
-        self.hash = None
-        self.case_map = {}
-        self.slide_map = {}
-        self.refresh(force_refresh=False)
-
-    def refresh(self, force_refresh=True):
-        with FileLock("local_mapper.lock"):
-            data_dir_changed = self._get_data_dir_changed()
-            if force_refresh or data_dir_changed or not os.path.exists("local_mapper.p"):
-                data = {}
-                try:
-                    self._read_csv_data()
-                except Exception as e:
-                    raise HTTPException(500, "Failed to parse the CSV file! Is your syntax correct?") from e
-
-                data["data_dir"] = self.data_dir
-                data["case_map"] = self.case_map
-                data["slide_map"] = self.slide_map
-                with open("local_mapper.p", "wb") as f:
-                    pickle.dump(data, f)
-        self.load()
-
-    def load(self):
-        updated_hash = self._get_updated_hash()
-        if self.hash != updated_hash:
-            with FileLock("local_mapper.lock"):
-                with open("local_mapper.p", "rb") as f:
-                    data = pickle.load(f)
-                    self.case_map = data["case_map"]
-                    self.slide_map = data["slide_map"]
-                self.hash = self._get_updated_hash()
-
-    def _read_csv_file(self, path):
+
+    def _update_index(self, full):
+        try:
+            case_map, slide_map = self._read_csv_data()
+        except Exception as e:
+            raise HTTPException(500, "Failed to parse the CSV file! Is your syntax correct?") from e
+        slides = [(case.id, slide_map[slide_id]) for case in case_map.values() for slide_id in case.slides]
+        self._write_index(cases=case_map.values(), slides=slides, replace=True)
+
+    def _read_csv_file(self, path, all_case_map, all_slide_map):
         settings = self.settings
         case_map = {}
         slide_map = {}
@@ -154,12 +131,12 @@ class CSVMapper(BaseMapper):
                 case.slides.append(slide.id)
                 slide_map[slide.id] = slide
         # successful: merge only now
-        self.case_map.update(case_map)
-        self.slide_map.update(slide_map)
+        all_case_map.update(case_map)
+        all_slide_map.update(slide_map)
 
     def _read_csv_data(self):
-        self.case_map = {}
-        self.slide_map = {}
+        case_map = {}
+        slide_map = {}
         path = self.settings.source
         if os.path.isdir(path):
             found_data = False
@@ -169,7 +146,7 @@ class CSVMapper(BaseMapper):
                     if file.endswith(".csv") or file.endswith(".tsv"):
                         try:
                             file_path = os.path.join(root, file)
-                            self._read_csv_file(file_path)
+                            self._read_csv_file(file_path, case_map, slide_map)
                             found_data = True
                         except Exception as e:
                             the_error = e
@@ -181,43 +158,11 @@ class CSVMapper(BaseMapper):
 
         elif os.path.isfile(path):
             try:
-                self._read_csv_file(path)
+                self._read_csv_file(path, case_map, slide_map)
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Target CSV data definition is not a valid file!") from e
 
         else:
             logger.error(f"Path {path} is neither a file nor a directory.")
             raise HTTPException(status_code=500, detail=f"Invalid CSV source data!")
-
-    def _get_updated_hash(self):
-        return hashlib.md5(open("local_mapper.p", "rb").read()).hexdigest()
-
-    def _get_data_dir_changed(self):
-        data_dir_changed = False
-        if os.path.exists("local_mapper.p"):
-            with open("local_mapper.p", "rb") as f:
-                data = pickle.load(f)
-                data_dir_changed = data["data_dir"] != self.data_dir
-        return data_dir_changed
-
-    def get_cases(self, context=None):
-        if context is not None:
-            logger.warning(f"CSVMapper: received unexpected context='{context}', ignoring.")
-        self.load()
-        return list(self.case_map.values())
-
-    def get_slides(self, case_id):
-        self.load()
-        if case_id not in self.case_map:
-            raise HTTPException(status_code=404, detail=f"Case with case_id {case_id} does not exist")
-        slide_data = []
-        for slide_id in sorted(self.case_map[case_id].slides):
-            slide_data.append(self.slide_map[slide_id])
-        return slide_data
-
-    def get_slide(self, slide_id):
-        if slide_id not in self.slide_map:
-            self.load()
-            if slide_id not in self.slide_map:
-                raise HTTPException(status_code=404, detail=f"Slide with slide_id {slide_id} does not exist")
-        return self.slide_map[slide_id]
+        return case_map, slide_map
@@ -0,0 +1,19 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class SlideHandle(BaseModel):
+    cache_id: str
+    plugin: str
+    filepath: str
+    memory_footprint: int
+
+
+class SlideHandleCache(BaseModel):
+    handles: List[SlideHandle]
+    max_count: int
+    total_bytes: int
+    max_bytes: int
+    rss_bytes: Optional[int]
+    max_rss_bytes: int
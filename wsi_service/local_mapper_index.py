@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import abstractmethod
+
+from fastapi import HTTPException
+from filelock import FileLock
+
+from wsi_service.base_mapper import BaseMapper
+from wsi_service.custom_models.local_mapper_models import CaseLocalMapper, SlideLocalMapper
+from wsi_service.singletons import logger, settings
+from wsi_service.utils.slide_utils import LRUCache
+
+# waiting time for locks held by other workers writing to the index
+_BUSY_TIMEOUT_SECONDS = 30
+# parsed slides kept by each mapper instance, local mode looks up the slide of every request
+SLIDE_CACHE_SIZE = 10_000
+
+
+class LocalMapperIndex:
+    """
+    Cases and slides of a local mapper in a SQLite database shared by all workers of a host.
+    Cases and slides are stored as JSON of their models, slides are indexed by id and by case id,
+    so lookups do not depend on the size of the catalog.
+
+    Every update increments a version stored with the index, readers compare it to the version
+    they last saw to find out cheaply whether their cached models are stale. The database runs in
+    WAL mode, so lookups are not blocked while another worker updates the index.
+    """
+
+    def __init__(self, path, case_model=CaseLocalMapper, slide_model=SlideLocalMapper):
+        self.path = path
+        self.case_model = case_model
+        self.slide_model = slide_model
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS cases (id TEXT PRIMARY KEY, model TEXT NOT NULL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS slides (id TEXT PRIMARY KEY, case_id TEXT NOT NULL, model TEXT NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS slides_case_id ON slides (case_id)")
+
+    def get_version(self):
+        return self.get_meta("version", 0)
+
+    def get_meta(self, key, default=None):
+        row = self._fetchone("SELECT value FROM meta WHERE key = ?", (key,))
+        return default if row is None else json.loads(row[0])
+
+    def get_cases(self):
+        """
+        Returns all cases in the order they were first added.
+        """
+        return [self.case_model.model_validate_json(row[0]) for row in self._fetchall("SELECT model FROM cases")]
+
+    def get_case(self, case_id):
+        row = self._fetchone("SELECT model FROM cases WHERE id = ?", (case_id,))
+        return None if row is None else self.case_model.model_validate_json(row[0])
+
+    def get_slides(self, case_id):
+        """
+        Returns the slides of a case sorted by slide id.
+        """
+        rows = self._fetchall("SELECT model FROM slides WHERE case_id = ? ORDER BY id", (case_id,))
+        return [self.slide_model.model_validate_json(row[0]) for row in rows]
+
+    def get_slide(self, slide_id):
+        row = self._fetchone("SELECT model FROM slides WHERE id = ?", (slide_id,))
+        return None if row is None else self.slide_model.model_validate_json(row[0])
+
+    def update(self, cases=(), slides=(), removed_case_ids=(), removed_slide_ids=(), meta=None, replace=False):
+        """
+        Applies all changes in one transaction and increments the version. slides are pairs of
+        case id and slide, removing a case removes its slides. With replace, all cases, slides
+        and meta values are removed first.
+        """
+        with self._lock, self._connection:
+            connection = self._connection
+            version = self._get_version_locked() + 1
+            if replace:
+                connection.execute("DELETE FROM meta")
+                connection.execute("DELETE FROM cases")
+                connection.execute("DELETE FROM slides")
+            connection.executemany("DELETE FROM slides WHERE id = ?", [(slide_id,) for slide_id in removed_slide_ids])
+            connection.executemany("DELETE FROM cases WHERE id = ?", [(case_id,) for case_id in removed_case_ids])
+            connection.executemany("DELETE FROM slides WHERE case_id = ?", [(case_id,) for case_id in removed_case_ids])
+            # upserts keep the row order of existing cases
+            connection.executemany(
+                "INSERT INTO cases (id, model) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET model = excluded.model",
+                [(case.id, case.model_dump_json()) for case in cases],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO slides (id, case_id, model) VALUES (?, ?, ?)",
+                [(slide.id, case_id, slide.model_dump_json()) for case_id, slide in slides],
+            )
+            meta = dict(meta or {}, version=version)
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in meta.items()],
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _get_version_locked(self):
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return 0 if row is None else json.loads(row[0])
+
+    def _fetchone(self, query, parameters=()):
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchone()
+
+    def _fetchall(self, query, parameters=()):
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+
+class IndexedMapper(BaseMapper):
+    """
+    Base class of context-independent local mappers storing their cases and slides in a
+    LocalMapperIndex at settings.local_mapper_index_path. Subclasses implement _update_index,
+    which is called by refresh if the index is missing, was built by another mapper or for
+    another data_dir, or if a refresh is forced.
+    """
+
+    case_model = CaseLocalMapper
+    slide_model = SlideLocalMapper
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.index = LocalMapperIndex(settings.local_mapper_index_path, self.case_model, self.slide_model)
+        self.version = None
+        self.cases = None
+        self.slide_cache = LRUCache(SLIDE_CACHE_SIZE)
+        self.refresh(force_refresh=False)
+
+    def refresh(self, force_refresh=True):
+        with FileLock(settings.local_mapper_index_path + ".lock"):
+            index_is_current = (
+                self.index.get_meta("mapper") == type(self).__name__
+                and self.index.get_meta("data_dir") == self.data_dir
+            )
+            if force_refresh or not index_is_current:
+                self._update_index(full=not index_is_current)
+        self.load()
+
+    def load(self):
+        version = self.index.get_version()
+        if self.version != version:
+            self.cases = None
+            self.slide_cache = LRUCache(SLIDE_CACHE_SIZE)
+            self.version = version
+
+    @abstractmethod
+    def _update_index(self, full):
+        """
+        Scans the data and updates the index with _write_index. If full, the index has to be
+        rebuilt, otherwise the data can be compared to the indexed cases and slides.
+        """
+        raise NotImplementedError
+
+    def _write_index(self, cases=(), slides=(), removed_case_ids=(), removed_slide_ids=(), meta=None, replace=False):
+        meta = dict(meta or {}, mapper=type(self).__name__, data_dir=self.data_dir)
+        self.index.update(cases, slides, removed_case_ids, removed_slide_ids, meta, replace)
+
+    def get_cases(self, context=None):
+        if context is not None:
+            logger.warning(f"{type(self).__name__}: received unexpected context='{context}', ignoring.")
+        self.load()
+        if self.cases is None:
+            self.cases = self.index.get_cases()
+        return list(self.cases)
+
+    def get_slides(self, case_id):
+        self.load()
+        if self.index.get_case(case_id) is None:
+            raise HTTPException(status_code=404, detail=f"Case with case_id {case_id} does not exist")
+        return self.index.get_slides(case_id)
+
+    def get_slide(self, slide_id):
+        self.load()
+        slide = self.slide_cache.get_item(slide_id)
+        if slide is None:
+            slide = self.index.get_slide(slide_id)
+            if slide is None:
+                raise HTTPException(status_code=404, detail=f"Slide with slide_id {slide_id} does not exist")
+            self.slide_cache.put_item(slide_id, slide)
+        return slide
@@ -2,13 +2,18 @@ import importlib
 import os
 import pathlib
 import pkgutil
+import threading
 from importlib.metadata import version as version_from_name
 
 from fastapi import HTTPException
 
+from wsi_service.custom_models.service_status import PluginInfo
 from wsi_service.singletons import logger
+from wsi_service.utils.slide_utils import LRUCache, get_file_fingerprint
+from wsi_service.utils.sniff_utils import get_file_sniff
 
-from wsi_service.custom_models.service_status import PluginInfo
+# number of paths for which the supporting plugins and the plugin that opened them are remembered
+RESOLUTION_CACHE_SIZE = 100_000
 
 plugins = {
     name.replace("wsi_service_plugin_", ""): importlib.import_module(name)
@@ -16,11 +21,25 @@ plugins = {
     if name.startswith("wsi_service_plugin_")
 }
 
+# path -> PluginResolution of the current file version
+_resolutions = LRUCache(RESOLUTION_CACHE_SIZE)
+_resolutions_lock = threading.Lock()
+
+
+class PluginResolution:
+    def __init__(self, fingerprint, supported_plugin_names):
+        self.fingerprint = fingerprint
+        self.supported_plugin_names = supported_plugin_names
+        # plugin that opened the file successfully, tried first for later opens
+        self.opened_with = None
+
+
 async def load_slide(filepath, plugin=None):
     if not (os.path.exists(filepath)):
         raise HTTPException(status_code=500, detail=f"File {filepath} not found.")
 
-    supported_plugins = _get_supported_plugins(filepath)
+    resolution = _get_resolution(filepath)
+    supported_plugins = {name: plugins[name] for name in resolution.supported_plugin_names}
     logger.info("Slide supports %s", supported_plugins)
 
     if len(supported_plugins) == 0:
@@ -36,10 +55,12 @@ async def load_slide(filepath, plugin=None):
             )
 
     exception_details = ""
-    for plugin_name, plugin in _get_sorted_plugins(supported_plugins):
+    for plugin_name, plugin in _get_sorted_plugins(supported_plugins, first=resolution.opened_with):
         try:
             logger.info("ATTEMPT TO USE %s", plugin_name)
-            return await _open_slide(plugin, plugin_name, filepath)
+            slide = await _open_slide(plugin, plugin_name, filepath)
+            resolution.opened_with = plugin_name
+            return slide
         except HTTPException as e:
             exception_details += e.detail + ". "
     raise HTTPException(status_code=500, detail=exception_details)
@@ -57,10 +78,24 @@ def get_plugins_overview():
 
 
 def is_supported_format(filepath):
-    return len(_get_supported_plugins(filepath)) > 0
+    return len(_get_resolution(filepath).supported_plugin_names) > 0
+
+
+def _get_resolution(filepath):
+    # the supporting plugins are determined once per file version, all plugins share one sniff of the file
+    fingerprint = get_file_fingerprint(filepath)
+    with _resolutions_lock:
+        resolution = _resolutions.get_item(filepath)
+    if resolution is None or resolution.fingerprint != fingerprint:
+        resolution = PluginResolution(fingerprint, list(_get_supported_plugins(filepath)))
+        with _resolutions_lock:
+            _resolutions.put_item(filepath, resolution)
+    return resolution
 
 
 def _get_supported_plugins(filepath):
+    # read once here, the is_supported checks of the plugins get the cached sniff
+    get_file_sniff(filepath)
     supported_plugins = {}
     for plugin_name, plugin in plugins.items():
         if _get_plugin_priority((plugin_name, plugin)) >= 0:
@@ -74,8 +109,10 @@ def _get_supported_plugins(filepath):
     return supported_plugins
 
 
-def _get_sorted_plugins(supported_plugins):
-    return sorted(supported_plugins.items(), key=_get_plugin_priority, reverse=True)
+def _get_sorted_plugins(supported_plugins, first=None):
+    sorted_plugins = sorted(supported_plugins.items(), key=_get_plugin_priority, reverse=True)
+    # sorting is stable, so the other plugins keep their order
+    return sorted(sorted_plugins, key=lambda plugin_item: plugin_item[0] != first)
 
 
 def _get_plugin_priority(plugin_item):
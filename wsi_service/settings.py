@@ -27,13 +27,55 @@ class Settings(BaseSettings):
     debug: bool = False
     data_dir: str = "/data"
     mapper_address: str = "http://localhost:8080/v3/slides/{slide_id}/storage"
+    # optional endpoint accepting a POST with a list of slide ids, returning a list of slide storages
+    mapper_bulk_address: str = ""
+    mapper_cache_ttl_seconds: int = 60
+    mapper_not_found_ttl_seconds: int = 10
     local_mode: str = ""  # path to a class that implements local mode
+    # SQLite index of the cases and slides of the local mapper, shared by all workers
+    local_mapper_index_path: str = "local_mapper.db"
+    # worker processes checking the formats of new files when the SimpleMapper scans data_dir
+    local_mapper_scan_workers: int = 8
     enable_local_routes: bool = True
     enable_viewer_routes: bool = True
     inactive_histo_image_timeout_seconds: int = 600
     image_handle_cache_size: int = 50
+    # limit for the estimated memory of all cached slide handles, 0 only limits their number
+    image_handle_cache_max_bytes: int = 4_000_000_000
+    # slide handles are closed if the resident memory of a worker exceeds this limit, 0 disables the check
+    max_rss_bytes: int = 0
+    # SQLite database for slide infos shared by all workers of a host, info requests of unchanged files
+    # do not open the slide, empty disables the store
+    slide_info_store_path: str = ""
+    enable_admin_routes: bool = False
     max_returned_region_size: int = 25_000_000  # e.g. 5000 x 5000
     max_thumbnail_size: int = 500
+    # blocking plugin calls run in a thread pool per plugin, each slide handle is limited to
+    # executor_max_concurrency_per_slide concurrent reads
+    executor_threads_per_plugin: int = 8
+    executor_max_concurrency_per_slide: int = 4
+    # size limit for encoded tiles cached in memory by each worker, 0 disables the cache
+    tile_cache_max_bytes: int = 128_000_000
+    # size limit for encoded tiles and regions cached in shared memory by all workers of a host, 0 disables it
+    shared_tile_cache_max_bytes: int = 0
+    shared_tile_cache_path: str = "/dev/shm/wsi_service_tile_cache"
+    # directory for encoded tiles and regions persisted across restarts, empty disables the disk cache
+    tile_cache_disk_dir: str = ""
+    tile_cache_disk_max_bytes: int = 10_000_000_000
+    # read tiles likely requested next by a viewer (neighbors, zoom levels) into the tile cache
+    tile_prefetch: bool = False
+    tile_prefetch_max_in_flight: int = 2
+    # directory (e.g. in /dev/shm) for decoded rasters of flat images (PIL plugin) shared by all workers
+    # of a host, empty keeps decoded rasters in each worker
+    raster_cache_dir: str = ""
+    raster_cache_max_bytes: int = 8_000_000_000
+    # threads per worker decoding the tiles of large regions in parallel (tifffile plugin)
+    tifffile_decode_threads: int = 4
+    # size limit for decoded tiles cached by each worker (tifffile plugin), 0 disables the cache
+    tifffile_tile_cache_max_bytes: int = 256_000_000
+    # directory for page indices of TIFF files (tifffile plugin), so later opens skip parsing all IFDs
+    # and the OME-XML, empty disables the index
+    tifffile_index_dir: str = ""
     root_path: str = ""
 
     # default color for padding of image regions out of image extent
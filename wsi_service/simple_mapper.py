@@ -1,119 +1,116 @@
-import hashlib
+import multiprocessing
 import os
-import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 from uuid import NAMESPACE_URL, uuid5
 
 from fastapi import HTTPException
-from filelock import FileLock
 
-from wsi_service.base_mapper import BaseMapper
 from wsi_service.custom_models.local_mapper_models import CaseLocalMapper, SlideLocalMapper
 from wsi_service.custom_models.old_v3.storage import SlideStorage, StorageAddress
+from wsi_service.local_mapper_index import IndexedMapper
 from wsi_service.plugins import is_supported_format
-from wsi_service.singletons import logger
+from wsi_service.singletons import logger, settings
 from wsi_service.utils.app_utils import local_mode_collect_secondary_files_v3
 
+# fewer files are checked in the scanning process, starting workers would take longer
+SCAN_POOL_MIN_FILES = 64
+# case folders modified this recently are scanned again on the next refresh, entries added in the
+# same tick of the file system clock as the scan would otherwise not change the recorded mtime
+RECENT_MTIME_NS = 2_000_000_000
 
-class SimpleMapper(BaseMapper):
-    def __init__(self, data_dir):
-        super().__init__(data_dir)
-        self.hash = None
-        self.case_map = {}
-        self.slide_map = {}
-        self.refresh(force_refresh=False)
 
-    def refresh(self, force_refresh=True):
-        with FileLock("local_mapper.lock"):
-            data_dir_changed = self._get_data_dir_changed()
-            if force_refresh or data_dir_changed or not os.path.exists("local_mapper.p"):
-                self._initialize_with_path(self.data_dir)
-                data = {}
-                data["data_dir"] = self.data_dir
-                data["case_map"] = self.case_map
-                data["slide_map"] = self.slide_map
-                with open("local_mapper.p", "wb") as f:
-                    pickle.dump(data, f)
-        self.load()
+def get_supported_files(filepaths, workers):
+    """
+    Returns for each path whether a plugin supports it, checked by a pool of worker processes if
+    there are enough files, as checks can open the files. Workers are started by a fork server,
+    forking the multi-threaded service could copy locks held by other threads into the workers.
+    """
+    if workers <= 1 or len(filepaths) < SCAN_POOL_MIN_FILES:
+        return [is_supported_format(filepath) for filepath in filepaths]
+    chunksize = max(1, min(64, len(filepaths) // (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver")) as pool:
+        return list(pool.map(is_supported_format, filepaths, chunksize=chunksize))
 
-    def load(self):
-        updated_hash = self._get_updated_hash()
-        if self.hash != updated_hash:
-            with FileLock("local_mapper.lock"):
-                with open("local_mapper.p", "rb") as f:
-                    data = pickle.load(f)
-                    self.case_map = data["case_map"]
-                    self.slide_map = data["slide_map"]
-                self.hash = self._get_updated_hash()
 
-    def _get_updated_hash(self):
-        return hashlib.md5(open("local_mapper.p", "rb").read()).hexdigest()
-
-    def _get_data_dir_changed(self):
-        data_dir_changed = False
-        if os.path.exists("local_mapper.p"):
-            with open("local_mapper.p", "rb") as f:
-                data = pickle.load(f)
-                data_dir_changed = data["data_dir"] != self.data_dir
-        return data_dir_changed
-
-    def _initialize_with_path(self, data_dir):
-        self.case_map = {}
-        self.slide_map = {}
+class SimpleMapper(IndexedMapper):
+    def _update_index(self, full):
+        """
+        Updates the index with the folders of data_dir as cases and their supported files as slides.
+        Only case folders whose mtime changed since the last scan are listed, so added and removed
+        files are found, but files replaced in place are not checked again.
+        """
+        data_dir = self.data_dir
         try:
-            self._collect_all_folders_as_cases(data_dir)
+            with os.scandir(data_dir) as it:
+                case_dirs = {entry.name: entry.stat().st_mtime_ns for entry in it if entry.is_dir()}
         except FileNotFoundError as e:
             raise HTTPException(status_code=404, detail=f"No such directory: {data_dir}") from e
-        for case_id, case in self.case_map.items():
-            case_dir = os.path.join(data_dir, case.local_id)
-            self._collect_all_files_as_slides(data_dir, case_id, case_dir)
-
-    def _collect_all_folders_as_cases(self, data_dir):
-        for sub_data_dir in os.listdir(data_dir):
-            absdir = os.path.join(data_dir, sub_data_dir)
-            if os.path.isdir(absdir):
-                case_id = uuid5(NAMESPACE_URL, sub_data_dir).hex
-                self.case_map[case_id] = CaseLocalMapper(id=case_id, local_id=sub_data_dir, slides=[])
+        cases = {} if full else {case.id: case for case in self.index.get_cases()}
+        # mtime of each scanned case folder by local case id, None if it has to be scanned again
+        case_mtimes = {} if full else self.index.get_meta("case_mtimes", {})
+        removed_case_ids = [case_id for case_id, case in cases.items() if case.local_id not in case_dirs]
+        for case_id in removed_case_ids:
+            case_mtimes.pop(cases.pop(case_id).local_id, None)
 
-    def _collect_all_files_as_slides(self, data_dir, case_id, case_dir):
-        local_case_id = self.case_map[case_id].local_id
-        for case_file in os.listdir(case_dir):
-            absfile = os.path.join(case_dir, case_file)
-            if is_supported_format(absfile):
-                slide_id = uuid5(NAMESPACE_URL, local_case_id + case_file).hex
-                if slide_id not in self.slide_map:
-                    self.case_map[case_id].slides.append(slide_id)
-                    addresses = local_mode_collect_secondary_files_v3(absfile, slide_id, slide_id, data_dir)
-                    logger.info(addresses)
+        scan_time = time.time_ns()
+        changed_cases = {}
+        removed_slide_ids = set()
+        new_files = []
+        for local_case_id, mtime in sorted(case_dirs.items()):
+            case_id = uuid5(NAMESPACE_URL, local_case_id).hex
+            case = cases.get(case_id)
+            if case is None:
+                case = CaseLocalMapper(id=case_id, local_id=local_case_id, slides=[])
+                indexed_files = {}
+            elif case_mtimes.get(local_case_id) == mtime:
+                continue
+            else:
+                indexed_files = {slide.local_id: slide.id for slide in self.index.get_slides(case_id)}
+            # the mtime is taken before listing, changes during the scan are found by the next one
+            case_mtimes[local_case_id] = mtime if scan_time - mtime > RECENT_MTIME_NS else None
+            case_files = set(os.listdir(os.path.join(data_dir, local_case_id)))
+            removed_slide_ids.update(slide_id for f, slide_id in indexed_files.items() if f not in case_files)
+            case.slides = [slide_id for slide_id in case.slides if slide_id not in removed_slide_ids]
+            changed_cases[case_id] = case
+            new_files += [(case, case_file) for case_file in sorted(case_files - indexed_files.keys())]
 
-                    # TODO: missing support for secondary storage addresses - download does not work
-                    self.slide_map[slide_id] = SlideLocalMapper(
-                        id=slide_id,
-                        local_id=case_file,
-                        slide_storage=SlideStorage(
-                            slide_id=slide_id,
-                            storage_type="fs",
-                            storage_addresses=addresses,
-                        ),
-                    )
+        filepaths = [os.path.join(data_dir, case.local_id, case_file) for case, case_file in new_files]
+        supported = get_supported_files(filepaths, settings.local_mapper_scan_workers)
+        added_slides = {}
+        for (case, case_file), filepath, is_supported in zip(new_files, filepaths, supported):
+            if not is_supported:
+                continue
+            slide_id = uuid5(NAMESPACE_URL, case.local_id + case_file).hex
+            # ids are not unique for all combinations of case folder and file names, the first slide is kept
+            if slide_id in added_slides or (
+                not full and slide_id not in removed_slide_ids and self.index.get_slide(slide_id) is not None
+            ):
+                continue
+            case.slides.append(slide_id)
+            added_slides[slide_id] = (case.id, self._create_slide(data_dir, slide_id, case_file, filepath))
 
-    def get_cases(self, context=None):
-        if context is not None:
-            logger.warning(f"SimpleMapper: received unexpected context='{context}', ignoring.")
-        self.load()
-        return list(self.case_map.values())
+        self._write_index(
+            cases=changed_cases.values(),
+            slides=added_slides.values(),
+            removed_case_ids=removed_case_ids,
+            removed_slide_ids=removed_slide_ids - added_slides.keys(),
+            meta={"case_mtimes": case_mtimes},
+            replace=full,
+        )
+        logger.info(f"SimpleMapper: checked {len(new_files)} new files of {len(case_dirs)} cases")
 
-    def get_slides(self, case_id):
-        self.load()
-        if case_id not in self.case_map:
-            raise HTTPException(status_code=404, detail=f"Case with case_id {case_id} does not exist")
-        slide_data = []
-        for slide_id in sorted(self.case_map[case_id].slides):
-            slide_data.append(self.slide_map[slide_id])
-        return slide_data
+    def _create_slide(self, data_dir, slide_id, case_file, absfile):
+        addresses = local_mode_collect_secondary_files_v3(absfile, slide_id, slide_id, data_dir)
+        logger.info(addresses)
 
-    def get_slide(self, slide_id):
-        if slide_id not in self.slide_map:
-            self.load()
-            if slide_id not in self.slide_map:
-                raise HTTPException(status_code=404, detail=f"Slide with slide_id {slide_id} does not exist")
-        return self.slide_map[slide_id]
+        # TODO: missing support for secondary storage addresses - download does not work
+        return SlideLocalMapper(
+            id=slide_id,
+            local_id=case_file,
+            slide_storage=SlideStorage(
+                slide_id=slide_id,
+                storage_type="fs",
+                storage_addresses=addresses,
+            ),
+        )
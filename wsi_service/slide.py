@@ -1,7 +1,15 @@
 from wsi_service.custom_models.queries import ICCProfileIntent
+from wsi_service.utils.memory_utils import get_image_nbytes
+
+# estimated memory used by an open slide handle without cached image data (file handles, metadata, indices)
+BASE_MEMORY_FOOTPRINT = 1024 * 1024
 
 
 class Slide(object):
+    # plugins returning multi-channel arrays can set this to accept a channels argument in get_region and
+    # get_tile, the returned array then only contains the given channels in the given order
+    supports_channel_selection = False
+
     @classmethod
     async def create(cls, filepath):
         self = cls()
@@ -18,6 +26,11 @@ class Slide(object):
     async def get_info(self):
         raise NotImplementedError
 
+    def get_memory_footprint(self):
+        # estimated bytes held by the open slide, used to limit the memory of cached slide handles,
+        # plugins holding decoded image data or internal caches should add their size
+        return BASE_MEMORY_FOOTPRINT + get_image_nbytes(getattr(self, "thumbnail", None))
+
     async def get_thumbnail(self, max_x, max_y, icc_profile_intent: ICCProfileIntent = None, icc_profile_strict: bool = False):
         # allowed to return pil image or numpy array
         raise NotImplementedError
@@ -1,6 +1,9 @@
 import asyncio
+import functools
 import os
 import pathlib
+import time
+from collections import Counter
 
 import aiohttp
 from fastapi import HTTPException
@@ -8,58 +11,142 @@ from fastapi import HTTPException
 from wsi_service.models.v3.slide import SlideInfo as SlideInfoV3
 from wsi_service.plugins import load_slide
 from wsi_service.singletons import logger
-from wsi_service.utils.slide_utils import ExpiringSlide, LRUCache
+from wsi_service.utils.executor_utils import PluginExecutor
+from wsi_service.utils.in_flight_utils import InFlightRequests
+from wsi_service.utils.memory_utils import get_rss_bytes
+from wsi_service.utils.slide_info_store_utils import SlideInfoStore
+from wsi_service.utils.slide_utils import ExpiringSlide, LRUCache, get_file_fingerprint
+
+# minimum interval between two checks of the resident memory of the process
+MEMORY_CHECK_INTERVAL = 5
+# maximum interval between two checks for inactive slides
+MAX_SWEEP_INTERVAL = 10
+
+
+class SlideLease:
+    """
+    Returned by SlideManager.get_slide. Used as async context manager, the slide is leased and not
+    closed (e.g. when evicted from the cache or inactive) before the context is left:
+
+        async with slide_manager.get_slide(slide_id) as slide:
+            tile = await slide.get_tile(...)
+
+    Awaiting it returns the slide without a lease, which is only safe for accessing metadata.
+    """
+
+    def __init__(self, slide_manager, slide_id, plugin):
+        self.slide_manager = slide_manager
+        self.slide_id = slide_id
+        self.plugin = plugin
+        self.exp_slide = None
+
+    def __await__(self):
+        return self._get_slide().__await__()
+
+    async def __aenter__(self):
+        self.exp_slide = await self.slide_manager._get_expiring_slide(self.slide_id, self.plugin, lease=True)
+        return self.exp_slide.slide
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.slide_manager._release_slide(self.exp_slide)
+
+    async def _get_slide(self):
+        exp_slide = await self.slide_manager._get_expiring_slide(self.slide_id, self.plugin, lease=False)
+        return exp_slide.slide
 
 
 class SlideManager:
-    def __init__(self, mapper_address, data_dir, timeout, cache_size):
+    def __init__(
+        self,
+        mapper_address,
+        data_dir,
+        timeout,
+        cache_size,
+        threads_per_plugin=8,
+        max_concurrency_per_slide=4,
+        cache_max_bytes=0,
+        max_rss_bytes=0,
+        connection_limit_per_host=100,
+        mapper_cache_ttl=60,
+        mapper_not_found_ttl=10,
+        mapper_cache_size=10_000,
+        mapper_bulk_address="",
+        slide_info_store_path="",
+    ):
         self.mapper_address = mapper_address
+        self.mapper_bulk_address = mapper_bulk_address
         self.data_dir = data_dir
         self.timeout = timeout
-        self.slide_cache = LRUCache(cache_size)
-        self.lock = asyncio.Lock()
-        self.storage_locks = {}
-        self.event_loop = asyncio.get_event_loop()
+        self.slide_cache = LRUCache(cache_size, max_bytes=cache_max_bytes)
+        # if the process exceeds this resident set size, least recently used slide handles are closed
+        self.max_rss_bytes = max_rss_bytes
+        self._last_memory_check = 0
+        self.executor = PluginExecutor(threads_per_plugin, max_concurrency_per_slide)
+        # slides that are currently being opened: cache_id -> task shared by all requests for the slide
+        self._opening = {}
+        self.stats = Counter()
+        # identical tile and region requests that are processed concurrently are only read once
+        self.in_flight = InFlightRequests()
+        # evicted slides that could not be closed yet because they are in use
+        self._evicted_in_use = set()
+        self._idle_sweeper = None
         self.local_mapper = None
+        # storage mapper responses: slide_id -> (expiration time, storage addresses or None if not found)
+        self.storage_addresses_cache = LRUCache(mapper_cache_size)
+        self.mapper_cache_ttl = mapper_cache_ttl
+        self.mapper_not_found_ttl = mapper_not_found_ttl
+        self.connection_limit_per_host = connection_limit_per_host
+        self._mapper_session = None
+        self._mapper_session_loop = None
+        # persistent slide infos answering info requests without opening the slide
+        self.slide_info_store = SlideInfoStore(slide_info_store_path) if slide_info_store_path else None
 
     def with_local_mapper(self, local_mapper):
         self.local_mapper = local_mapper
         return self
 
-    async def get_slide(self, slide_id, plugin=None):
-        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
-
-        async with self.lock:
-            if cache_id not in self.storage_locks:
-                self.storage_locks[cache_id] = asyncio.Lock()
-
-        exp_slide = self.slide_cache.get_item(cache_id)
-        if exp_slide is None:
-            main_storage_address = await self._get_slide_main_storage_address(slide_id)
-            storage_address = os.path.join(self.data_dir, main_storage_address["address"])
-            logger.debug("Storage address for slide %s: %s", slide_id, storage_address)
-
-            async with self.storage_locks[cache_id]:
-                slide = await load_slide(storage_address, plugin=plugin)
-                exp_slide = ExpiringSlide(slide)
-                removed_item = self.slide_cache.put_item(cache_id, exp_slide)
-                if removed_item:
-                    removed_item[1].timer.cancel()
-                    await removed_item[1].slide.close()
-                logger.debug("New slide handle opened for storage address: %s", storage_address)
+    def get_slide(self, slide_id, plugin=None):
+        return SlideLease(self, slide_id, plugin)
 
-        self._reset_slide_expiration(cache_id, exp_slide)
-
-        try:  # check if slide is up-to-date and update if supported
-            await exp_slide.slide.refresh()
-        except AttributeError:
-            pass
+    async def get_slide_info(self, slide_id, slide_info_model, plugin=None):
+        if self.slide_info_store is None:
+            return await self._read_slide_info(slide_id, slide_info_model, plugin)
+        info_json, slide_info = await self.get_slide_info_json(slide_id, plugin)
+        if slide_info is None:
+            slide_info = slide_info_model.model_validate_json(info_json)
+        return slide_info
 
-        return exp_slide.slide
+    async def get_slide_info_json(self, slide_id, plugin=None):
+        """
+        Returns the slide info serialized as JSON and the slide info, if the slide had to be read.
+        Infos found in the slide info store for the current version of the slide file are returned
+        as stored, without opening the slide and without the slide info (None).
+        """
+        if self.slide_info_store is None:
+            slide_info = await self._read_slide_info(slide_id, SlideInfoV3, plugin)
+            return slide_info.model_dump_json(), slide_info
+        filepath = await self.get_slide_filepath(slide_id)
+        fingerprint = get_file_fingerprint(filepath)
+        # the store is shared with other workers, its queries can wait for their writes
+        if fingerprint is not None:
+            info_json = await self.executor.run_sync(
+                None, self.slide_info_store.get, slide_id, plugin or "", filepath, fingerprint
+            )
+            if info_json is not None:
+                return info_json, None
+        self.stats["slide_info_store_misses"] += 1
+        slide_info = await self._read_slide_info(slide_id, SlideInfoV3, plugin)
+        info_json = slide_info.model_dump_json()
+        if fingerprint is not None:
+            await self.executor.run_sync(
+                None, self.slide_info_store.put, slide_id, plugin or "", filepath, fingerprint, info_json
+            )
+        return info_json, slide_info
 
-    async def get_slide_info(self, slide_id, slide_info_model, plugin=None):
+    async def _read_slide_info(self, slide_id, slide_info_model, plugin):
         slide = await self.get_slide(slide_id=slide_id, plugin=plugin)
-        slide_info = await slide.get_info()
+        # the info is kept by the slide handle, changes are made on a copy
+        slide_info = (await slide.get_info()).model_copy()
         # overwrite dummy id with actual slide id
         slide_info.id = slide_id
         # slide info conversion
@@ -71,50 +158,262 @@ class SlideManager:
                 slide_info.raw_download = True
         return slide_info
 
+    async def get_slide_filepath(self, slide_id):
+        main_storage_address = await self._get_slide_main_storage_address(slide_id)
+        return os.path.join(self.data_dir, main_storage_address["address"])
+
+    async def prefetch_storage_addresses(self, slide_ids):
+        """
+        Resolves the storage addresses of several slides at once, e.g. for batch routes.
+        With a bulk mapper address all uncached slides are resolved in a single request.
+        """
+        if self.local_mapper:
+            return
+        slide_ids = [
+            slide_id for slide_id in dict.fromkeys(slide_ids) if self._get_cached_storage_addresses(slide_id) is None
+        ]
+        if not slide_ids:
+            return
+        if self.mapper_bulk_address:
+            await self._fetch_storage_addresses_bulk(slide_ids)
+        else:
+            await asyncio.gather(*[self._get_slide_storage_addresses(s) for s in slide_ids], return_exceptions=True)
+
     async def get_slide_file_paths(self, slide_id):
         storage_addresses = await self._get_slide_storage_addresses(slide_id)
         return [os.path.join(self.data_dir, s["address"]) for s in storage_addresses]
 
     def close(self):
-        for cache_id, slide in self.slide_cache.get_all().items():
-            slide.timer.cancel()
-            self._sync_close_slide(cache_id)
+        if self._idle_sweeper is not None and not self._idle_sweeper.get_loop().is_closed():
+            self._idle_sweeper.cancel()
+        self._idle_sweeper = None
+        for cache_id in list(self.slide_cache.get_all()):
+            self._evict_slide(self.slide_cache.pop_item(cache_id))
+        self.executor.shutdown()
+        self._close_mapper_session()
+        if self.slide_info_store is not None:
+            self.slide_info_store.close()
+            self.slide_info_store = None
+
+    async def _get_expiring_slide(self, slide_id, plugin, lease):
+        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
+
+        exp_slide = self.slide_cache.get_item(cache_id)
+        # a slide that has been evicted and closed while waiting for it is opened again
+        while exp_slide is None or exp_slide.closed:
+            # single flight: concurrent requests for a slide that is not open yet share one open
+            task = self._opening.get(cache_id)
+            if task is None:
+                task = asyncio.ensure_future(self._open_slide(slide_id, cache_id, plugin))
+                self._opening[cache_id] = task
+                task.add_done_callback(functools.partial(self._finish_open, cache_id))
+            else:
+                self.stats["slide_open_waits"] += 1
+            # a cancelled request must not cancel the open for the other requests
+            exp_slide = await asyncio.shield(task)
+
+        if lease:
+            exp_slide.leases += 1
+        exp_slide.last_access = time.monotonic()
+        self._start_idle_sweeper()
+        self._check_memory_pressure()
+
+        try:  # check if slide is up-to-date and update if supported
+            await exp_slide.slide.refresh()
+        except AttributeError:
+            pass
+        except BaseException:
+            if lease:
+                self._release_slide(exp_slide)
+            raise
+
+        return exp_slide
+
+    def _release_slide(self, exp_slide):
+        exp_slide.leases -= 1
+        exp_slide.last_access = time.monotonic()
+        if exp_slide.evicted:
+            self._close_if_unused(exp_slide)
 
-    async def _set_storage_lock(self, cache_id):
-        async with self.lock:
-            if cache_id not in self.storage_locks:
-                self.storage_locks[cache_id] = asyncio.Lock()
+    def _is_in_use(self, exp_slide):
+        return exp_slide.leases > 0 or getattr(exp_slide.slide, "active_calls", 0) > 0
 
-    def _reset_slide_expiration(self, cache_id, expiring_slide):
-        if expiring_slide.timer is not None:
-            expiring_slide.timer.cancel()
-        expiring_slide.timer = self.event_loop.call_later(self.timeout, self._sync_close_slide, cache_id)
-        logger.debug("Set expiration timer for storage address (%s): %s", cache_id, self.timeout)
+    def _evict_slide(self, exp_slide):
+        # the slide has been removed from the slide cache
+        exp_slide.evicted = True
+        self._close_if_unused(exp_slide)
+
+    def _close_if_unused(self, exp_slide):
+        if exp_slide.closed:
+            return
+        if self._is_in_use(exp_slide):
+            self._evicted_in_use.add(exp_slide)
+            return
+        self._evicted_in_use.discard(exp_slide)
+        exp_slide.closed = True
+        asyncio.ensure_future(self._close_slide(exp_slide))
+
+    async def _close_slide(self, exp_slide):
+        try:
+            await exp_slide.slide.close()
+        except Exception as e:
+            logger.warning("Failed to close slide %s: %s", exp_slide.slide.filepath, e)
+            return
+        logger.debug("Closed slide with storage address: %s", exp_slide.slide.filepath)
+
+    def _start_idle_sweeper(self):
+        loop = asyncio.get_running_loop()
+        if self._idle_sweeper is None or self._idle_sweeper.done() or self._idle_sweeper.get_loop() is not loop:
+            self._idle_sweeper = loop.create_task(self._sweep_idle_slides())
+
+    async def _sweep_idle_slides(self):
+        # one periodic check for all slides instead of an expiration timer per slide and request
+        while True:
+            await asyncio.sleep(min(self.timeout / 4, MAX_SWEEP_INTERVAL))
+            self._close_idle_slides()
+
+    def _close_idle_slides(self):
+        expired = time.monotonic() - self.timeout
+        for cache_id, exp_slide in list(self.slide_cache.get_all().items()):
+            if exp_slide.last_access <= expired and not self._is_in_use(exp_slide):
+                logger.debug("Closing inactive slide: %s", cache_id)
+                self._evict_slide(self.slide_cache.pop_item(cache_id))
+        # reads in worker threads may have finished since their slides were evicted
+        for exp_slide in list(self._evicted_in_use):
+            self._close_if_unused(exp_slide)
+
+    def _finish_open(self, cache_id, task):
+        self._opening.pop(cache_id, None)
+        if not task.cancelled():
+            # mark the error as retrieved, in case all requests waiting for it have been cancelled
+            task.exception()
+
+    async def _open_slide(self, slide_id, cache_id, plugin):
+        self.stats["slide_opens"] += 1
+        try:
+            storage_address = await self.get_slide_filepath(slide_id)
+            logger.debug("Storage address for slide %s: %s", slide_id, storage_address)
+            slide = await self.executor.run(plugin, load_slide, storage_address, plugin=plugin)
+        except Exception:
+            self.stats["slide_open_errors"] += 1
+            raise
+        exp_slide = ExpiringSlide(self.executor.wrap(slide))
+        memory_footprint = exp_slide.slide.get_memory_footprint()
+        removed_items = self.slide_cache.put_item(cache_id, exp_slide, memory_footprint)
+        for _, removed_slide in removed_items:
+            self._evict_slide(removed_slide)
+        logger.debug(
+            "New slide handle opened for storage address: %s (estimated memory: %s bytes)",
+            storage_address,
+            memory_footprint,
+        )
+        return exp_slide
+
+    def _check_memory_pressure(self):
+        if not self.max_rss_bytes:
+            return
+        now = time.monotonic()
+        if now - self._last_memory_check < MEMORY_CHECK_INTERVAL:
+            return
+        self._last_memory_check = now
+        rss = get_rss_bytes()
+        if rss is None or rss <= self.max_rss_bytes:
+            return
+        # close least recently used handles until their estimated memory covers the excess,
+        # the most recently used handle is kept
+        excess = rss - self.max_rss_bytes
+        released = 0
+        cache_ids = list(self.slide_cache.get_all())[:-1]
+        for cache_id in cache_ids:
+            if released >= excess:
+                break
+            released += self.slide_cache.get_size(cache_id)
+            self._evict_slide(self.slide_cache.pop_item(cache_id))
+            self.stats["memory_pressure_closes"] += 1
+        logger.warning(
+            "Resident memory %s bytes exceeds limit of %s bytes, closing slide handles with estimated %s bytes",
+            rss,
+            self.max_rss_bytes,
+            released,
+        )
 
     async def _get_slide_storage_addresses(self, slide_id):
-        slide = None
         if self.local_mapper:
             slide = self.local_mapper.get_slide(slide_id)
             if not slide:
                 raise HTTPException(
                     status_code=404, detail=f"Could not find a storage address for slide id {slide_id}."
                 )
-            slide = slide.slide_storage.model_dump()
-        else:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(self.mapper_address.format(slide_id=slide_id)) as r:
-                        if r.status == 404:
-                            raise HTTPException(
-                                status_code=404, detail=f"Could not find a storage address for slide id {slide_id}."
-                            )
-                        slide = await r.json()
-            except aiohttp.ClientConnectorError:
-                raise HTTPException(
-                    status_code=503, detail="WSI Service is unable to connect to the Storage Mapper Service."
-                )
+            return slide.slide_storage.model_dump()["storage_addresses"]
+
+        cached = self._get_cached_storage_addresses(slide_id)
+        if cached is None:
+            storage_addresses = await self._fetch_storage_addresses(slide_id)
+            cached = self._cache_storage_addresses(slide_id, storage_addresses)
+        if cached[1] is None:
+            raise HTTPException(status_code=404, detail=f"Could not find a storage address for slide id {slide_id}.")
+        return cached[1]
+
+    async def _fetch_storage_addresses(self, slide_id):
+        try:
+            async with self._get_mapper_session().get(self.mapper_address.format(slide_id=slide_id)) as r:
+                if r.status == 404:
+                    return None
+                slide = await r.json()
+        except aiohttp.ClientConnectorError:
+            raise HTTPException(
+                status_code=503, detail="WSI Service is unable to connect to the Storage Mapper Service."
+            )
         return slide["storage_addresses"]
 
+    async def _fetch_storage_addresses_bulk(self, slide_ids):
+        try:
+            async with self._get_mapper_session().post(self.mapper_bulk_address, json=slide_ids) as r:
+                if r.status != 200:
+                    logger.warning("Bulk storage mapper request failed with status %s", r.status)
+                    return
+                slides = await r.json()
+        except aiohttp.ClientError as e:
+            logger.warning("Bulk storage mapper request failed: %s", e)
+            return
+        storage_addresses = {slide["slide_id"]: slide["storage_addresses"] for slide in slides}
+        for slide_id in slide_ids:
+            self._cache_storage_addresses(slide_id, storage_addresses.get(slide_id))
+
+    def _get_cached_storage_addresses(self, slide_id):
+        cached = self.storage_addresses_cache.get_item(slide_id)
+        if cached is None or cached[0] < time.monotonic():
+            return None
+        return cached
+
+    def _cache_storage_addresses(self, slide_id, storage_addresses):
+        ttl = self.mapper_cache_ttl if storage_addresses is not None else self.mapper_not_found_ttl
+        cached = (time.monotonic() + ttl, storage_addresses)
+        self.storage_addresses_cache.put_item(slide_id, cached)
+        return cached
+
+    def _get_mapper_session(self):
+        # one pooled session per event loop, (re)created lazily as it must be bound to the running loop
+        loop = asyncio.get_running_loop()
+        if self._mapper_session is None or self._mapper_session.closed or self._mapper_session_loop is not loop:
+            self._close_mapper_session()
+            connector = aiohttp.TCPConnector(limit_per_host=self.connection_limit_per_host)
+            self._mapper_session = aiohttp.ClientSession(connector=connector)
+            self._mapper_session_loop = loop
+        return self._mapper_session
+
+    def _close_mapper_session(self):
+        session, loop = self._mapper_session, self._mapper_session_loop
+        self._mapper_session = None
+        self._mapper_session_loop = None
+        if session is None or session.closed:
+            return
+        if loop.is_running() and loop is not asyncio.get_running_loop():
+            # the connections of the session are bound to its loop, which runs in another thread
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            asyncio.create_task(session.close())
+
     async def _get_slide_main_storage_address(self, slide_id):
         storage_addresses = await self._get_slide_storage_addresses(slide_id)
         for storage_address in storage_addresses:
@@ -122,16 +421,6 @@ class SlideManager:
                 return storage_address
         return storage_addresses[0]
 
-    def _sync_close_slide(self, cache_id):
-        asyncio.create_task(self._close_slide(cache_id))
-
-    async def _close_slide(self, cache_id):
-        if self.slide_cache.has_item(cache_id):
-            exp_slide = self.slide_cache.pop_item(cache_id)
-            self.storage_locks.pop(cache_id, None)
-            await exp_slide.slide.close()
-            logger.debug("Closed slide with storage address: %s", cache_id)
-
     def _convert_slide_info_to_match_slide_info_model(self, slide_info, slide_info_model):
         # V1 not supported: left for reference
         # if issubclass(slide_info_model, SlideInfoV1):
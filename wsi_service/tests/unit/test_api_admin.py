@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import wsi_service.app
+from wsi_service.api.v3.integrations.default import _unauthorized
+from wsi_service.singletons import settings
+from wsi_service.tests.unit.test_client import get_client_and_slide_manager
+from wsi_service.utils.slide_utils import ExpiringSlide
+
+
+def test_admin_slide_handles():
+    settings.enable_admin_routes = True
+    try:
+        client, slide_manager = get_client_and_slide_manager()
+    finally:
+        settings.enable_admin_routes = False
+    # skip authentication of the default integration
+    wsi_service.app.app_v3.dependency_overrides[_unauthorized] = lambda: None
+    slide = SimpleNamespace(plugin="tifffile", filepath="/data/testcase/CMU-1-small.tiff")
+    slide_manager.slide_cache.put_item("slide_id", ExpiringSlide(slide), 1234)
+
+    response = client.get("/v3/admin/slide_handles")
+    assert response.status_code == 200
+    slide_handles = response.json()
+    assert slide_handles["handles"] == [
+        {
+            "cache_id": "slide_id",
+            "plugin": "tifffile",
+            "filepath": "/data/testcase/CMU-1-small.tiff",
+            "memory_footprint": 1234,
+        }
+    ]
+    assert slide_handles["total_bytes"] == 1234
+    assert slide_handles["max_bytes"] == settings.image_handle_cache_max_bytes
+
+
+def test_admin_routes_disabled_by_default():
+    client, _ = get_client_and_slide_manager()
+    assert client.get("/v3/admin/slide_handles").status_code == 404
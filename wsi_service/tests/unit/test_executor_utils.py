@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from wsi_service.utils.executor_utils import PluginExecutor
+
+
+class DummySlide:
+    plugin = "dummy"
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.threads = set()
+
+    async def get_tile(self, level, tile_x, tile_y):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        self.active -= 1
+        return (level, tile_x, tile_y)
+
+    async def get_info(self):
+        return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_executor_slide_runs_reads_off_the_event_loop():
+    executor = PluginExecutor(threads_per_plugin=4, max_concurrency_per_slide=2)
+    slide = DummySlide()
+    wrapped = executor.wrap(slide)
+    try:
+        results = await asyncio.gather(*[wrapped.get_tile(0, i, 0) for i in range(6)])
+        assert results == [(0, i, 0) for i in range(6)]
+        assert slide.max_active == 2
+        assert all(name.startswith("wsi-dummy") for name in slide.threads)
+        # non reading methods are passed through and run on the event loop thread
+        assert await wrapped.get_info() == threading.current_thread().name
+        assert wrapped.unwrapped is slide
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_run_sync():
+    executor = PluginExecutor(threads_per_plugin=1, max_concurrency_per_slide=1)
+    try:
+        name = await executor.run_sync(None, lambda: threading.current_thread().name)
+        assert name.startswith("wsi-default")
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_reads_keep_their_slot_until_the_thread_has_finished():
+    executor = PluginExecutor(threads_per_plugin=4, max_concurrency_per_slide=1)
+    slide = DummySlide()
+    wrapped = executor.wrap(slide)
+    try:
+        cancelled = asyncio.ensure_future(wrapped.get_tile(0, 0, 0))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        assert await asyncio.gather(*[wrapped.get_tile(0, i, 0) for i in range(1, 3)]) == [(0, 1, 0), (0, 2, 0)]
+        assert slide.max_active == 1
+        assert wrapped.active_calls == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from wsi_service.utils.in_flight_utils import InFlightRequests
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_are_processed_once():
+    in_flight = InFlightRequests()
+    calls = []
+
+    async def read(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return f"result {key}"
+
+    results = await asyncio.gather(*[in_flight.run(key, read, key) for key in ["a", "b", "a", "a", "b"]])
+    assert results == ["result a", "result b", "result a", "result a", "result b"]
+    assert calls == ["a", "b"]
+    assert in_flight.coalesced == 3
+    assert in_flight.requests == {}
+
+    # finished requests are not kept
+    assert await in_flight.run("a", read, "a") == "result a"
+    assert calls == ["a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_passed_to_all_requests():
+    in_flight = InFlightRequests()
+
+    async def read():
+        await asyncio.sleep(0.05)
+        raise ValueError("read failed")
+
+    results = await asyncio.gather(*[in_flight.run("a", read) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_does_not_cancel_others():
+    in_flight = InFlightRequests()
+
+    async def read():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    first = asyncio.ensure_future(in_flight.run("a", read))
+    second = asyncio.ensure_future(in_flight.run("a", read))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "result"
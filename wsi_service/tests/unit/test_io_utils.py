@@ -0,0 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from wsi_service.utils.io_utils import PositionalFileReader
+
+
+def test_concurrent_positional_reads(tmp_path):
+    path = tmp_path / "data.bin"
+    content = bytes(range(256)) * 1024
+    path.write_bytes(content)
+    reader = PositionalFileReader(str(path))
+
+    ranges = [(offset, 1000) for offset in range(0, len(content), 997)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda r: reader.read(*r), ranges))
+    assert all(data == content[offset : offset + length] for (offset, length), data in zip(ranges, results))
+
+    # reads are short only at the end of the file
+    assert reader.read(len(content) - 10, 100) == content[-10:]
+    assert reader.read(len(content) + 10, 100) == b""
+    reader.close()
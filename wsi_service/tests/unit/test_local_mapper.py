@@ -4,6 +4,8 @@ import tempfile
 import pytest
 from fastapi import HTTPException
 
+from wsi_service import simple_mapper
+from wsi_service.local_mapper_index import IndexedMapper
 from wsi_service.simple_mapper import SimpleMapper
 
 
@@ -48,3 +50,79 @@ def test_get_cases_get_slides_valid():
     slide = localmapper.get_slide(slides[0].id)
     assert slide.id == slides[0].id
     assert slide.local_id == slides[0].local_id
+
+
+def test_refresh_only_scans_changed_cases(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checked = []
+
+    def is_supported_format(filepath):
+        checked.append(os.path.basename(filepath))
+        return filepath.endswith(".tif")
+
+    monkeypatch.setattr(simple_mapper, "is_supported_format", is_supported_format)
+    data_dir = tmp_path / "data"
+    for case in ["case0", "case1"]:
+        (data_dir / case).mkdir(parents=True)
+        (data_dir / case / f"{case}.tif").write_bytes(b"")
+        (data_dir / case / "notes.txt").write_bytes(b"")
+        # older than the file system clock tick of the scan
+        os.utime(data_dir / case, ns=(1_000_000_000, 1_000_000_000))
+    localmapper = SimpleMapper(str(data_dir))
+    assert sorted(checked) == ["case0.tif", "case1.tif", "notes.txt", "notes.txt"]
+    case_ids = {case.local_id: case.id for case in localmapper.get_cases()}
+    assert [slide.local_id for slide in localmapper.get_slides(case_ids["case0"])] == ["case0.tif"]
+
+    checked.clear()
+    localmapper.refresh()
+    assert checked == []
+
+    (data_dir / "case0" / "case0.tif").unlink()
+    (data_dir / "case0" / "new.tif").write_bytes(b"")
+    os.utime(data_dir / "case0", ns=(2_000_000_000, 2_000_000_000))
+    localmapper.refresh()
+    # only the changed case is listed, slides of removed files are dropped
+    assert sorted(checked) == ["new.tif", "notes.txt"]
+    assert [slide.local_id for slide in localmapper.get_slides(case_ids["case0"])] == ["new.tif"]
+    assert len(localmapper.get_slides(case_ids["case1"])) == 1
+    assert len(localmapper.get_slides(case_ids["case0"])) + len(localmapper.get_slides(case_ids["case1"])) == 2
+
+    (data_dir / "case1" / "case1.tif").unlink()
+    (data_dir / "case1" / "notes.txt").unlink()
+    (data_dir / "case1").rmdir()
+    localmapper.refresh()
+    assert [case.local_id for case in localmapper.get_cases()] == ["case0"]
+    assert localmapper.index.get_slides(case_ids["case1"]) == []
+
+
+def test_mappers_share_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    (data_dir / "case0").mkdir(parents=True)
+    first_mapper = SimpleMapper(str(data_dir))
+    second_mapper = SimpleMapper(str(data_dir))
+    assert len(second_mapper.get_cases()) == 1
+    version = second_mapper.version
+
+    (data_dir / "case1").mkdir()
+    first_mapper.refresh()
+    # the other worker finds the new case by the incremented version of the index
+    assert len(second_mapper.get_cases()) == 2
+    assert second_mapper.version > version
+
+    # a mapper for another data directory rebuilds the index
+    (tmp_path / "other" / "case2").mkdir(parents=True)
+    other_mapper = SimpleMapper(str(tmp_path / "other"))
+    assert [case.local_id for case in other_mapper.get_cases()] == ["case2"]
+    with pytest.raises(HTTPException):
+        other_mapper.get_slide("missing")
+
+
+def test_indexed_mapper_requires_update_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class IncompleteMapper(IndexedMapper):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteMapper(str(tmp_path))
@@ -1,4 +1,10 @@
-from wsi_service.plugins import plugins
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from wsi_service import plugins as plugins_module
+from wsi_service.plugins import is_supported_format, load_slide, plugins
 
 
 def test_check_available_base_plugins():
@@ -7,3 +13,41 @@ def test_check_available_base_plugins():
     assert "pil" in plugins.keys()
     assert "tifffile" in plugins.keys()
     assert "wsidicom" in plugins.keys()
+
+
+@pytest.mark.asyncio
+async def test_plugin_resolution_is_remembered(tmp_path, monkeypatch):
+    calls = []
+
+    def make_plugin(name, priority, fails):
+        def is_supported(filepath):
+            calls.append(("is_supported", name))
+            return True
+
+        async def open(filepath):
+            calls.append(("open", name))
+            if fails:
+                raise HTTPException(status_code=500, detail="unsupported")
+            return SimpleNamespace()
+
+        return SimpleNamespace(priority=priority, is_supported=is_supported, open=open)
+
+    monkeypatch.setattr(
+        plugins_module, "plugins", {"first": make_plugin("first", 2, True), "second": make_plugin("second", 1, False)}
+    )
+    path = tmp_path / "slide.tif"
+    path.write_bytes(b"slide")
+
+    assert (await load_slide(str(path))).plugin == "second"
+    assert calls == [("is_supported", "first"), ("is_supported", "second"), ("open", "first"), ("open", "second")]
+    calls.clear()
+    # supporting plugins are not checked again and the plugin that opened the file is tried first
+    assert is_supported_format(str(path))
+    assert (await load_slide(str(path))).plugin == "second"
+    assert calls == [("open", "second")]
+
+    # changed files are resolved again
+    calls.clear()
+    path.write_bytes(b"changed slide")
+    assert is_supported_format(str(path))
+    assert calls == [("is_supported", "first"), ("is_supported", "second")]
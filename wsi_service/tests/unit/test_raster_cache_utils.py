@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+from wsi_service.utils.raster_cache_utils import SharedRasterCache
+
+
+def test_rasters_are_decoded_once_and_mapped(tmp_path):
+    source = tmp_path / "image.png"
+    source.write_bytes(b"image")
+    cache = SharedRasterCache(str(tmp_path / "rasters"), 1000)
+    decoded = []
+
+    def decode():
+        decoded.append(True)
+        return np.full((4, 5, 3), 7, dtype=np.uint8)
+
+    raster = cache.get(str(source), 0, (4, 5, 3), decode)
+    assert isinstance(raster, np.memmap)
+    assert not raster.flags.writeable
+    assert raster.shape == (4, 5, 3) and (raster == 7).all()
+    assert cache.get(str(source), 0, (4, 5, 3), decode) is not None
+    assert len(decoded) == 1
+
+    # changed source files are decoded again
+    source.write_bytes(b"changed image")
+    assert cache.get(str(source), 0, (4, 5, 3), decode) is not None
+    assert len(decoded) == 2
+
+
+def test_least_recently_used_rasters_are_removed(tmp_path):
+    source = tmp_path / "image.png"
+    source.write_bytes(b"image")
+    directory = tmp_path / "rasters"
+    cache = SharedRasterCache(str(directory), 250)
+    for level in range(3):
+        cache.get(str(source), level, (10, 10, 1), lambda: np.zeros((10, 10, 1), dtype=np.uint8))
+        # distinct access times
+        for entry in os.scandir(directory):
+            os.utime(entry.path, (level, level))
+    rasters = [name for name in os.listdir(directory) if name.endswith(".raw")]
+    assert len(rasters) == 2
+
+    # rasters larger than the cache are not cached
+    assert cache.get(str(source), 3, (20, 20, 1), lambda: np.zeros((20, 20, 1), dtype=np.uint8)) is None
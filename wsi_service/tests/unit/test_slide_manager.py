@@ -3,7 +3,10 @@ import asyncio
 import pytest
 from fastapi.exceptions import HTTPException
 
+from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlideLevel, SlidePixelSizeNm
+from wsi_service.slide_manager import SlideManager
 from wsi_service.tests.unit.test_client import get_client_and_slide_manager
+from wsi_service.utils.slide_utils import get_rgb_channel_list
 
 
 @pytest.mark.asyncio
@@ -77,3 +80,241 @@ async def test_exceed_cache_limit(aioresponses):
             assert slide_manager.slide_cache.has_item(
                 f"/wsi-service/wsi_service/tests/unit/data/testcase/CMU-{i}-small.tiff"
             )
+
+
+def get_storage_payload(slide_id):
+    return {
+        "slide_id": slide_id,
+        "storage_type": "fs",
+        "storage_addresses": [
+            {
+                "address": "testcase/CMU-1-small.tiff",
+                "main_address": True,
+                "storage_address_id": f"{slide_id}-address",
+                "slide_id": slide_id,
+            }
+        ],
+    }
+
+
+@pytest.mark.asyncio
+async def test_storage_mapper_lookups_are_cached(aioresponses):
+    # each mocked response is only returned once, a second request would fail
+    aioresponses.get("http://mapper/slides/found", status=200, payload=get_storage_payload("found"))
+    aioresponses.get("http://mapper/slides/missing", status=404)
+    slide_manager = SlideManager("http://mapper/slides/{slide_id}", "/data", timeout=60, cache_size=1)
+
+    for _ in range(2):
+        assert await slide_manager.get_slide_filepath("found") == "/data/testcase/CMU-1-small.tiff"
+        with pytest.raises(HTTPException) as e:
+            await slide_manager.get_slide_filepath("missing")
+        assert e.value.status_code == 404
+    slide_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_storage_mapper_bulk_lookup(aioresponses):
+    aioresponses.post("http://mapper/slides", status=200, payload=[get_storage_payload("a"), get_storage_payload("b")])
+    slide_manager = SlideManager(
+        "http://mapper/slides/{slide_id}", "/data", timeout=60, cache_size=1, mapper_bulk_address="http://mapper/slides"
+    )
+
+    await slide_manager.prefetch_storage_addresses(["a", "b", "c", "a"])
+    assert await slide_manager.get_slide_filepath("a") == "/data/testcase/CMU-1-small.tiff"
+    assert await slide_manager.get_slide_filepath("b") == "/data/testcase/CMU-1-small.tiff"
+    with pytest.raises(HTTPException) as e:
+        await slide_manager.get_slide_filepath("c")
+    assert e.value.status_code == 404
+    slide_manager.close()
+
+
+def test_mapper_session_of_previous_event_loop_is_closed():
+    slide_manager = SlideManager("http://mapper/slides/{slide_id}", "/data", timeout=60, cache_size=1)
+
+    async def get_mapper_session():
+        session = slide_manager._get_mapper_session()
+        await asyncio.sleep(0.01)
+        return session
+
+    first_session = asyncio.run(get_mapper_session())
+    second_session = asyncio.run(get_mapper_session())
+    assert second_session is not first_session
+    assert first_session.closed
+    assert not second_session.closed
+
+    async def close():
+        slide_manager.close()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(close())
+    assert second_session.closed
+
+
+class DummySlide:
+    plugin = "dummy"
+    filepath = "dummy"
+
+    def __init__(self, memory_footprint=0):
+        self.memory_footprint = memory_footprint
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    def get_memory_footprint(self):
+        return self.memory_footprint
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_slide_open(monkeypatch):
+    opened = []
+
+    async def load_slide(filepath, plugin=None):
+        opened.append(filepath)
+        await asyncio.sleep(0.1)
+        if "broken" in filepath:
+            raise HTTPException(status_code=422, detail="Broken slide")
+        return DummySlide()
+
+    async def get_slide_filepath(slide_id):
+        return f"/data/{slide_id}.tiff"
+
+    monkeypatch.setattr("wsi_service.slide_manager.load_slide", load_slide)
+    slide_manager = SlideManager("", "/data", timeout=60, cache_size=2)
+    monkeypatch.setattr(slide_manager, "get_slide_filepath", get_slide_filepath)
+
+    slides = await asyncio.gather(*[slide_manager.get_slide("a") for _ in range(10)])
+    assert opened == ["/data/a.tiff"]
+    assert all(slide.unwrapped is slides[0].unwrapped for slide in slides)
+
+    results = await asyncio.gather(*[slide_manager.get_slide("broken") for _ in range(5)], return_exceptions=True)
+    assert opened == ["/data/a.tiff", "/data/broken.tiff"]
+    assert all(isinstance(r, HTTPException) and r.status_code == 422 for r in results)
+    assert slide_manager.stats["slide_opens"] == 2
+    assert slide_manager.stats["slide_open_waits"] == 13
+    assert slide_manager.stats["slide_open_errors"] == 1
+    slide_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_slide_handles_are_limited_by_memory(monkeypatch):
+    footprints = {"small": 10, "medium": 40, "large": 80}
+    slides = {}
+
+    async def load_slide(filepath, plugin=None):
+        slides[filepath] = DummySlide(footprints[filepath])
+        return slides[filepath]
+
+    async def get_slide_filepath(slide_id):
+        return slide_id
+
+    monkeypatch.setattr("wsi_service.slide_manager.load_slide", load_slide)
+    slide_manager = SlideManager("", "/data", timeout=60, cache_size=10, cache_max_bytes=100)
+    monkeypatch.setattr(slide_manager, "get_slide_filepath", get_slide_filepath)
+
+    await slide_manager.get_slide("small")
+    await slide_manager.get_slide("medium")
+    assert slide_manager.slide_cache.current_bytes == 50
+    await slide_manager.get_slide("large")
+    assert list(slide_manager.slide_cache.get_all()) == ["large"]
+    await asyncio.sleep(0)
+    assert slides["small"].closed and slides["medium"].closed
+    slide_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_leased_slides_are_not_closed(monkeypatch):
+    slides = {}
+
+    async def load_slide(filepath, plugin=None):
+        slides[filepath] = DummySlide()
+        return slides[filepath]
+
+    async def get_slide_filepath(slide_id):
+        return slide_id
+
+    monkeypatch.setattr("wsi_service.slide_manager.load_slide", load_slide)
+    slide_manager = SlideManager("", "/data", timeout=0.2, cache_size=1)
+    monkeypatch.setattr(slide_manager, "get_slide_filepath", get_slide_filepath)
+
+    async with slide_manager.get_slide("a") as slide:
+        # evicted while in use
+        await slide_manager.get_slide("b")
+        await asyncio.sleep(0)
+        assert not slide.closed
+    await asyncio.sleep(0)
+    assert slides["a"].closed
+
+    # inactive slides are closed by the sweeper unless they are in use
+    async with slide_manager.get_slide("b"):
+        await asyncio.sleep(0.4)
+        assert not slides["b"].closed
+    await asyncio.sleep(0.35)
+    assert slides["b"].closed
+    assert len(slide_manager.slide_cache.get_all()) == 0
+    slide_manager.close()
+
+
+class DummyInfoSlide(DummySlide):
+    def __init__(self, filepath):
+        super().__init__()
+        self.filepath = filepath
+        self.slide_info = SlideInfo(
+            id="",
+            channels=get_rgb_channel_list(),
+            channel_depth=8,
+            extent=SlideExtent(x=100, y=50, z=1),
+            num_levels=1,
+            pixel_size_nm=SlidePixelSizeNm(x=500, y=500),
+            tile_extent=SlideExtent(x=256, y=256, z=1),
+            levels=[SlideLevel(extent=SlideExtent(x=100, y=50, z=1), downsample_factor=1)],
+            format="",
+        )
+
+    async def get_info(self):
+        return self.slide_info
+
+
+@pytest.mark.asyncio
+async def test_slide_infos_are_served_from_store(tmp_path, monkeypatch):
+    opened = []
+    filepath = tmp_path / "a.tiff"
+    filepath.write_bytes(b"slide")
+
+    async def load_slide(filepath, plugin=None):
+        opened.append(filepath)
+        return DummyInfoSlide(filepath)
+
+    async def get_slide_filepath(slide_id):
+        return str(filepath)
+
+    monkeypatch.setattr("wsi_service.slide_manager.load_slide", load_slide)
+    store_path = str(tmp_path / "slide_info.sqlite")
+    slide_managers = []
+    for _ in range(2):
+        # e.g. two workers or restarts
+        slide_manager = SlideManager("", str(tmp_path), timeout=60, cache_size=2, slide_info_store_path=store_path)
+        monkeypatch.setattr(slide_manager, "get_slide_filepath", get_slide_filepath)
+        slide_managers.append(slide_manager)
+
+    slide_info = await slide_managers[0].get_slide_info("a", slide_info_model=SlideInfo)
+    assert slide_info.id == "a" and slide_info.format == "file-tiff-dummy" and slide_info.raw_download
+    # the info held by the slide handle is not changed
+    assert (await (await slide_managers[0].get_slide("a")).get_info()).id == ""
+
+    # stored infos are returned as stored, without reading the slide
+    info_json, stored_slide_info = await slide_managers[1].get_slide_info_json("a")
+    assert info_json == slide_info.model_dump_json() and stored_slide_info is None
+    assert await slide_managers[1].get_slide_info("a", slide_info_model=SlideInfo) == slide_info
+    assert opened == [str(filepath)]
+
+    # several slide ids can be mapped to the same file
+    assert (await slide_managers[1].get_slide_info("b", slide_info_model=SlideInfo)).id == "b"
+    assert len(opened) == 2
+
+    # changed files are opened again
+    filepath.write_bytes(b"changed slide")
+    await slide_managers[1].get_slide_info("a", slide_info_model=SlideInfo)
+    assert len(opened) == 3
+    for slide_manager in slide_managers:
+        slide_manager.close()
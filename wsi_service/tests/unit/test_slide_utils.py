@@ -1,4 +1,4 @@
-from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
+from wsi_service.utils.slide_utils import LRUCache, get_original_levels, get_rgb_channel_list
 
 
 def test_get_original_levels():
@@ -27,3 +27,17 @@ def test_get_rgb_channel_list():
         assert channels[i].color.g == rgba[i][1]
         assert channels[i].color.b == rgba[i][2]
         assert channels[i].color.a == rgba[i][3]
+
+
+def test_lru_cache_byte_budget():
+    cache = LRUCache(10, max_bytes=100)
+    assert cache.put_item("a", "A", 40) == []
+    assert cache.put_item("b", "B", 40) == []
+    cache.get_item("a")
+    assert cache.put_item("c", "C", 40) == [("b", "B")]
+    assert cache.current_bytes == 80
+    # an item exceeding the budget evicts all others but is kept itself
+    assert cache.put_item("d", "D", 500) == [("a", "A"), ("c", "C")]
+    assert list(cache.get_all()) == ["d"]
+    cache.pop_item("d")
+    assert cache.current_bytes == 0
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import tifffile
+
+from wsi_service.utils.sniff_utils import TAG_IMAGE_DESCRIPTION, TAG_PHOTOMETRIC, TAG_SAMPLES_PER_PIXEL, get_file_sniff
+
+
+@pytest.mark.parametrize("bigtiff", [False, True])
+@pytest.mark.parametrize("byteorder", ["<", ">"])
+def test_first_ifd_tags_are_read(tmp_path, bigtiff, byteorder):
+    path = str(tmp_path / "image.tif")
+    description = "x" * 20_000
+    # the description is stored beyond the header
+    tifffile.imwrite(
+        path,
+        np.zeros((200, 200, 3), dtype=np.uint8),
+        photometric="rgb",
+        description=description,
+        bigtiff=bigtiff,
+        byteorder=byteorder,
+        metadata=None,
+    )
+    sniff = get_file_sniff(path)
+    assert sniff.is_file and sniff.is_tiff
+    tags = sniff.get_tiff_tags()
+    assert tags[TAG_SAMPLES_PER_PIXEL] == 3
+    assert tags[TAG_PHOTOMETRIC] == 2
+    assert tags[TAG_IMAGE_DESCRIPTION] == description
+    # unchanged files share one sniff
+    assert get_file_sniff(path) is sniff
+
+
+def test_folders_and_other_files(tmp_path):
+    (tmp_path / "image.dcm").write_bytes(b"")
+    sniff = get_file_sniff(str(tmp_path))
+    assert sniff.is_dir and not sniff.is_file
+    assert sniff.get_folder_suffixes() == {".dcm"}
+
+    path = tmp_path / "image.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n")
+    sniff = get_file_sniff(str(path))
+    assert not sniff.is_tiff and sniff.get_tiff_tags() == {}
+    path.write_bytes(b"II*\0" + b"\xff" * 12)
+    sniff = get_file_sniff(str(path))
+    # broken IFD offset
+    assert sniff.is_tiff and sniff.get_tiff_tags() == {}
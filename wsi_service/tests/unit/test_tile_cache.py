@@ -0,0 +1,220 @@
+import hashlib
+import multiprocessing
+import os
+
+import pytest
+from starlette.responses import Response
+
+from wsi_service import tile_cache
+from wsi_service.tile_cache import TileResponseCache, get_region_cache_key, get_tile_cache_key
+from wsi_service.utils.disk_cache_utils import DiskCache
+from wsi_service.utils.shared_cache_utils import SharedMemoryCache
+
+
+def get_key(tile_x, image_format="jpeg"):
+    return get_tile_cache_key("slide", None, 0, tile_x, 0, 0, image_format, 90, None, (255, 255, 255), None, False)
+
+
+def get_slide_file(tmp_path):
+    filepath = tmp_path / "slide.tiff"
+    filepath.write_bytes(b"data")
+
+    async def get_filepath():
+        return str(filepath)
+
+    return str(filepath), get_filepath
+
+
+def test_tile_cache_key():
+    assert get_key(0, "jpg") == get_key(0, "jpeg")
+    assert get_key(0) != get_key(1)
+    assert get_key(0) != get_key(0, "png")
+    region_key = get_region_cache_key(
+        "slide", None, 0, 0, 0, 256, 256, 0, "jpeg", 90, None, (255, 255, 255), None, False
+    )
+    assert region_key != get_key(0)
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_hit_and_byte_budget(tmp_path):
+    filepath, get_filepath = get_slide_file(tmp_path)
+    cache = TileResponseCache(max_bytes=200)
+    for tile_x in range(21):
+        cache.put(get_key(tile_x), filepath, Response(b"0123456789", media_type="image/jpeg"))
+    assert cache.current_bytes == 200
+    assert await cache.get(get_key(0), get_filepath) is None
+    cached_response = await cache.get(get_key(20), get_filepath)
+    assert cached_response.body == b"0123456789"
+    response = cached_response.to_response()
+    assert response.media_type == "image/jpeg"
+    assert response.body == b"0123456789"
+    assert cache.hits == 1
+    assert cache.misses == 1
+    # entries larger than an eighth of the budget are not cached
+    cache.put(get_key(21), filepath, Response(b"0" * 26, media_type="image/jpeg"))
+    assert await cache.get(get_key(21), get_filepath) is None
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_invalidated_on_file_change(tmp_path):
+    filepath, get_filepath = get_slide_file(tmp_path)
+    cache = TileResponseCache(max_bytes=1000, fingerprint_ttl=0)
+    cache.put(get_key(0), filepath, Response(b"tile", media_type="image/png"))
+    assert await cache.get(get_key(0), get_filepath) is not None
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert await cache.get(get_key(0), get_filepath) is None
+    assert cache.current_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_disabled(tmp_path):
+    filepath, get_filepath = get_slide_file(tmp_path)
+    cache = TileResponseCache(max_bytes=0)
+    assert not cache.enabled
+    cache.put(get_key(0), filepath, Response(b"tile", media_type="image/png"))
+    assert await cache.get(get_key(0), get_filepath) is None
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_shared_between_workers(tmp_path):
+    filepath, get_filepath = get_slide_file(tmp_path)
+    shared_cache_path = str(tmp_path / "shared_cache")
+    worker_1 = TileResponseCache(max_bytes=0, shared_cache=SharedMemoryCache(shared_cache_path, 1_000_000))
+    worker_2 = TileResponseCache(max_bytes=1000, shared_cache=SharedMemoryCache(shared_cache_path, 1_000_000))
+    response = Response(b"tile", media_type="image/png", headers={"Content-Encoding": "gzip"})
+    worker_1.put(get_key(0), filepath, response)
+    cached_response = await worker_2.get(get_key(0), get_filepath)
+    assert cached_response.body == b"tile"
+    assert cached_response.media_type == "image/png"
+    assert cached_response.headers == {"content-encoding": "gzip"}
+    assert worker_2.shared_hits == 1
+    # promoted to the local cache of the worker
+    assert await worker_2.get(get_key(0), get_filepath) is not None
+    assert worker_2.hits == 1
+
+
+def get_digest(i):
+    return hashlib.md5(str(i).encode()).digest()
+
+
+def _put_values(path, count):
+    cache = SharedMemoryCache(path, 1_000_000, stripe_count=4, average_value_size=256)
+    for i in range(count):
+        cache.put(get_digest(i), f"value {i}".encode())
+    cache.close()
+
+
+def test_shared_memory_cache_across_processes(tmp_path):
+    path = str(tmp_path / "shared_cache")
+    cache = SharedMemoryCache(path, 1_000_000, stripe_count=4, average_value_size=256)
+    process = multiprocessing.get_context("fork").Process(target=_put_values, args=(path, 100))
+    process.start()
+    process.join()
+    for i in range(100):
+        assert cache.get(get_digest(i)) == f"value {i}".encode()
+    assert cache.get(get_digest(100)) is None
+    cache.close()
+
+
+def test_shared_memory_cache_with_other_layout_keeps_mapped_file(tmp_path):
+    path = str(tmp_path / "shared_cache")
+    cache = SharedMemoryCache(path, 1_000_000, stripe_count=4, average_value_size=256)
+    cache.put(get_digest(0), b"value")
+    # e.g. a worker started with a new size during a rolling restart
+    resized_cache = SharedMemoryCache(path, 2_000_000, stripe_count=4, average_value_size=256)
+    assert resized_cache.file_path != cache.file_path
+    assert resized_cache.get(get_digest(0)) is None
+    assert cache.get(get_digest(0)) == b"value"
+    cache.put(get_digest(1), b"other value")
+    assert cache.get(get_digest(1)) == b"other value"
+    cache.close()
+
+    # invalid files are replaced without truncating them
+    with open(resized_cache.file_path, "r+b") as f:
+        f.write(b"garbage!")
+    repaired_cache = SharedMemoryCache(path, 2_000_000, stripe_count=4, average_value_size=256)
+    assert repaired_cache.put(get_digest(2), b"value")
+    assert repaired_cache.get(get_digest(2)) == b"value"
+    repaired_cache.close()
+    resized_cache.close()
+    assert os.listdir(tmp_path) == [os.path.basename(resized_cache.file_path)]
+
+
+def test_shared_memory_cache_eviction(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / "shared_cache"), 4 * 4096, stripe_count=4, average_value_size=256)
+    value = b"x" * 500
+    for i in range(1000):
+        assert cache.put(get_digest(i), value)
+    # budget holds only the most recently written values
+    assert cache.get(get_digest(0)) is None
+    assert cache.get(get_digest(999)) == value
+    assert not cache.put(b"y" * 16, b"y" * 4096)
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_disk_survives_restart(tmp_path):
+    filepath, get_filepath = get_slide_file(tmp_path)
+    disk_cache_dir = str(tmp_path / "disk_cache")
+    disk_cache = DiskCache(disk_cache_dir, 1_000_000)
+    cache = TileResponseCache(max_bytes=0, disk_cache=disk_cache)
+    cache.put(get_key(0), filepath, Response(b"tile", media_type="image/png"))
+    disk_cache.close()
+
+    restarted_cache = TileResponseCache(max_bytes=0, disk_cache=DiskCache(disk_cache_dir, 1_000_000))
+    cached_response = await restarted_cache.get(get_key(0), get_filepath)
+    response = cached_response.to_response()
+    assert response.media_type == "image/png"
+    assert response.body == b"tile"
+    assert restarted_cache.disk_hits == 1
+
+    # entries of a modified slide file are not found anymore
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    restarted_cache.fingerprint_ttl = 0
+    assert await restarted_cache.get(get_key(0), get_filepath) is None
+
+
+def test_disk_cache_eviction(tmp_path):
+    disk_cache = DiskCache(str(tmp_path / "disk_cache"), 10_000)
+    for i in range(30):
+        disk_cache.put(get_digest(i), {}, b"x" * 1000)
+        disk_cache.flush()
+        assert disk_cache.get(get_digest(i)) == (b"x" * 1000, {})
+        disk_cache.flush()
+        os.utime(disk_cache._get_path(get_digest(i)), (i, i))
+    # oldest entries were removed
+    assert disk_cache.get(get_digest(0)) is None
+    assert disk_cache.get(get_digest(29)) is not None
+    disk_cache.close()
+    total_bytes = sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(disk_cache.directory) for name in files
+    )
+    assert total_bytes <= 10_000
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_entry_removed_by_other_worker_is_a_miss(tmp_path):
+    filepath, get_filepath = get_slide_file(tmp_path)
+    disk_cache = DiskCache(str(tmp_path / "disk_cache"), 1_000_000)
+    cache = TileResponseCache(max_bytes=0, disk_cache=disk_cache)
+    cache.put(get_key(0), filepath, Response(b"tile", media_type="image/png"))
+    disk_cache.flush()
+    for root, _, files in os.walk(disk_cache.directory):
+        for name in files:
+            if not name.endswith(".json"):
+                os.remove(os.path.join(root, name))
+    assert await cache.get(get_key(0), get_filepath) is None
+    assert cache.misses == 1
+    disk_cache.close()
+
+
+def test_tile_cache_fingerprints_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(tile_cache, "FINGERPRINT_CACHE_SIZE", 2)
+    cache = TileResponseCache(max_bytes=1_000_000)
+    for i in range(5):
+        filepath = tmp_path / f"slide{i}.tiff"
+        filepath.write_bytes(b"data")
+        cache.put(get_key(i), str(filepath), Response(b"tile", media_type="image/png"))
+    assert len(cache._fingerprints.get_all()) == 2
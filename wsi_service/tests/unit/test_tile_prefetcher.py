@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from wsi_service.tile_prefetcher import TilePrefetcher, get_prefetch_candidates, get_viewer_key
+
+
+def get_slide_info():
+    # 4 levels with 2x downsampling, 1024x768 pixels on level 0, tiles of 256x256 pixels
+    levels = [
+        SimpleNamespace(extent=SimpleNamespace(x=1024 // 2**i, y=768 // 2**i), downsample_factor=2**i) for i in range(4)
+    ]
+    return SimpleNamespace(levels=levels, tile_extent=SimpleNamespace(x=256, y=256))
+
+
+def test_prefetch_candidates_without_history():
+    candidates = get_prefetch_candidates(get_slide_info(), None, (0, 0, 0))
+    assert candidates == [(0, 1, 0), (0, 0, 1), (0, 1, 1), (1, 0, 0)]
+
+
+def test_prefetch_candidates_panning():
+    candidates = get_prefetch_candidates(get_slide_info(), (0, 0, 1), (0, 1, 1))
+    # tiles ahead in panning direction first
+    assert set(candidates[:3]) == {(0, 2, 0), (0, 2, 1), (0, 2, 2)}
+    assert set(candidates[3:]) == {(0, 0, 0), (0, 1, 0), (0, 0, 1), (0, 0, 2), (0, 1, 2), (1, 0, 0)}
+    # tiles beyond the image are skipped
+    candidates = get_prefetch_candidates(get_slide_info(), (0, 3, 1), (0, 3, 2))
+    assert candidates == [(0, 2, 2), (0, 2, 1), (0, 3, 1), (1, 1, 1)]
+
+
+def test_prefetch_candidates_zooming():
+    # zooming in: tiles covering the current tile on the next level
+    candidates = get_prefetch_candidates(get_slide_info(), (2, 0, 0), (1, 1, 0))
+    assert candidates[:4] == [(0, 2, 0), (0, 3, 0), (0, 2, 1), (0, 3, 1)]
+    assert (2, 0, 0) not in candidates
+    # zooming out: tile covering the current tile on the next level
+    candidates = get_prefetch_candidates(get_slide_info(), (0, 3, 2), (1, 1, 1))
+    assert candidates[-1] == (2, 0, 0)
+    assert all(candidate[0] != 0 for candidate in candidates)
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_reads_candidates_within_budget():
+    prefetcher = TilePrefetcher(max_in_flight=1, max_foreground_reads=1)
+    prefetched = []
+
+    async def get_info():
+        return get_slide_info()
+
+    async def prefetch_tile(level, tile_x, tile_y):
+        prefetched.append((level, tile_x, tile_y))
+        return True
+
+    prefetcher.tile_requested("viewer", 0, 0, 0, get_info, prefetch_tile)
+    await asyncio.sleep(0.01)
+    assert prefetched == get_prefetch_candidates(get_slide_info(), None, (0, 0, 0))
+    assert prefetcher.prefetched == len(prefetched)
+    assert prefetcher.tasks == {}
+
+    # no prefetching while foreground reads use the readers
+    prefetched.clear()
+    with prefetcher.foreground_read():
+        prefetcher.tile_requested("viewer", 0, 1, 0, get_info, prefetch_tile)
+        await asyncio.sleep(0.01)
+    assert prefetched == []
+    assert prefetcher.skipped == 1
+
+
+def test_viewer_key_ignores_tile_position_only():
+    def get_key(**kwargs):
+        params = dict(
+            client_host="10.0.0.1",
+            user_agent="viewer",
+            slide_id="slide",
+            plugin=None,
+            z=0,
+            image_format="jpeg",
+            image_quality=90,
+            image_channels=None,
+            padding_color=(255, 255, 255),
+            icc_profile_intent=None,
+            icc_profile_strict=False,
+        )
+        return get_viewer_key(**dict(params, **kwargs))
+
+    assert get_key() == get_key(image_format="jpg")
+    assert get_key() != get_key(z=1)
+    assert get_key() != get_key(slide_id="other")
+    assert get_key() != get_key(image_channels=[0])
+    assert get_key() != get_key(user_agent="other viewer")
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import struct
+import time
+from collections import OrderedDict
+
+from starlette.responses import Response
+
+from wsi_service.singletons import logger
+from wsi_service.utils.app_utils import normalize_image_format
+from wsi_service.utils.slide_utils import LRUCache, get_file_fingerprint
+
+# response headers that are needed to replay a cached response
+_CACHED_HEADERS = ("content-encoding",)
+_META_LENGTH = struct.Struct("<I")
+# slide files whose fingerprint is remembered, others are checked again on their next request
+FINGERPRINT_CACHE_SIZE = 10_000
+
+
+def get_tile_cache_key(
+    slide_id,
+    plugin,
+    level,
+    tile_x,
+    tile_y,
+    z,
+    image_format,
+    image_quality,
+    image_channels,
+    padding_color,
+    icc_profile_intent,
+    icc_profile_strict,
+):
+    return _get_image_cache_key(
+        "tile",
+        slide_id,
+        plugin,
+        level,
+        (tile_x, tile_y),
+        z,
+        image_format,
+        image_quality,
+        image_channels,
+        padding_color,
+        icc_profile_intent,
+        icc_profile_strict,
+    )
+
+
+def get_region_cache_key(
+    slide_id,
+    plugin,
+    level,
+    start_x,
+    start_y,
+    size_x,
+    size_y,
+    z,
+    image_format,
+    image_quality,
+    image_channels,
+    padding_color,
+    icc_profile_intent,
+    icc_profile_strict,
+):
+    return _get_image_cache_key(
+        "region",
+        slide_id,
+        plugin,
+        level,
+        (start_x, start_y, size_x, size_y),
+        z,
+        image_format,
+        image_quality,
+        image_channels,
+        padding_color,
+        icc_profile_intent,
+        icc_profile_strict,
+    )
+
+
+def _get_image_cache_key(
+    kind,
+    slide_id,
+    plugin,
+    level,
+    coordinates,
+    z,
+    image_format,
+    image_quality,
+    image_channels,
+    padding_color,
+    icc_profile_intent,
+    icc_profile_strict,
+):
+    return (
+        kind,
+        slide_id,
+        plugin,
+        level,
+        coordinates,
+        z,
+        normalize_image_format(image_format),
+        image_quality,
+        tuple(image_channels) if image_channels is not None else None,
+        tuple(padding_color) if padding_color is not None else None,
+        str(icc_profile_intent) if icc_profile_intent is not None else None,
+        bool(icc_profile_strict),
+    )
+
+
+class CachedResponse:
+    def __init__(self, body, media_type, headers=None):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers or {}
+
+    @classmethod
+    def from_response(cls, response):
+        headers = {key: value for key, value in response.headers.items() if key in _CACHED_HEADERS}
+        return cls(bytes(response.body), response.media_type, headers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        meta_length = _META_LENGTH.unpack_from(data)[0]
+        meta = json.loads(data[_META_LENGTH.size : _META_LENGTH.size + meta_length])
+        return cls(data[_META_LENGTH.size + meta_length :], meta["media_type"], meta["headers"])
+
+    def to_bytes(self):
+        meta = json.dumps({"media_type": self.media_type, "headers": self.headers}).encode("utf-8")
+        return _META_LENGTH.pack(len(meta)) + meta + self.body
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def to_response(self):
+        return Response(self.body, media_type=self.media_type, headers=self.headers)
+
+
+class _CacheEntry:
+    def __init__(self, response, filepath, fingerprint):
+        self.response = response
+        self.filepath = filepath
+        self.fingerprint = fingerprint
+
+
+class TileResponseCache:
+    """
+    LRU cache of encoded tile and region responses limited by the total size of the cached payloads.
+    Each entry remembers the slide file it was read from and is dropped as soon as the
+    file changes. File state is checked at most every fingerprint_ttl seconds per file.
+
+    Optionally, responses are also stored in a SharedMemoryCache that is shared by all workers
+    of a host and in a DiskCache that survives restarts. Their keys include path and fingerprint
+    of the slide file, so entries of changed files are not found anymore. Lookups go from the
+    worker's LRU to the shared memory to the disk. Hits of the shared memory and the disk are
+    copied to the worker's LRU.
+    """
+
+    def __init__(self, max_bytes, shared_cache=None, disk_cache=None, fingerprint_ttl=1.0):
+        self.max_bytes = max_bytes
+        self.shared_cache = shared_cache
+        self.disk_cache = disk_cache
+        self.fingerprint_ttl = fingerprint_ttl
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._fingerprints = LRUCache(FINGERPRINT_CACHE_SIZE)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or self.shared_cache is not None or self.disk_cache is not None
+
+    async def get(self, key, get_filepath):
+        """
+        Returns the cached response for key or None. get_filepath is an async callable returning
+        the path of the slide file, it is only awaited if the shared or disk cache need to be queried.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if self._get_fingerprint(entry.filepath) == entry.fingerprint:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.response
+            logger.debug("Slide file changed, dropping cached response: %s", key)
+            self._remove(key)
+        if self.shared_cache is not None or self.disk_cache is not None:
+            filepath = await get_filepath()
+            fingerprint = self._get_fingerprint(filepath)
+            if fingerprint is not None:
+                digest = self._get_digest(key, filepath, fingerprint)
+                if self.shared_cache is not None:
+                    data = self.shared_cache.get(digest)
+                    if data is not None:
+                        cached_response = CachedResponse.from_bytes(data)
+                        self._put_local(key, filepath, fingerprint, cached_response)
+                        self.shared_hits += 1
+                        return cached_response
+                if self.disk_cache is not None:
+                    cached_entry = await self.disk_cache.get_async(digest)
+                    if cached_entry is not None:
+                        body, meta = cached_entry
+                        cached_response = CachedResponse(body, meta["media_type"], meta["headers"])
+                        self._put_local(key, filepath, fingerprint, cached_response)
+                        self.disk_hits += 1
+                        return cached_response
+        self.misses += 1
+        return None
+
+    def contains(self, key):
+        """
+        Returns whether key is in the worker's LRU, without checking the slide file or updating statistics.
+        """
+        return key in self.entries
+
+    def put(self, key, filepath, response):
+        if not self.enabled:
+            return
+        fingerprint = self._get_fingerprint(filepath)
+        if fingerprint is None:
+            return
+        cached_response = CachedResponse.from_response(response)
+        self._put_local(key, filepath, fingerprint, cached_response)
+        if self.shared_cache is not None or self.disk_cache is not None:
+            digest = self._get_digest(key, filepath, fingerprint)
+            if self.shared_cache is not None:
+                self.shared_cache.put(digest, cached_response.to_bytes())
+            if self.disk_cache is not None:
+                meta = {"media_type": cached_response.media_type, "headers": cached_response.headers}
+                self.disk_cache.put(digest, meta, cached_response.body)
+
+    def clear(self):
+        self.entries.clear()
+        self.current_bytes = 0
+        self._fingerprints = LRUCache(FINGERPRINT_CACHE_SIZE)
+
+    def _put_local(self, key, filepath, fingerprint, cached_response):
+        # a single large region must not evict all cached tiles
+        if cached_response.size > self.max_bytes // 8:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = _CacheEntry(cached_response, filepath, fingerprint)
+        self.current_bytes += cached_response.size
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def _get_digest(self, key, filepath, fingerprint):
+        return hashlib.blake2b(repr((key, filepath, fingerprint)).encode("utf-8"), digest_size=16).digest()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.current_bytes -= entry.response.size
+
+    def _get_fingerprint(self, filepath):
+        now = time.monotonic()
+        checked = self._fingerprints.get_item(filepath)
+        if checked is not None and now - checked[1] < self.fingerprint_ttl:
+            return checked[0]
+        fingerprint = get_file_fingerprint(filepath)
+        self._fingerprints.put_item(filepath, (fingerprint, now))
+        return fingerprint
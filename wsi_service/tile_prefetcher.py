@@ -0,0 +1,169 @@
+import asyncio
+import math
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from wsi_service.singletons import logger
+from wsi_service.utils.app_utils import normalize_image_format
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def _get_tile_count(slide_info, level):
+    extent = slide_info.levels[level].extent
+    return math.ceil(extent.x / slide_info.tile_extent.x), math.ceil(extent.y / slide_info.tile_extent.y)
+
+
+def _get_parent_tile(slide_info, level, tile_x, tile_y):
+    ratio = slide_info.levels[level + 1].downsample_factor / slide_info.levels[level].downsample_factor
+    return level + 1, int(tile_x / ratio), int(tile_y / ratio)
+
+
+def _get_child_tiles(slide_info, level, tile_x, tile_y):
+    ratio = slide_info.levels[level].downsample_factor / slide_info.levels[level - 1].downsample_factor
+    xs = range(int(tile_x * ratio), max(int(tile_x * ratio) + 1, math.ceil((tile_x + 1) * ratio)))
+    ys = range(int(tile_y * ratio), max(int(tile_y * ratio) + 1, math.ceil((tile_y + 1) * ratio)))
+    return [(level - 1, x, y) for y in ys for x in xs]
+
+
+def get_viewer_key(
+    client_host,
+    user_agent,
+    slide_id,
+    plugin,
+    z,
+    image_format,
+    image_quality,
+    image_channels,
+    padding_color,
+    icc_profile_intent,
+    icc_profile_strict,
+):
+    """
+    Identifies a viewer by its client and the parameters of its tile requests, except for level
+    and tile position, which change while the viewer is panning and zooming.
+    """
+    return (
+        client_host,
+        user_agent,
+        slide_id,
+        plugin,
+        z,
+        normalize_image_format(image_format),
+        image_quality,
+        tuple(image_channels) if image_channels is not None else None,
+        tuple(padding_color) if padding_color is not None else None,
+        str(icc_profile_intent) if icc_profile_intent is not None else None,
+        bool(icc_profile_strict),
+    )
+
+
+def get_prefetch_candidates(slide_info, previous, current):
+    """
+    Returns the tiles (level, tile_x, tile_y) a viewer is likely to request after current,
+    most likely first. previous is the tile requested before by the same viewer or None.
+
+    While panning, tiles ahead in the panning direction come first, followed by the remaining
+    neighbors. While zooming in, the tiles covering current on the next higher resolution level are
+    added, otherwise the tile covering current on the next lower resolution level.
+    """
+    level, tile_x, tile_y = current
+    neighbor_offsets = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+    if previous is not None and previous[0] == level:
+        pan_x, pan_y = _sign(tile_x - previous[1]), _sign(tile_y - previous[2])
+        # stable sort, neighbors in panning direction first
+        neighbor_offsets.sort(key=lambda offset: -(offset[0] * pan_x + offset[1] * pan_y))
+    candidates = []
+    zoom_in = previous is not None and previous[0] > level
+    if zoom_in and level > 0:
+        candidates += _get_child_tiles(slide_info, level, tile_x, tile_y)
+    candidates += [(level, tile_x + dx, tile_y + dy) for dx, dy in neighbor_offsets]
+    if not zoom_in and level + 1 < len(slide_info.levels):
+        candidates.append(_get_parent_tile(slide_info, level, tile_x, tile_y))
+
+    valid_candidates = []
+    for candidate in candidates:
+        if candidate == current or candidate in valid_candidates:
+            continue
+        tile_count_x, tile_count_y = _get_tile_count(slide_info, candidate[0])
+        if 0 <= candidate[1] < tile_count_x and 0 <= candidate[2] < tile_count_y:
+            valid_candidates.append(candidate)
+    return valid_candidates
+
+
+class TilePrefetcher:
+    """
+    Reads the tiles a viewer is likely to request next into the tile cache in the background.
+
+    Viewers are identified by a key (client and rendering parameters of the tile request), for each
+    viewer only the last requested tile is remembered. Predictions for a viewer are processed one tile
+    at a time and are dropped as soon as the viewer requests another tile. Prefetching is skipped while
+    the number of prefetch reads or of foreground reads (tile requests that missed the cache) reaches
+    its limit, so prefetching only uses otherwise idle reader threads.
+    """
+
+    def __init__(self, max_in_flight, max_foreground_reads, max_viewers=1024):
+        self.max_in_flight = max_in_flight
+        self.max_foreground_reads = max_foreground_reads
+        self.max_viewers = max_viewers
+        # viewer key -> last requested tile (level, tile_x, tile_y)
+        self.viewers = OrderedDict()
+        # viewer key -> latest request that has not been processed yet
+        self.pending = {}
+        self.tasks = {}
+        self.in_flight = 0
+        self.foreground_reads = 0
+        self.prefetched = 0
+        self.skipped = 0
+
+    @contextmanager
+    def foreground_read(self):
+        self.foreground_reads += 1
+        try:
+            yield
+        finally:
+            self.foreground_reads -= 1
+
+    def tile_requested(self, viewer_key, level, tile_x, tile_y, get_slide_info, prefetch_tile):
+        """
+        Records a tile request of a viewer and schedules prefetching of the tiles likely requested next.
+        get_slide_info is an async callable returning the slide info, prefetch_tile is an async callable
+        reading a tile (level, tile_x, tile_y) into the cache.
+        """
+        current = (level, tile_x, tile_y)
+        previous = self.viewers.pop(viewer_key, None)
+        self.viewers[viewer_key] = current
+        if len(self.viewers) > self.max_viewers:
+            self.viewers.popitem(last=False)
+        if previous == current:
+            return
+        self.pending[viewer_key] = (previous, current, get_slide_info, prefetch_tile)
+        if viewer_key not in self.tasks:
+            self.tasks[viewer_key] = asyncio.ensure_future(self._prefetch(viewer_key))
+
+    async def _prefetch(self, viewer_key):
+        try:
+            while viewer_key in self.pending:
+                previous, current, get_slide_info, prefetch_tile = self.pending.pop(viewer_key)
+                slide_info = await get_slide_info()
+                for candidate in get_prefetch_candidates(slide_info, previous, current):
+                    if viewer_key in self.pending:
+                        # the viewer has moved on, remaining predictions are outdated
+                        break
+                    if self.in_flight >= self.max_in_flight or self.foreground_reads >= self.max_foreground_reads:
+                        self.skipped += 1
+                        break
+                    self.in_flight += 1
+                    try:
+                        if await prefetch_tile(*candidate):
+                            self.prefetched += 1
+                    except Exception as e:
+                        logger.debug("Prefetching tile %s failed: %s", candidate, e)
+                    finally:
+                        self.in_flight -= 1
+        except Exception as e:
+            logger.debug("Prefetching tiles failed: %s", e)
+        finally:
+            self.tasks.pop(viewer_key, None)
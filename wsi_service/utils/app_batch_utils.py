@@ -14,6 +14,7 @@ from wsi_service.utils.image_utils import (
 
 from wsi_service.utils.app_utils import (
     coerce_passthrough_payload,
+    is_jpeg_payload,
     process_image_region,
     process_image_region_raw,
     normalize_image_format,
@@ -26,8 +27,11 @@ from wsi_service.utils.app_utils import (
 )
 
 
-async def safe_get_slide(slide_manager, path, plugin):
+async def safe_get_slide(slide_manager, path, plugin, leases=None):
     try:
+        if leases is not None:
+            # the slide is leased until the given AsyncExitStack is closed, so it is not closed while reading
+            return await leases.enter_async_context(slide_manager.get_slide(path, plugin=plugin))
         return await slide_manager.get_slide(path, plugin=plugin)
     except Exception as e:
         logger.error(e)
@@ -76,7 +80,7 @@ def batch_safe_make_response(slides, image_regions, image_format, image_quality,
                 continue
 
             if isinstance(image_region, bytes):
-                if output_format == "jpeg":
+                if output_format == "jpeg" and image_channels is None and is_jpeg_payload(image_region):
                     zip.writestr(f't{i + 1}.jpeg', image_region)
                     continue
                 image_region = Image.open(BytesIO(image_region))
@@ -156,11 +160,19 @@ async def batch_safe_get_tile(slide,
                               vp_color,
                               z,
                               icc_profile_intent,
-                              icc_profile_strict):
+                              icc_profile_strict,
+                              in_flight=None):
     try:
         validate_image_level(slide_info, level)
         validate_image_z(slide_info, z)
         validate_image_channels(slide_info, image_channels)
+        if in_flight is not None:
+            # identical tiles requested concurrently (within a batch or by other batches) are read once
+            key = ("batch_tile", slide.filepath, slide.plugin, level, tile_x, tile_y,
+                   tuple(vp_color) if vp_color is not None else None, z,
+                   str(icc_profile_intent) if icc_profile_intent is not None else None, bool(icc_profile_strict))
+            return await in_flight.run(key, slide.get_tile, level, tile_x, tile_y, padding_color=vp_color, z=z,
+                                       icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict)
         # TODO: We don't extend tiles! No need, less data transfer, faster render
         # if check_complete_tile_overlap(slide_info, level, tile_x, tile_y):
         #     image_tile = await slide.get_tile(level, tile_x, tile_y, padding_color=vp_color, z=z)
@@ -61,6 +61,10 @@ def _is_gzipped(payload):
     return isinstance(payload, (bytes, bytearray)) and len(payload) >= 2 and payload[:2] == b"\x1f\x8b"
 
 
+def is_jpeg_payload(payload):
+    return isinstance(payload, (bytes, bytearray)) and payload[:2] == b"\xff\xd8"
+
+
 def coerce_passthrough_payload(payload, image_format):
     image_format = normalize_image_format(image_format)
 
@@ -150,6 +154,28 @@ def process_image_region_raw(image_region, image_channels):
         raise HTTPException(status_code=400, detail="Failed to read region in an apropriate internal representation.")
 
 
+def get_channel_selection(slide, slide_info, image_channels, image_format):
+    """
+    Returns the channels a slide supporting channel selection has to read for a response with image_channels
+    and the image_channels to pass to make_response for the region read with only these channels.
+    Returns (None, image_channels) if all channels have to be read.
+    """
+    image_format = normalize_image_format(image_format)
+    if not getattr(slide, "supports_channel_selection", False) or is_passthrough_format(image_format):
+        return None, image_channels
+    if image_format == "tiff":
+        if image_channels is None:
+            return None, None
+        read_channels = list(image_channels)
+    elif image_channels is not None and len(image_channels) <= 2:
+        read_channels = list(image_channels)
+    else:
+        # images are composed of the first three channels (see get_requested_channels_as_rgb_array)
+        read_channels = list(range(min(3, len(slide_info.channels))))
+    response_channels = None if image_channels is None else list(range(len(image_channels)))
+    return read_channels, response_channels
+
+
 def make_response(slide, image_region, image_format, image_quality, image_channels=None):
     image_format = normalize_image_format(image_format)
 
@@ -157,7 +183,8 @@ def make_response(slide, image_region, image_format, image_quality, image_channe
         return make_passthrough_response(image_region, image_format)
 
     if isinstance(image_region, bytes):
-        if image_format == "jpeg":
+        # encoded tiles from the plugin are returned as they are unless channels need to be selected
+        if image_format == "jpeg" and image_channels is None and is_jpeg_payload(image_region):
             return Response(image_region, media_type=supported_image_formats[image_format])
         image_region = Image.open(BytesIO(image_region))
 
@@ -171,6 +198,12 @@ def make_response(slide, image_region, image_format, image_quality, image_channe
         return make_image_response(img, image_format, image_quality)
 
 
+def make_scaled_response(slide, image, max_x, max_y, image_format, image_quality):
+    # scales associated images (label, macro) down to the requested maximum size in place
+    image.thumbnail((max_x, max_y), Image.Resampling.LANCZOS)
+    return make_response(slide, image, image_format, image_quality)
+
+
 def make_image_response(pil_image, image_format, image_quality):
     image_format = normalize_image_format(image_format)
 
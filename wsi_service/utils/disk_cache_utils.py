@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wsi_service.singletons import logger
+
+_META_SUFFIX = ".json"
+_TMP_SUFFIX = ".tmp"
+# incomplete writes older than this are removed when scanning the cache directory
+_TMP_MAX_AGE_SECONDS = 600
+# when the size limit is exceeded, entries are removed until the cache is below this fraction of the limit
+_EVICTION_TARGET = 0.9
+# threads reading entries, reads do not wait for writes and eviction
+_READER_THREADS = 4
+
+
+class DiskCache:
+    """
+    Size limited key value cache in a directory, e.g. on a local SSD, that survives restarts
+    and can be shared by all workers of a host. Keys are 16 byte digests, each value is stored
+    as a file next to a small JSON file with its metadata.
+
+    Reads run in a small thread pool, writes, access time updates and eviction in a background
+    thread. Values are read completely on a hit, so entries evicted by another worker afterwards
+    do not affect the response. Entries are evicted
+    in order of last access (file mtime). As several processes may write to the same directory,
+    the size of the directory is re-scanned whenever the bytes written by this process since the
+    last scan could have exceeded the limit, so the limit is enforced approximately.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wsi-disk-cache")
+        self._reader = ThreadPoolExecutor(max_workers=_READER_THREADS, thread_name_prefix="wsi-disk-cache-reader")
+        self._scanned_bytes = 0
+        self._bytes_since_scan = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._writer.submit(self._scan_and_evict)
+
+    def get(self, digest):
+        """
+        Returns value and metadata of the cached entry or None. Blocks on file reads, use get_async
+        on the event loop.
+        """
+        path = self._get_path(digest)
+        try:
+            with open(path + _META_SUFFIX, "rb") as f:
+                meta = json.loads(f.read())
+            with open(path, "rb") as f:
+                value = f.read()
+        except (OSError, ValueError):
+            # missing, incomplete or just evicted entry
+            return None
+        self._writer.submit(self._touch, path)
+        return value, meta
+
+    async def get_async(self, digest):
+        return await asyncio.get_running_loop().run_in_executor(self._reader, self.get, digest)
+
+    def put(self, digest, meta, value):
+        self._writer.submit(self._write, digest, meta, value)
+
+    def flush(self):
+        self._writer.submit(lambda: None).result()
+
+    def close(self):
+        self._reader.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
+    def _get_path(self, digest):
+        name = digest.hex()
+        return os.path.join(self.directory, name[:2], name)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write(self, digest, meta, value):
+        path = self._get_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # metadata is written first, the value file marks the entry as complete
+            meta_data = json.dumps(meta).encode("utf-8")
+            self._write_file(path + _META_SUFFIX, meta_data)
+            self._write_file(path, value)
+        except OSError as ex:
+            logger.warning("Failed to write disk cache entry %s: %s", path, ex)
+            return
+        self._bytes_since_scan += len(value) + len(meta_data)
+        if self._scanned_bytes + self._bytes_since_scan > self.max_bytes or self._bytes_since_scan > self.max_bytes * (
+            1 - _EVICTION_TARGET
+        ):
+            self._scan_and_evict()
+
+    def _write_file(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}{_TMP_SUFFIX}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _scan_and_evict(self):
+        # maps value paths to [last access, size of value and metadata file]
+        entries = {}
+        total_bytes = 0
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(_TMP_SUFFIX):
+                    if now - stat.st_mtime > _TMP_MAX_AGE_SECONDS:
+                        self._remove(path)
+                    continue
+                total_bytes += stat.st_size
+                if name.endswith(_META_SUFFIX):
+                    entry = entries.setdefault(path[: -len(_META_SUFFIX)], [0, 0])
+                else:
+                    entry = entries.setdefault(path, [0, 0])
+                    entry[0] = stat.st_mtime
+                entry[1] += stat.st_size
+
+        if total_bytes > self.max_bytes:
+            removed_count = 0
+            for path, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+                if total_bytes <= self.max_bytes * _EVICTION_TARGET:
+                    break
+                self._remove(path)
+                self._remove(path + _META_SUFFIX)
+                total_bytes -= size
+                removed_count += 1
+            logger.debug("Removed %s entries from disk cache %s", removed_count, self.directory)
+
+        self._scanned_bytes = total_bytes
+        self._bytes_since_scan = 0
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
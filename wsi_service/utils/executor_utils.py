@@ -0,0 +1,110 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_thread_state = threading.local()
+
+# plugin methods that read from or decode the slide and therefore must not run on the event loop
+_OFFLOADED_SLIDE_METHODS = ("get_region", "get_tile", "get_thumbnail", "get_label", "get_macro", "get_icc_profile")
+
+
+def _run_coroutine_function(coroutine_function, args, kwargs):
+    # plugin methods are declared async but block while reading, they are driven to
+    # completion on a private event loop owned by the worker thread
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None:
+        loop = asyncio.new_event_loop()
+        _thread_state.loop = loop
+    return loop.run_until_complete(coroutine_function(*args, **kwargs))
+
+
+class PluginExecutor:
+    """
+    Runs blocking plugin calls (slide opening, reading, decoding and encoding) in thread pools,
+    one pool per plugin, so a slow read does not stall the event loop of the worker.
+    """
+
+    def __init__(self, threads_per_plugin, max_concurrency_per_slide):
+        self.threads_per_plugin = threads_per_plugin
+        self.max_concurrency_per_slide = max_concurrency_per_slide
+        self.pools = {}
+
+    def get_pool(self, pool_name):
+        pool_name = pool_name or "default"
+        pool = self.pools.get(pool_name)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=self.threads_per_plugin, thread_name_prefix=f"wsi-{pool_name}")
+            self.pools[pool_name] = pool
+        return pool
+
+    def submit(self, pool_name, coroutine_function, *args, **kwargs):
+        return self.get_pool(pool_name).submit(_run_coroutine_function, coroutine_function, args, kwargs)
+
+    async def run(self, pool_name, coroutine_function, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(pool_name, coroutine_function, *args, **kwargs))
+
+    async def run_sync(self, pool_name, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_pool(pool_name), functools.partial(function, *args, **kwargs))
+
+    def wrap(self, slide):
+        return ExecutorSlide(slide, self)
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.pools = {}
+
+
+class ExecutorSlide:
+    """
+    Proxy around a plugin slide. Reading methods run in the thread pool of the slide's plugin,
+    limited to max_concurrency_per_slide concurrent calls per handle. Everything else
+    (attributes, get_info, close, ...) is passed through to the plugin slide.
+
+    active_calls counts the reads that are running in a thread, including reads whose
+    awaiting request has been cancelled in the meantime. Such reads also keep their slot of
+    max_concurrency_per_slide until the thread has finished.
+    """
+
+    def __init__(self, slide, executor):
+        self._slide = slide
+        self._executor = executor
+        self._semaphore = asyncio.Semaphore(executor.max_concurrency_per_slide)
+        self.active_calls = 0
+
+    def __getattr__(self, name):
+        if name in _OFFLOADED_SLIDE_METHODS:
+            return functools.partial(self._run, getattr(self._slide, name))
+        return getattr(self._slide, name)
+
+    @property
+    def unwrapped(self):
+        return self._slide
+
+    async def _run(self, coroutine_function, *args, **kwargs):
+        # the semaphore is released when the thread has finished, not when the awaiting request
+        # is cancelled, so cancelled reads still count against max_concurrency_per_slide
+        await self._semaphore.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            future = self._executor.submit(self._slide.plugin, coroutine_function, *args, **kwargs)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self.active_calls += 1
+        future.add_done_callback(functools.partial(self._call_finished, loop))
+        return await asyncio.wrap_future(future)
+
+    def _call_finished(self, loop, future):
+        # called from the worker thread
+        try:
+            loop.call_soon_threadsafe(self._finish_call)
+        except RuntimeError:
+            # event loop has been closed
+            pass
+
+    def _finish_call(self):
+        self.active_calls -= 1
+        self._semaphore.release()
@@ -158,6 +158,12 @@ def check_complete_region_overlap(slide_info, level, start_x, start_y, size_x, s
 
 _REGION_PROTO_CACHE = {}
 
+
+def _get_channel_kwargs(channels):
+    # plugins without channel selection do not accept the argument
+    return {} if channels is None else {"channels": channels}
+
+
 def _region_intersection(slide_info, level: int, start_x: int, start_y: int, size_x: int, size_y: int):
     """Compute intersection of requested region with the level extent.
     Returns: (ov_w, ov_h, src_x, src_y, dst_x, dst_y)
@@ -182,16 +188,18 @@ def _region_intersection(slide_info, level: int, start_x: int, start_y: int, siz
     return ov_w, ov_h, src_x, src_y, dst_x, dst_y
 
 
-async def _region_prototype(get_region, slide_info, level, padding_color, z, icc_profile_intent, icc_profile_strict):
+async def _region_prototype(get_region, slide_info, level, padding_color, z, icc_profile_intent, icc_profile_strict,
+                            channels=None):
     """Fetch a 1×1 sample (once) to preserve type/mode/dtype for empty canvases."""
-    key = (id(slide_info), level)
+    key = (id(slide_info), level, tuple(channels) if channels is not None else None)
     if key in _REGION_PROTO_CACHE:
         return _REGION_PROTO_CACHE[key]
     # request something guaranteed in-bounds
     proto = await get_region(level, 0, 0, 1, 1,
                              padding_color=padding_color, z=z,
                              icc_profile_intent=icc_profile_intent,
-                             icc_profile_strict=icc_profile_strict)
+                             icc_profile_strict=icc_profile_strict,
+                             **_get_channel_kwargs(channels))
     if isinstance(proto, bytes):
         proto = Image.open(BytesIO(proto))
     _REGION_PROTO_CACHE[key] = proto
@@ -212,6 +220,7 @@ async def get_extended_region(
     icc_profile_intent: ICCProfileIntent = None,
     icc_profile_strict: bool = False,
     extend: bool = True,
+    channels=None,
 ):
     """
     Normalize edge/out-of-bounds regions.
@@ -222,6 +231,8 @@ async def get_extended_region(
     Guarantees a single read for partial overlaps. For fully OOB:
       - extend=True returns a padded canvas
       - extend=False raises 416
+
+    channels is only passed to get_region if given, see Slide.supports_channel_selection.
     """
     ov_w, ov_h, src_x, src_y, dst_x, dst_y = _region_intersection(
         slide_info, level, start_x, start_y, size_x, size_y
@@ -232,7 +243,7 @@ async def get_extended_region(
         if not extend:
             raise HTTPException(status_code=416, detail="Requested region is outside the image extent")
         proto = await _region_prototype(get_region, slide_info, level, padding_color, z,
-                                        icc_profile_intent, icc_profile_strict)
+                                        icc_profile_intent, icc_profile_strict, channels)
         if isinstance(proto, Image.Image):
             mode = proto.mode or "RGB"
             return Image.new(mode, (size_x, size_y), padding_color)
@@ -256,6 +267,7 @@ async def get_extended_region(
         level, src_x, src_y, ov_w, ov_h,
         padding_color=padding_color, z=z,
         icc_profile_intent=icc_profile_intent, icc_profile_strict=icc_profile_strict,
+        **_get_channel_kwargs(channels),
     )
     if isinstance(src, bytes):
         src = Image.open(BytesIO(src))
@@ -333,6 +345,7 @@ async def get_extended_tile(
     icc_profile_intent=None,
     icc_profile_strict: bool = False,
     extend: bool = True,
+    channels=None,
 ):
     """
     Wraps `get_tile` and normalizes edge tiles:
@@ -344,6 +357,8 @@ async def get_extended_tile(
       - Only one call to `get_tile(...)`.
       - Returns the same type as `get_tile`: PIL.Image.Image or numpy array shaped (C, H, W).
       - No extra reads to 'sample' type.
+
+    channels is only passed to get_tile if given, see Slide.supports_channel_selection.
     """
     tile = await get_tile(
         level, tile_x, tile_y,
@@ -351,6 +366,7 @@ async def get_extended_tile(
         z=z,
         icc_profile_intent=icc_profile_intent,
         icc_profile_strict=icc_profile_strict,
+        **_get_channel_kwargs(channels),
     )
     if isinstance(tile, bytes):
         tile = Image.open(BytesIO(tile))
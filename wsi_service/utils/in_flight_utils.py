@@ -0,0 +1,31 @@
+import asyncio
+import functools
+
+
+class InFlightRequests:
+    """
+    Deduplicates concurrent identical requests: while a request for a key is being processed,
+    further requests for the same key await its result instead of processing it again.
+    Results are not kept after the request has finished.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.coalesced = 0
+
+    async def run(self, key, coroutine_function, *args, **kwargs):
+        task = self.requests.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function(*args, **kwargs))
+            self.requests[key] = task
+            task.add_done_callback(functools.partial(self._finish, key))
+        else:
+            self.coalesced += 1
+        # a cancelled request must not cancel the work for the other requests
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self.requests.pop(key, None)
+        if not task.cancelled():
+            # mark the error as retrieved, in case all requests waiting for it have been cancelled
+            task.exception()
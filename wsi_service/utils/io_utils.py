@@ -0,0 +1,35 @@
+import os
+
+
+class PositionalFileReader:
+    """
+    Reads byte ranges of a file with os.pread. Reads do not use or change a shared file position,
+    so any number of threads can read from the same reader at once without locking.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._fd = os.open(filepath, os.O_RDONLY)
+
+    def read(self, offset, length):
+        """
+        Returns length bytes starting at offset, fewer only if the end of the file is reached.
+        """
+        data = os.pread(self._fd, length, offset)
+        if len(data) == length or not data:
+            return data
+        # reads of regular files are only short at the end of the file, but e.g. network file systems differ
+        chunks = [data]
+        received = len(data)
+        while received < length:
+            chunk = os.pread(self._fd, length - received, offset + received)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+        return b"".join(chunks)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+
+def get_rss_bytes():
+    """
+    Returns the resident set size of the current process in bytes or None if it is not available.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def get_image_nbytes(image):
+    """
+    Returns the approximate memory used by the pixel data of a PIL image, numpy array or encoded image.
+    """
+    if isinstance(image, Image.Image):
+        return image.width * image.height * len(image.getbands())
+    if isinstance(image, np.ndarray):
+        return image.nbytes
+    if isinstance(image, (bytes, bytearray)):
+        return len(image)
+    return 0
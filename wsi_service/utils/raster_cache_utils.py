@@ -0,0 +1,128 @@
+import fcntl
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from wsi_service.singletons import logger
+from wsi_service.utils.slide_utils import get_file_fingerprint
+
+_RASTER_SUFFIX = ".raw"
+_LOCK_SUFFIX = ".lock"
+_TMP_SUFFIX = ".tmp"
+# incomplete writes older than this are removed when scanning the cache directory
+_TMP_MAX_AGE_SECONDS = 600
+
+
+class SharedRasterCache:
+    """
+    Size limited cache of decoded 8 bit rasters in a directory, e.g. in /dev/shm, shared by all
+    workers of a host. Rasters are stored as raw files and returned as read-only memory maps,
+    so each raster is decoded once per host and its pages are shared by all processes using it.
+
+    Files are keyed by path and fingerprint of the source file, so rasters of changed files are
+    not found anymore. A lock file per raster ensures that only one process decodes it. When the
+    size limit is exceeded, the least recently used rasters are removed. Processes still mapping
+    a removed raster keep using it until they unmap it.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, filepath, name, shape, decode):
+        """
+        Returns the raster name (e.g. a level) of the file at filepath as read-only uint8 array of the
+        given shape. decode is called to create the raster if it is not cached yet and must return a
+        PIL image or numpy array of that shape. Returns None if the raster can not be cached.
+        """
+        fingerprint = get_file_fingerprint(filepath)
+        if fingerprint is None:
+            return None
+        nbytes = int(np.prod(shape))
+        path = self._get_path(filepath, fingerprint, name)
+        raster = self._map(path, shape, nbytes)
+        if raster is not None:
+            return raster
+        try:
+            with open(self._get_lock_path(path), "wb") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # another process might have created the raster in the meantime
+                    raster = self._map(path, shape, nbytes)
+                    if raster is None:
+                        self._evict(nbytes)
+                        self._write(path, np.asarray(decode(), dtype=np.uint8), shape)
+                        raster = self._map(path, shape, nbytes)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as ex:
+            logger.warning("Failed to cache decoded raster of %s: %s", filepath, ex)
+            return None
+        return raster
+
+    def _get_path(self, filepath, fingerprint, name):
+        digest = hashlib.blake2b(repr((filepath, fingerprint, name)).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + _RASTER_SUFFIX)
+
+    def _get_lock_path(self, path):
+        return path[: -len(_RASTER_SUFFIX)] + _LOCK_SUFFIX
+
+    def _map(self, path, shape, nbytes):
+        try:
+            if os.path.getsize(path) != nbytes:
+                return None
+            raster = np.memmap(path, dtype=np.uint8, mode="r", shape=shape)
+            # access time for eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return raster
+
+    def _write(self, path, raster, shape):
+        if raster.shape != tuple(shape):
+            raise OSError(f"Decoded raster has shape {raster.shape} instead of {tuple(shape)}")
+        tmp_path = f"{path}.{os.getpid()}{_TMP_SUFFIX}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(np.ascontiguousarray(raster).data)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove(tmp_path)
+            raise
+
+    def _evict(self, required_bytes):
+        if required_bytes > self.max_bytes:
+            raise OSError(f"Raster of {required_bytes} bytes exceeds the raster cache size")
+        # maps raster paths to (last access, size)
+        rasters = {}
+        total_bytes = 0
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(_TMP_SUFFIX):
+                    if now - stat.st_mtime > _TMP_MAX_AGE_SECONDS:
+                        self._remove(entry.path)
+                    else:
+                        total_bytes += stat.st_size
+                elif entry.name.endswith(_RASTER_SUFFIX):
+                    rasters[entry.path] = (stat.st_mtime, stat.st_size)
+                    total_bytes += stat.st_size
+        for path, (_, size) in sorted(rasters.items(), key=lambda item: item[1][0]):
+            if total_bytes + required_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            self._remove(self._get_lock_path(path))
+            total_bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,191 @@
+import fcntl
+import glob
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+from wsi_service.singletons import logger
+
+# file layout:
+#   file header (magic, stripe count, slot count and data size per stripe)
+#   stripes, each one consisting of
+#     stripe header (write position of the ring buffer)
+#     index slots (key digest, position and length of the record in the ring buffer)
+#     ring buffer with records (key digest, length, value)
+_MAGIC = b"WSISHM01"
+_FILE_HEADER = struct.Struct("<8sQQQ")
+_FILE_HEADER_SIZE = 64
+_STRIPE_HEADER = struct.Struct("<Q")
+_STRIPE_HEADER_SIZE = 64
+_SLOT = struct.Struct("<16sQI4x")
+_RECORD_HEADER = struct.Struct("<16sI")
+_EMPTY_DIGEST = bytes(16)
+_PROBE_LENGTH = 8
+
+
+class SharedMemoryCache:
+    """
+    Byte-budgeted key value cache in a memory mapped file (e.g. in /dev/shm) that is shared by all
+    processes opening the same file, e.g. the gunicorn workers of one host.
+
+    Keys are 16 byte digests. The budget is split into stripes, each guarded by a thread lock and
+    a lock on the stripe's byte range of the file. Values are appended to a ring buffer per stripe,
+    so the oldest values are overwritten first. Values read from the older half of the ring buffer
+    are appended again, which keeps frequently requested values in the cache.
+
+    The name of the file is the given path with the layout appended, so workers configured
+    differently (e.g. during a rolling restart with a new size) use separate files. Files are
+    created completely before they are moved into place and are never truncated, as other
+    processes may have them mapped.
+    """
+
+    def __init__(self, path, max_bytes, stripe_count=64, average_value_size=32 * 1024):
+        self.path = path
+        self.stripe_count = stripe_count
+        self.data_size = max(max_bytes // stripe_count // 8 * 8, 4096)
+        self.slot_count = max(2 * self.data_size // average_value_size, _PROBE_LENGTH)
+        self.max_value_size = self.data_size // 4 - _RECORD_HEADER.size
+        self.stripe_size = _STRIPE_HEADER_SIZE + self.slot_count * _SLOT.size + self.data_size
+        self.file_size = _FILE_HEADER_SIZE + self.stripe_count * self.stripe_size
+        self._locks = [threading.Lock() for _ in range(stripe_count)]
+        self._header = _FILE_HEADER.pack(_MAGIC, self.stripe_count, self.slot_count, self.data_size)
+        layout = f"{_MAGIC.decode('ascii')}-{self.stripe_count}-{self.slot_count}-{self.data_size}"
+        self.file_path = f"{path}.{layout}"
+        self._fd = self._open_file()
+        self._mmap = mmap.mmap(self._fd, self.file_size)
+
+    def get(self, digest):
+        stripe, first_slot = self._get_location(digest)
+        with self._lock_stripe(stripe) as stripe_offset:
+            head = _STRIPE_HEADER.unpack_from(self._mmap, stripe_offset)[0]
+            for slot in self._probe(first_slot):
+                slot_offset = self._get_slot_offset(stripe_offset, slot)
+                slot_digest, position, length = _SLOT.unpack_from(self._mmap, slot_offset)
+                if slot_digest != digest:
+                    continue
+                if head > position + self.data_size:
+                    # record has been overwritten in the meantime
+                    return None
+                record_offset = self._get_record_offset(stripe_offset, position)
+                record_digest, record_length = _RECORD_HEADER.unpack_from(self._mmap, record_offset)
+                if record_digest != digest or record_length != length:
+                    return None
+                value_offset = record_offset + _RECORD_HEADER.size
+                value = self._mmap[value_offset : value_offset + length]
+                if head - position > self.data_size // 2:
+                    position = self._append(stripe_offset, digest, value)
+                    _SLOT.pack_into(self._mmap, slot_offset, digest, position, length)
+                return value
+        return None
+
+    def put(self, digest, value):
+        if len(value) > self.max_value_size:
+            return False
+        stripe, first_slot = self._get_location(digest)
+        with self._lock_stripe(stripe) as stripe_offset:
+            position = self._append(stripe_offset, digest, value)
+            head = _STRIPE_HEADER.unpack_from(self._mmap, stripe_offset)[0]
+            target_offset = None
+            oldest_position = None
+            for slot in self._probe(first_slot):
+                slot_offset = self._get_slot_offset(stripe_offset, slot)
+                slot_digest, slot_position, _ = _SLOT.unpack_from(self._mmap, slot_offset)
+                if slot_digest in (digest, _EMPTY_DIGEST) or head > slot_position + self.data_size:
+                    target_offset = slot_offset
+                    break
+                if oldest_position is None or slot_position < oldest_position:
+                    target_offset = slot_offset
+                    oldest_position = slot_position
+            _SLOT.pack_into(self._mmap, target_offset, digest, position, len(value))
+        return True
+
+    def close(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _open_file(self):
+        try:
+            fd = os.open(self.file_path, os.O_RDWR)
+        except FileNotFoundError:
+            fd = None
+        if fd is not None and self._is_valid_file(fd):
+            return fd
+        if fd is not None:
+            os.close(fd)
+        logger.info("Initializing shared cache %s (%s bytes)", self.file_path, self.file_size)
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        tmp_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(tmp_fd, self.file_size)
+            os.pwrite(tmp_fd, self._header, 0)
+            if fd is None:
+                try:
+                    # another worker may have created the file in the meantime, its file is used then
+                    os.link(tmp_path, self.file_path)
+                except FileExistsError:
+                    pass
+            else:
+                # invalid files are replaced, processes mapping them keep their copy
+                os.replace(tmp_path, self.file_path)
+        finally:
+            os.close(tmp_fd)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._remove_other_layouts()
+        fd = os.open(self.file_path, os.O_RDWR)
+        if not self._is_valid_file(fd):
+            os.close(fd)
+            raise OSError(f"Shared cache file {self.file_path} has an unexpected layout")
+        return fd
+
+    def _is_valid_file(self, fd):
+        return os.fstat(fd).st_size == self.file_size and os.pread(fd, _FILE_HEADER.size, 0) == self._header
+
+    def _remove_other_layouts(self):
+        # files of other configurations stay mapped by the processes using them and are freed when they exit
+        for other_path in glob.glob(glob.escape(self.path) + f".{_MAGIC.decode('ascii')[:6]}*"):
+            if other_path != self.file_path and not other_path.endswith(".tmp"):
+                try:
+                    os.remove(other_path)
+                except OSError:
+                    pass
+
+    @contextmanager
+    def _lock_stripe(self, stripe):
+        stripe_offset = _FILE_HEADER_SIZE + stripe * self.stripe_size
+        with self._locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _STRIPE_HEADER_SIZE, stripe_offset)
+            try:
+                yield stripe_offset
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _STRIPE_HEADER_SIZE, stripe_offset)
+
+    def _append(self, stripe_offset, digest, value):
+        head = _STRIPE_HEADER.unpack_from(self._mmap, stripe_offset)[0]
+        record_size = _RECORD_HEADER.size + len(value)
+        if head % self.data_size + record_size > self.data_size:
+            # records never wrap around, continue at the start of the ring buffer
+            head += self.data_size - head % self.data_size
+        record_offset = self._get_record_offset(stripe_offset, head)
+        _RECORD_HEADER.pack_into(self._mmap, record_offset, digest, len(value))
+        value_offset = record_offset + _RECORD_HEADER.size
+        self._mmap[value_offset : value_offset + len(value)] = value
+        _STRIPE_HEADER.pack_into(self._mmap, stripe_offset, head + record_size)
+        return head
+
+    def _get_location(self, digest):
+        stripe = int.from_bytes(digest[:8], "little") % self.stripe_count
+        first_slot = int.from_bytes(digest[8:16], "little") % self.slot_count
+        return stripe, first_slot
+
+    def _probe(self, first_slot):
+        for i in range(_PROBE_LENGTH):
+            yield (first_slot + i) % self.slot_count
+
+    def _get_slot_offset(self, stripe_offset, slot):
+        return stripe_offset + _STRIPE_HEADER_SIZE + slot * _SLOT.size
+
+    def _get_record_offset(self, stripe_offset, position):
+        return stripe_offset + _STRIPE_HEADER_SIZE + self.slot_count * _SLOT.size + position % self.data_size
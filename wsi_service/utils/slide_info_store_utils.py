@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import threading
+
+from wsi_service.singletons import logger
+
+# waiting time for locks held by other processes writing to the database
+_BUSY_TIMEOUT_SECONDS = 5
+
+
+class SlideInfoStore:
+    """
+    Slide infos serialized as JSON in a SQLite database, shared by all workers of a host and kept
+    across restarts. Entries are keyed by slide id and plugin and are only returned for the file
+    path and file version (fingerprint) they were stored for, so infos of unchanged files are
+    served as stored, without opening the slide and without serializing the info again.
+
+    The database runs in WAL mode, so lookups are not blocked by other workers storing infos.
+    Errors of the database are logged and handled like missing entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS slide_info ("
+                "slide_id TEXT NOT NULL, plugin TEXT NOT NULL, filepath TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                "info TEXT NOT NULL, PRIMARY KEY (slide_id, plugin))"
+            )
+
+    def get(self, slide_id, plugin, filepath, fingerprint):
+        """
+        Returns the stored JSON of the slide info or None if there is none for this file version.
+        """
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT filepath, fingerprint, info FROM slide_info WHERE slide_id = ? AND plugin = ?",
+                    (slide_id, plugin),
+                ).fetchone()
+        except sqlite3.Error as ex:
+            logger.warning("Failed to read slide info of %s from store: %s", filepath, ex)
+            return None
+        if row is None or row[0] != filepath or row[1] != fingerprint:
+            return None
+        return row[2]
+
+    def put(self, slide_id, plugin, filepath, fingerprint, info):
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO slide_info (slide_id, plugin, filepath, fingerprint, info) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (slide_id, plugin, filepath, fingerprint, info),
+                )
+        except sqlite3.Error as ex:
+            logger.warning("Failed to store slide info of %s: %s", filepath, ex)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,3 +1,7 @@
+import hashlib
+import os
+import stat
+import time
 from collections import OrderedDict
 
 from wsi_service.models.v3.slide import SlideChannel, SlideColor, SlideExtent, SlideLevel
@@ -5,15 +9,24 @@ from wsi_service.singletons import logger
 
 
 class ExpiringSlide:
-    def __init__(self, slide, timer=None):
+    def __init__(self, slide):
         self.slide = slide
-        self.timer = timer
+        # number of requests currently reading from the slide, a slide in use is never closed
+        self.leases = 0
+        self.last_access = time.monotonic()
+        # removed from the slide cache, the slide is closed as soon as it is not in use anymore
+        self.evicted = False
+        self.closed = False
 
 
 class LRUCache:
-    def __init__(self, size):
+    def __init__(self, size, max_bytes=0):
         self.cache = OrderedDict()
         self.maxSize = size
+        # optional limit for the total size of all items, the most recently used item is always kept
+        self.max_bytes = max_bytes
+        self.sizes = {}
+        self.current_bytes = 0
 
     def get_all(self):
         return self.cache
@@ -27,15 +40,31 @@ class LRUCache:
         self.cache.move_to_end(key)
         return self.cache[key]
 
-    def put_item(self, key, item):
+    def get_size(self, key):
+        return self.sizes.get(key, 0)
+
+    def put_item(self, key, item, size=0):
+        """
+        Adds an item with an optional size and returns a list of (key, item) tuples evicted to stay within the limits.
+        """
+        if key in self.cache:
+            self.current_bytes -= self.sizes.pop(key, 0)
         self.cache[key] = item
         self.cache.move_to_end(key)
-        if len(self.cache) > self.maxSize:
+        self.sizes[key] = size
+        self.current_bytes += size
+        removed_items = []
+        while len(self.cache) > self.maxSize or (
+            self.max_bytes and self.current_bytes > self.max_bytes and len(self.cache) > 1
+        ):
             removed_item = self.cache.popitem(last=False)
+            self.current_bytes -= self.sizes.pop(removed_item[0], 0)
             logger.debug("Removing item from cache: %s", removed_item)
-            return removed_item
+            removed_items.append(removed_item)
+        return removed_items
 
     def pop_item(self, key):
+        self.current_bytes -= self.sizes.pop(key, 0)
         return self.cache.pop(key)
 
 
@@ -68,3 +97,25 @@ def get_rgb_channel_list():
     channels.append(SlideChannel(id=1, name="Green", color=SlideColor(r=0, g=255, b=0, a=0)))
     channels.append(SlideChannel(id=2, name="Blue", color=SlideColor(r=0, g=0, b=255, a=0)))
     return channels
+
+
+def get_file_fingerprint(filepath):
+    """
+    Returns a string that changes whenever the file at filepath is replaced or modified,
+    or None if the path does not exist. For folders (e.g. DICOM) the files directly
+    contained in the folder are taken into account as well.
+    """
+    try:
+        file_stat = os.stat(filepath)
+    except OSError:
+        return None
+    fingerprint = f"{file_stat.st_ino}-{file_stat.st_size}-{file_stat.st_mtime_ns}"
+    if stat.S_ISDIR(file_stat.st_mode):
+        entries = []
+        with os.scandir(filepath) as it:
+            for entry in it:
+                if entry.is_file():
+                    entry_stat = entry.stat()
+                    entries.append(f"{entry.name}:{entry_stat.st_size}:{entry_stat.st_mtime_ns}")
+        fingerprint += "-" + hashlib.md5("/".join(sorted(entries)).encode("utf-8")).hexdigest()
+    return fingerprint
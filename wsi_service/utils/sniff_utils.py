@@ -0,0 +1,126 @@
+import os
+import struct
+import threading
+
+from wsi_service.utils.slide_utils import LRUCache, get_file_fingerprint
+
+# enough for the first IFD of most TIFF writers, IFDs further in the file are read separately
+HEADER_SIZE = 16 * 1024
+# sniffs are only needed while the plugins of a path are resolved, the results are cached by the caller
+SNIFF_CACHE_SIZE = 256
+
+TIFF_MAGICS = (b"II*\0", b"MM\0*", b"II+\0", b"MM\0+")
+TAG_IMAGE_DESCRIPTION = 270
+TAG_PHOTOMETRIC = 262
+TAG_SAMPLES_PER_PIXEL = 277
+
+# integer TIFF types: BYTE, SHORT, LONG, LONG8
+_TIFF_INTEGER_FORMATS = {1: "B", 3: "H", 4: "I", 16: "Q"}
+_TIFF_TYPE_ASCII = 2
+# longer descriptions are not read, OME-XML is detected by its end
+_MAX_DESCRIPTION_SIZE = 1024 * 1024
+
+_sniff_cache = LRUCache(SNIFF_CACHE_SIZE)
+_sniff_cache_lock = threading.Lock()
+
+
+class FileSniff:
+    """
+    What plugins need to know about a slide path to decide whether they support it, gathered once
+    per file version and shared by the is_supported checks of all plugins: the type of the path,
+    the first bytes of files, the tags of the first IFD of TIFF files and the suffixes of the files
+    in folders. Tags and suffixes are only read when first requested.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.is_file = os.path.isfile(filepath)
+        self.is_dir = not self.is_file and os.path.isdir(filepath)
+        self.header = b""
+        if self.is_file:
+            try:
+                with open(filepath, "rb") as f:
+                    self.header = f.read(HEADER_SIZE)
+            except OSError:
+                pass
+        self._tiff_tags = None
+        self._folder_suffixes = None
+
+    @property
+    def is_tiff(self):
+        return self.header[:4] in TIFF_MAGICS
+
+    def get_tiff_tags(self):
+        """
+        Returns the integer tags with a single value and the image description of the first IFD
+        as dict by tag code, empty if the file is no TIFF file or its first IFD can not be read.
+        """
+        if self._tiff_tags is None:
+            try:
+                self._tiff_tags = self._read_tiff_tags() if self.is_tiff else {}
+            except (OSError, struct.error):
+                self._tiff_tags = {}
+        return self._tiff_tags
+
+    def get_folder_suffixes(self):
+        """
+        Returns the set of suffixes (e.g. ".dcm") of the files directly contained in a folder.
+        """
+        if self._folder_suffixes is None:
+            suffixes = set()
+            if self.is_dir:
+                with os.scandir(self.filepath) as it:
+                    suffixes = {os.path.splitext(entry.name)[1] for entry in it}
+            self._folder_suffixes = suffixes
+        return self._folder_suffixes
+
+    def _read(self, f, offset, length):
+        if offset + length <= len(self.header):
+            return self.header[offset : offset + length]
+        f.seek(offset)
+        return f.read(length)
+
+    def _read_tiff_tags(self):
+        byteorder = "<" if self.header[:2] == b"II" else ">"
+        if self.header[2:4] in (b"*\0", b"\0*"):
+            ifd_offset = struct.unpack(byteorder + "I", self.header[4:8])[0]
+            count_format, entry_format, entry_size, value_size = "H", "HHI4s", 12, 4
+        else:
+            ifd_offset = struct.unpack(byteorder + "Q", self.header[8:16])[0]
+            count_format, entry_format, entry_size, value_size = "Q", "HHQ8s", 20, 8
+        count_size = struct.calcsize(count_format)
+        tags = {}
+        with open(self.filepath, "rb") as f:
+            count = struct.unpack(byteorder + count_format, self._read(f, ifd_offset, count_size))[0]
+            entries = self._read(f, ifd_offset + count_size, count * entry_size)
+            for i in range(count):
+                code, dtype, value_count, value = struct.unpack(
+                    byteorder + entry_format, entries[i * entry_size : (i + 1) * entry_size]
+                )
+                if dtype in _TIFF_INTEGER_FORMATS and value_count == 1:
+                    value_format = byteorder + _TIFF_INTEGER_FORMATS[dtype]
+                    tags[code] = struct.unpack(value_format, value[: struct.calcsize(value_format)])[0]
+                elif code == TAG_IMAGE_DESCRIPTION and dtype == _TIFF_TYPE_ASCII:
+                    if value_count > _MAX_DESCRIPTION_SIZE:
+                        continue
+                    if value_count > value_size:
+                        value_offset = struct.unpack(byteorder + ("I" if value_size == 4 else "Q"), value)[0]
+                        value = self._read(f, value_offset, value_count)
+                    tags[code] = value[:value_count].split(b"\0", 1)[0].decode("utf-8", errors="replace")
+        return tags
+
+
+def get_file_sniff(filepath):
+    """
+    Returns the sniff of the current version of the file or folder at filepath. Sniffs are cached,
+    so the checks of all plugins and repeated checks of unchanged files share one sniff.
+    """
+    fingerprint = get_file_fingerprint(filepath)
+    with _sniff_cache_lock:
+        cached = _sniff_cache.get_item(filepath)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    sniff = FileSniff(filepath)
+    with _sniff_cache_lock:
+        _sniff_cache.put_item(filepath, (fingerprint, sniff))
+    return sniff
@@ -145,7 +145,7 @@ class Slide(BaseSlide):
 
     def _open_mbtiles_dataset(self):
         try:
-            self._mbtiles_conn = sqlite3.connect(str(self.source))
+            self._mbtiles_conn = sqlite3.connect(str(self.source), check_same_thread=False)
         except sqlite3.Error as exc:
             raise HTTPException(status_code=400, detail=f"Failed to open MBTiles file: {exc}") from exc
 
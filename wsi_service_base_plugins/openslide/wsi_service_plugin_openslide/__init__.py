@@ -1,11 +1,13 @@
-import os
 import pathlib
 
 from wsi_service_plugin_openslide.slide import Slide
 
+from wsi_service.utils.sniff_utils import get_file_sniff
+
 
 def is_supported(filepath):
-    if os.path.isfile(filepath):
+    sniff = get_file_sniff(filepath)
+    if sniff.is_file:
         filename = pathlib.Path(filepath).name
         suffix = pathlib.Path(filepath).suffix
         if filename.endswith("ome.tif") or filename.endswith("ome.tiff"):
@@ -14,7 +16,7 @@ def is_supported(filepath):
     # VSF is not supported
     else:
     #     return any(list(pathlib.Path(filepath).glob("*.vsf")))
-        return any(list(pathlib.Path(filepath).glob("*.dcm")))
+        return ".dcm" in sniff.get_folder_suffixes()
 
 async def open(filepath):
     return await Slide.create(filepath)
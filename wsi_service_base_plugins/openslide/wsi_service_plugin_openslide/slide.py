@@ -12,6 +12,9 @@ from wsi_service.utils.icc_profile import ICCProfile, ICCProfileError
 from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
 
+# default size of the tile cache of an OpenSlide handle
+OPENSLIDE_CACHE_SIZE = 32 * 1024 * 1024
+
 
 class Slide(BaseSlide):
     supported_vendors = [
@@ -46,6 +49,10 @@ class Slide(BaseSlide):
     async def get_info(self):
         return self.slide_info
 
+    def get_memory_footprint(self):
+        # each handle fills its own tile cache of decoded tiles
+        return super().get_memory_footprint() + OPENSLIDE_CACHE_SIZE
+
     async def get_region(
             self,
             level,
@@ -1,3 +1,5 @@
+import threading
+
 from fastapi import HTTPException
 from PIL import Image, UnidentifiedImageError
 
@@ -5,43 +7,94 @@ from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlideLevel, Slid
 from wsi_service.singletons import settings
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.icc_profile import ICCProfileError, ICCProfile
+from wsi_service.utils.raster_cache_utils import SharedRasterCache
 from wsi_service.utils.slide_utils import get_rgb_channel_list
 
+# JPEG decoders can scale by 1/2, 1/4 and 1/8 while decoding (draft mode)
+MAX_DRAFT_DOWNSAMPLE = 8
+
+_raster_cache = None
+
+
+def _to_rgb(image):
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def _get_raster_cache():
+    global _raster_cache
+    if _raster_cache is None and settings.raster_cache_dir:
+        _raster_cache = SharedRasterCache(settings.raster_cache_dir, settings.raster_cache_max_bytes)
+    return _raster_cache
+
 
 class Slide(BaseSlide):
+    """
+    Flat images (JPEG, PNG, ...) get synthetic levels, each downsampled by 2 from the previous one,
+    until a level fits into a tile. Only the header is read on open, levels are decoded on first
+    access and kept in memory. For JPEG files, levels up to a downsample factor of 8 are decoded
+    directly from the file in draft mode, so zoomed out views do not need the full resolution image.
+    Other levels are reduced from the next finer level.
+
+    If a raster cache directory is configured, decoded levels are stored in memory mapped files shared
+    by all workers of a host instead of being held by each handle. Shared levels are stored as RGBX,
+    PIL only wraps buffers of modes with 4 bytes per pixel without copying them.
+    """
+
     async def open(self, filepath):
         try:
-            self.slide_image = Image.open(filepath)
+            with Image.open(filepath) as image:
+                self._is_jpeg = image.format == "JPEG"
+                self._icc_profile = image.info.get("icc_profile")
+                width, height = image.size
         except UnidentifiedImageError:
             raise HTTPException(status_code=500, detail="PIL Unidentified Image Error")
-        self.slide_image = Image.open(filepath).convert("RGB")
-        width, height = self.slide_image.size
         self._icc = ICCProfile()
 
         channels = get_rgb_channel_list()
+        if width < 5000 and height < 5000:
+            tile_extent = SlideExtent(x=width, y=height, z=1)
+        else:
+            tile_extent = SlideExtent(x=1024, y=1024, z=1)
+        levels = self._get_levels(width, height, tile_extent)
         self.slide_info = SlideInfo(
             id="",
             channels=channels,
             channel_depth=8,
             extent=SlideExtent(x=width, y=height, z=1),
-            num_levels=1,
+            num_levels=len(levels),
             pixel_size_nm=SlidePixelSizeNm(x=-1, y=-1),  # pixel size unknown
-            tile_extent=SlideExtent(x=width, y=height, z=1) if width < 5000 and height < 5000 else SlideExtent(x=1024, y=1024, z=1),
-            levels=[SlideLevel(extent=SlideExtent(x=width, y=height, z=1), downsample_factor=1.0)],
+            tile_extent=tile_extent,
+            levels=levels,
         )
+        # decoded level images, None until a level is accessed
+        self._level_images = [None] * len(levels)
+        self._level_lock = threading.RLock()
 
     async def close(self):
-        self.slide_image.close()
+        for level_image in self._level_images:
+            if level_image is not None:
+                level_image.close()
         self._icc.free_cache()
 
     async def get_info(self):
         return self.slide_info
 
+    def get_memory_footprint(self):
+        # estimated once on open, so all levels are counted as if decoded, except for levels
+        # fitting into the raster cache, which are shared memory mapped files not owned by the handle
+        raster_cache = _get_raster_cache()
+        levels_nbytes = 0
+        for level in range(len(self.slide_info.levels)):
+            height, width, samples = self._get_raster_shape(level)
+            if raster_cache is None or height * width * samples > raster_cache.max_bytes:
+                levels_nbytes += height * width * 3
+        return super().get_memory_footprint() + levels_nbytes
+
     async def get_region(self, level, start_x, start_y, size_x, size_y, padding_color=None, z=0,
                          icc_profile_intent: str = None, icc_profile_strict: bool = False):
         if padding_color is None:
             padding_color = settings.padding_color
-        region = self.slide_image.crop(
+        region = self._get_level_image(level).crop(
             (
                 start_x,
                 start_y,
@@ -49,12 +102,12 @@ class Slide(BaseSlide):
                 start_y + size_y,
             )
         )
+        region = _to_rgb(region)
 
         if icc_profile_intent is not None:
             try:
-                profile = self.slide_image.info.get("icc_profile")
                 region = self._icc.process_pil_image(
-                    region, profile, icc_profile_strict, icc_profile_intent, True
+                    region, self._icc_profile, icc_profile_strict, icc_profile_intent, True
                 )
             except ICCProfileError as e:
                 raise HTTPException(status_code=e.payload["status_code"], detail=e.payload["detail"]) from e
@@ -62,13 +115,18 @@ class Slide(BaseSlide):
         return region
 
     async def get_thumbnail(self, max_x, max_y, icc_profile_intent: str = None, icc_profile_strict: bool = False):
-        thumbnail = self.slide_image.copy()
+        if not hasattr(self, "thumbnail"):
+            # converting copies the source, also if it already is an RGB image
+            self.thumbnail = self._get_thumbnail_source(
+                settings.max_thumbnail_size, settings.max_thumbnail_size
+            ).convert("RGB")
+            self.thumbnail.thumbnail((settings.max_thumbnail_size, settings.max_thumbnail_size))
+        thumbnail = self.thumbnail.copy()
         thumbnail.thumbnail((max_x, max_y))
         if icc_profile_intent is not None:
             try:
-                profile = self.slide_image.info.get("icc_profile")
                 thumbnail = self._icc.process_pil_image(
-                    thumbnail, profile, icc_profile_strict, icc_profile_intent, True
+                    thumbnail, self._icc_profile, icc_profile_strict, icc_profile_intent, True
                 )
             except ICCProfileError as e:
                 raise HTTPException(status_code=e.payload["status_code"], detail=e.payload["detail"]) from e
@@ -95,10 +153,74 @@ class Slide(BaseSlide):
         self._get_associated_image("macro")
 
     async def get_icc_profile(self):
-        return self._icc.get_for_payload(self.slide_image.info.get("icc_profile", None))
+        return self._icc.get_for_payload(self._icc_profile)
 
     # private
 
+    def _get_levels(self, width, height, tile_extent):
+        levels = [SlideLevel(extent=SlideExtent(x=width, y=height, z=1), downsample_factor=1.0)]
+        downsample = 1
+        while width > tile_extent.x or height > tile_extent.y:
+            downsample *= 2
+            # same rounding as Image.reduce
+            width, height = -(-width // 2), -(-height // 2)
+            levels.append(SlideLevel(extent=SlideExtent(x=width, y=height, z=1), downsample_factor=float(downsample)))
+        return levels
+
+    def _get_level_image(self, level):
+        level_image = self._level_images[level]
+        if level_image is not None:
+            return level_image
+        with self._level_lock:
+            if self._level_images[level] is None:
+                self._level_images[level] = self._load_level_image(level)
+            return self._level_images[level]
+
+    def _get_raster_shape(self, level):
+        extent = self.slide_info.levels[level].extent
+        return (extent.y, extent.x, 4)
+
+    def _load_level_image(self, level):
+        raster_cache = _get_raster_cache()
+        if raster_cache is not None:
+            extent = self.slide_info.levels[level].extent
+            raster = raster_cache.get(
+                self.filepath,
+                level,
+                self._get_raster_shape(level),
+                lambda: self._decode_level_image(level).convert("RGBX"),
+            )
+            if raster is not None:
+                # image backed by the read-only mapping, only cropped regions are copied
+                return Image.frombuffer("RGBX", (extent.x, extent.y), raster, "raw", "RGBX", 0, 1)
+        # a level reduced from a shared level is RGBX as well
+        return _to_rgb(self._decode_level_image(level))
+
+    def _decode_level_image(self, level):
+        downsample = int(self.slide_info.levels[level].downsample_factor)
+        if level > 0 and self._level_images[level - 1] is not None:
+            # reducing a decoded level is cheaper than decoding the file again
+            return self._level_images[level - 1].reduce(2)
+        if level == 0 or (self._is_jpeg and downsample <= MAX_DRAFT_DOWNSAMPLE):
+            extent = self.slide_info.levels[level].extent
+            with Image.open(self.filepath) as image:
+                if level > 0:
+                    # draft selects the scale by the floored size, libjpeg rounds the scaled size up
+                    image.draft("RGB", (image.width // downsample, image.height // downsample))
+                level_image = image.convert("RGB")
+            if level_image.size != (extent.x, extent.y):
+                level_image = level_image.resize((extent.x, extent.y), Image.Resampling.BOX)
+            return level_image
+        return self._get_level_image(level - 1).reduce(2)
+
+    def _get_thumbnail_source(self, max_x, max_y):
+        # coarsest level that is still at least as large as the thumbnail
+        for level in reversed(range(len(self.slide_info.levels))):
+            extent = self.slide_info.levels[level].extent
+            if extent.x >= max_x or extent.y >= max_y:
+                return self._get_level_image(level)
+        return self._get_level_image(0)
+
     def _get_associated_image(self, associated_image_name):
         raise HTTPException(
             status_code=404,
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from wsi_service.singletons import settings
+from wsi_service_plugin_pil import slide as slide_module
+from wsi_service_plugin_pil.slide import Slide
+
+
+@pytest.fixture(params=["jpeg", "png"])
+def large_image_path(request, tmp_path):
+    path = tmp_path / f"large.{request.param}"
+    image = np.zeros((6000, 9000, 3), dtype=np.uint8)
+    image[:, 4500:] = (200, 100, 50)
+    Image.fromarray(image).save(path, quality=95)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_large_image_has_lazy_levels(large_image_path):
+    slide = await Slide.create(large_image_path)
+    info = await slide.get_info()
+    assert info.num_levels == 5
+    assert [level.downsample_factor for level in info.levels] == [1, 2, 4, 8, 16]
+    assert (info.levels[4].extent.x, info.levels[4].extent.y) == (563, 375)
+    assert slide._level_images == [None] * 5
+
+    tile = await slide.get_tile(4, 0, 0)
+    assert tile.size == (1024, 1024)
+    assert np.allclose(np.asarray(tile)[100, 400], (200, 100, 50), atol=8)
+    assert np.asarray(tile)[100, 100].max() <= 8
+    if large_image_path.endswith(".jpeg"):
+        # decoded in draft mode, full resolution is not needed
+        assert slide._level_images[:3] == [None] * 3
+    else:
+        assert all(level_image is not None for level_image in slide._level_images)
+
+    thumbnail = await slide.get_thumbnail(500, 500)
+    assert thumbnail.size == (500, 333)
+    await slide.close()
+
+
+@pytest.mark.asyncio
+async def test_small_image_has_single_level(tmp_path):
+    path = str(tmp_path / "small.png")
+    Image.new("RGB", (500, 358)).save(path)
+    slide = await Slide.create(path)
+    info = await slide.get_info()
+    assert info.num_levels == 1
+    assert (info.tile_extent.x, info.tile_extent.y) == (500, 358)
+    await slide.close()
+
+
+@pytest.mark.asyncio
+async def test_levels_are_shared_through_raster_cache(large_image_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "raster_cache_dir", str(tmp_path / "rasters"))
+    monkeypatch.setattr(slide_module, "_raster_cache", None)
+    slide = await Slide.create(large_image_path)
+    tile = await slide.get_tile(4, 0, 0)
+    assert np.allclose(np.asarray(tile)[100, 400], (200, 100, 50), atol=8)
+    assert slide.get_memory_footprint() < 2 * 1024 * 1024
+
+    other_slide = await Slide.create(large_image_path)
+    other_tile = await other_slide.get_tile(4, 0, 0)
+    assert np.array_equal(np.asarray(tile), np.asarray(other_tile))
+    assert len([name for name in os.listdir(tmp_path / "rasters") if name.endswith(".raw")]) >= 1
+
+    # both handles are backed by the mapped file, changes to it are visible without decoding again
+    level_images = [slide._level_images[4], other_slide._level_images[4]]
+    assert all(level_image.readonly for level_image in level_images)
+    extent = (await slide.get_info()).levels[4].extent
+    raster_path = next(
+        entry.path
+        for entry in os.scandir(tmp_path / "rasters")
+        if entry.name.endswith(".raw") and entry.stat().st_size == extent.x * extent.y * 4
+    )
+    raster = np.memmap(raster_path, dtype=np.uint8, mode="r+", shape=(extent.y, extent.x, 4))
+    raster[0, 0, :3] = (1, 2, 3)
+    raster.flush()
+    assert [level_image.getpixel((0, 0))[:3] for level_image in level_images] == [(1, 2, 3), (1, 2, 3)]
+    assert (await slide.get_tile(4, 0, 0)).getpixel((0, 0)) == (1, 2, 3)
+
+    # levels that do not fit into the raster cache are held by each handle
+    monkeypatch.setattr(slide_module._raster_cache, "max_bytes", 9000 * 6000 * 4 - 1)
+    assert slide.get_memory_footprint() > 9000 * 6000 * 3
+    await slide.close()
+    await other_slide.close()
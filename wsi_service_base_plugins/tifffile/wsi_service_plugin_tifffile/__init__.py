@@ -1,10 +1,10 @@
-import os
 import pathlib
 
 import tifffile
-
 from wsi_service_plugin_tifffile.slide import Slide
 
+from wsi_service.utils.sniff_utils import TAG_IMAGE_DESCRIPTION, TAG_PHOTOMETRIC, TAG_SAMPLES_PER_PIXEL, get_file_sniff
+
 priority = 2
 
 _OME_SUFFIXES = (".ome.tif", ".ome.tiff", ".ome.tf2", ".ome.tf8", ".ome.btf")
@@ -16,7 +16,8 @@ _PHOTOMETRIC_YCBCR = 6
 
 
 def is_supported(filepath):
-    if not os.path.isfile(filepath):
+    sniff = get_file_sniff(filepath)
+    if not sniff.is_file:
         return False
 
     filename = pathlib.Path(filepath).name.lower()
@@ -24,9 +25,22 @@ def is_supported(filepath):
         return True
 
     suffix = pathlib.Path(filepath).suffix.lower()
-    if suffix not in _TIFF_SUFFIXES:
+    if suffix not in _TIFF_SUFFIXES or not sniff.is_tiff:
         return False
 
+    # most files are decided by the tags of the first IFD without parsing the file
+    tags = sniff.get_tiff_tags()
+    if tags.get(TAG_IMAGE_DESCRIPTION, "").rstrip().endswith("OME>"):
+        return True
+    samples = tags.get(TAG_SAMPLES_PER_PIXEL)
+    photometric = tags.get(TAG_PHOTOMETRIC)
+    if samples is not None and photometric is not None:
+        if photometric in (_PHOTOMETRIC_RGB, _PHOTOMETRIC_YCBCR) and samples in (3, 4):
+            return False
+        if samples > 1:
+            return True
+
+    # single sample images are supported if their series has a channel axis
     try:
         with tifffile.TiffFile(filepath) as tf:
             if tf.is_ome:
@@ -0,0 +1,50 @@
+import sys
+import threading
+
+from wsi_service.utils.slide_utils import LRUCache
+
+
+class DecodedTileCache:
+    """
+    Per-process LRU cache of decoded TIFF tiles limited by the total size of the cached arrays.
+    Keys identify the file version (path and fingerprint), the page and the tile index, so tiles
+    shared by overlapping regions are only read and decoded once. Cached arrays are read-only.
+
+    Methods are called from the reader and decoder threads and are guarded by a lock.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._tiles = LRUCache(sys.maxsize, max_bytes)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @property
+    def current_bytes(self):
+        return self._tiles.current_bytes
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get_item(key)
+            if tile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return tile
+
+    def put(self, key, tile):
+        # tiles larger than an eighth of the budget would evict too many other tiles
+        if tile.nbytes > self.max_bytes // 8:
+            return
+        tile.flags.writeable = False
+        with self._lock:
+            self._tiles.put_item(key, tile, tile.nbytes)
+
+    def clear(self):
+        with self._lock:
+            self._tiles = LRUCache(sys.maxsize, self.max_bytes)
@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+import numpy as np
+
+from wsi_service.models.v3.slide import SlideInfo
+from wsi_service.singletons import logger
+
+# stored in each index, indices of other versions are rebuilt
+INDEX_VERSION = 1
+_INDEX_SUFFIX = ".npz"
+_TMP_SUFFIX = ".tmp"
+
+
+class PageIndex:
+    """
+    Everything needed to serve a TIFF series without walking its IFDs or parsing its OME-XML:
+    the slide info, the channel layout and, per level, the file and IFD offset of each page.
+    Pages are only read from their IFD when they are first accessed.
+
+    files are paths relative to the folder of the slide file (OME-TIFF series can span several
+    files), page_files and page_offsets hold one array per level indexing into files and giving
+    the IFD offsets of the pages.
+    """
+
+    def __init__(self, slide_info, layout, files, page_files, page_offsets):
+        self.slide_info = slide_info
+        self.layout = layout
+        self.files = files
+        self.page_files = page_files
+        self.page_offsets = page_offsets
+
+
+class PageIndexStore:
+    """
+    Stores page indices as small NumPy archives in a directory. Files are keyed by path and
+    fingerprint of the slide file, so indices of changed files are not found anymore.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, filepath, fingerprint):
+        """
+        Returns the stored index of the slide file or None if there is no valid index.
+        """
+        path = self._get_path(filepath, fingerprint)
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                if int(archive["version"]) != INDEX_VERSION:
+                    return None
+                slide_info = SlideInfo.model_validate_json(str(archive["slide_info"]))
+                return PageIndex(
+                    slide_info=slide_info,
+                    layout=str(archive["layout"]),
+                    files=[str(file) for file in archive["files"]],
+                    page_files=[archive[f"page_files_{i}"] for i in range(len(slide_info.levels))],
+                    page_offsets=[archive[f"page_offsets_{i}"] for i in range(len(slide_info.levels))],
+                )
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError) as ex:
+            logger.warning("Ignoring invalid page index of %s: %s", filepath, ex)
+            return None
+
+    def save(self, filepath, fingerprint, index):
+        path = self._get_path(filepath, fingerprint)
+        arrays = {
+            "version": np.array(INDEX_VERSION),
+            "slide_info": np.array(index.slide_info.model_dump_json()),
+            "layout": np.array(index.layout),
+            "files": np.array(index.files),
+        }
+        for i, (page_files, page_offsets) in enumerate(zip(index.page_files, index.page_offsets)):
+            arrays[f"page_files_{i}"] = np.asarray(page_files, dtype=np.int32)
+            arrays[f"page_offsets_{i}"] = np.asarray(page_offsets, dtype=np.int64)
+        tmp_path = f"{path}.{os.getpid()}{_TMP_SUFFIX}"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except OSError as ex:
+            logger.warning("Failed to store page index of %s: %s", filepath, ex)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _get_path(self, filepath, fingerprint):
+        digest = hashlib.blake2b(repr((filepath, fingerprint)).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + _INDEX_SUFFIX)
@@ -1,19 +1,23 @@
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor, wait
 from threading import Lock
-from PIL import Image
 
 import numpy as np
 import tifffile
 from defusedxml import ElementTree as xml
 from fastapi import HTTPException
-from skimage import transform, util
+from skimage import transform
 
 from wsi_service.models.v3.slide import SlideChannel, SlideColor, SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import logger, settings
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.icc_profile import ICCProfile, ICCProfileError
 from wsi_service.utils.image_utils import convert_int_to_rgba_array, convert_narray_to_pil_image
-from wsi_service.utils.slide_utils import get_original_levels
+from wsi_service.utils.io_utils import PositionalFileReader
+from wsi_service.utils.slide_utils import get_file_fingerprint, get_original_levels
+from wsi_service_plugin_tifffile.decoded_tile_cache import DecodedTileCache
+from wsi_service_plugin_tifffile.page_index import PageIndex, PageIndexStore
 
 _LAYOUT_PAGE_PER_CHANNEL = "page-per-channel"
 _LAYOUT_CHUNKY_SAMPLES = "chunky-samples"
@@ -30,29 +34,136 @@ _DEFAULT_PALETTE = [
     (255, 255, 255),
 ]
 
+# tiles closer than this in the file are fetched with a single read, the bytes in between are discarded
+MAX_READ_GAP = 64 * 1024
+MAX_READ_SIZE = 32 * 1024 * 1024
+
+_decode_executor = None
+_page_index_store = None
+decoded_tile_cache = DecodedTileCache(settings.tifffile_tile_cache_max_bytes)
+
+
+def _get_decode_executor():
+    global _decode_executor
+    if _decode_executor is None:
+        _decode_executor = ThreadPoolExecutor(
+            max_workers=settings.tifffile_decode_threads, thread_name_prefix="wsi-tifffile-decode"
+        )
+    return _decode_executor
+
+
+def _get_page_index_store():
+    global _page_index_store
+    if _page_index_store is None and settings.tifffile_index_dir:
+        _page_index_store = PageIndexStore(settings.tifffile_index_dir)
+    return _page_index_store
+
+
+def get_coalesced_reads(segments, max_gap=MAX_READ_GAP, max_size=MAX_READ_SIZE):
+    """
+    Groups segments (tuples starting with offset and bytecount) into reads of nearby byte ranges.
+    Returns a list of (offset, length, segments) in file order.
+    """
+    reads = []
+    for segment in sorted(segments, key=lambda segment: segment[0]):
+        offset, bytecount = segment[0], segment[1]
+        if reads:
+            read_offset, read_length, read_segments = reads[-1]
+            read_end = read_offset + read_length
+            end = max(read_end, offset + bytecount)
+            if offset - read_end <= max_gap and end - read_offset <= max_size:
+                reads[-1] = (read_offset, end - read_offset, read_segments + [segment])
+                continue
+        reads.append((offset, bytecount, [segment]))
+    return reads
+
+
+def get_thumbnail_size(extent_x, extent_y, max_x, max_y):
+    """
+    Returns the size of an image of the given extent scaled to fit into max_x and max_y.
+    """
+    scale = min(max_x / extent_x, max_y / extent_y)
+    return max(1, min(max_x, round(extent_x * scale))), max(1, min(max_y, round(extent_y * scale)))
+
+
+def get_block_mean(array, factor):
+    """
+    Downsamples an array of shape (channels, height, width) by an integer factor averaging
+    factor x factor blocks, remaining rows and columns are dropped. The result keeps the dtype.
+    """
+    if factor == 1:
+        return array
+    channels, height, width = array.shape
+    height, width = height // factor, width // factor
+    blocks = array[:, : height * factor, : width * factor].reshape(channels, height, factor, width, factor)
+    if np.issubdtype(array.dtype, np.integer):
+        # integer sums of the blocks are exact and need no float copy of the level
+        sums = blocks.sum(axis=(2, 4), dtype=np.int64 if np.issubdtype(array.dtype, np.signedinteger) else np.uint64)
+        return ((sums + factor * factor // 2) // (factor * factor)).astype(array.dtype)
+    return blocks.mean(axis=(2, 4), dtype=np.float64).astype(array.dtype)
+
+
+def resize_image_array(array, size_x, size_y):
+    """
+    Resizes an array of shape (channels, height, width) keeping its dtype and value range.
+    """
+    if array.shape[1:] == (size_y, size_x):
+        return array
+    resized = transform.resize(array, (array.shape[0], size_y, size_x), preserve_range=True, anti_aliasing=True)
+    if np.issubdtype(array.dtype, np.integer):
+        resized = np.rint(resized)
+    return resized.astype(array.dtype)
+
 
 class Slide(BaseSlide):
+    # page-per-channel images only read and decode the pages of the requested channels
+    supports_channel_selection = True
+
     async def open(self, filepath):
         self.locker = Lock()
+        # positional readers per file of the series (OME-TIFF series can span several files)
+        self.readers = {}
+        # identifies the file version in keys of the decoded tile cache
+        self.fingerprint = get_file_fingerprint(filepath)
         try:
             self.tif_slide = tifffile.TiffFile(filepath)
         except Exception as e:
             raise HTTPException(status_code=404, detail=f"Failed to load tiff file. [{e}]")
-
-        if self.tif_slide.is_ome:
-            try:
-                self.ome_metadata = self.tif_slide.ome_metadata
-                self.parsed_metadata = xml.fromstring(self.ome_metadata)
-            except Exception as ex:
-                raise HTTPException(status_code=400, detail=f"Could not obtain ome metadata ({ex})")
-            self.slide_info = self.__get_slide_info_ome_tif()
-            self.layout = _LAYOUT_PAGE_PER_CHANNEL
+        # pages by (level, index) and open files by path, both filled on first access
+        self.pages = {}
+        self.tiff_files = {self.tif_slide.filehandle.path: self.tif_slide}
+        # fingerprints of the files of the series by path, pages of different files can share IFD offsets
+        self.file_fingerprints = {self.tif_slide.filehandle.path: self.fingerprint}
+
+        # with a stored page index the series is not parsed at all
+        page_index_store = _get_page_index_store()
+        self.page_index = None if page_index_store is None else page_index_store.load(filepath, self.fingerprint)
+        if self.page_index is not None:
+            self.slide_info = self.page_index.slide_info
+            self.layout = self.page_index.layout
         else:
-            self.slide_info, self.layout = self.__get_slide_info_generic_tif()
+            if self.tif_slide.is_ome:
+                try:
+                    self.ome_metadata = self.tif_slide.ome_metadata
+                    self.parsed_metadata = xml.fromstring(self.ome_metadata)
+                except Exception as ex:
+                    raise HTTPException(status_code=400, detail=f"Could not obtain ome metadata ({ex})")
+                self.slide_info = self.__get_slide_info_ome_tif()
+                self.layout = _LAYOUT_PAGE_PER_CHANNEL
+            else:
+                self.slide_info, self.layout = self.__get_slide_info_generic_tif()
+            self.page_index = self.__create_page_index()
+            if page_index_store is not None:
+                page_index_store.save(filepath, self.fingerprint, self.page_index)
 
         self._icc = ICCProfile()
 
     async def close(self):
+        for reader in self.readers.values():
+            reader.close()
+        for tiff_file in self.tiff_files.values():
+            if tiff_file is not self.tif_slide:
+                tiff_file.close()
         self.tif_slide.close()
         self._icc.free_cache()
 
@@ -60,46 +171,26 @@ class Slide(BaseSlide):
         return self.slide_info
 
     async def get_region(self, level, start_x, start_y, size_x, size_y, padding_color=None, z=0,
-                         icc_profile_intent: str = None, icc_profile_strict: bool = False):
+                         icc_profile_intent: str = None, icc_profile_strict: bool = False, channels=None):
         if padding_color is None:
             padding_color = settings.padding_color
-        level_slide = self.slide_info.levels[level]
-        tif_level = self.__get_tif_level_for_slide_level(level_slide)
-
-        result = self.__assemble_region(tif_level, start_x, start_y, size_x, size_y, padding_color)
+        result = self.__assemble_region(level, start_x, start_y, size_x, size_y, padding_color, channels)
 
         if icc_profile_intent is not None:
-            try:
-                profile = tif_level.pages[0].tags.get("ICCProfile")
-                result_data = convert_narray_to_pil_image(narray=result)
-                result = self._icc.process_pil_image(
-                    result_data, profile, icc_profile_strict, icc_profile_intent, True
-                )
-            except ICCProfileError as e:
-                raise HTTPException(status_code=e.payload["status_code"], detail=e.payload["detail"]) from e
+            result = self.__apply_icc_profile(level, result, icc_profile_intent, icc_profile_strict)
 
         return result
 
     async def get_thumbnail(self, max_x, max_y, icc_profile_intent: str = None, icc_profile_strict: bool = False):
-        thumb_level = len(self.slide_info.levels) - 1
-        for i, level in enumerate(self.slide_info.levels):
-            if level.extent.x < max_x or level.extent.y < max_y:
-                thumb_level = i
-                break
-        level_extent_x = self.slide_info.levels[thumb_level].extent.x
-        level_extent_y = self.slide_info.levels[thumb_level].extent.y
+        if not hasattr(self, "thumbnail"):
+            self.thumbnail = await self.__get_thumbnail(settings.max_thumbnail_size, settings.max_thumbnail_size)
+        _, thumbnail_y, thumbnail_x = self.thumbnail.shape
+        size_x, size_y = get_thumbnail_size(thumbnail_x, thumbnail_y, max_x, max_y)
+        thumbnail = resize_image_array(self.thumbnail, size_x, size_y)
 
-        if max_x > max_y:
-            max_y = max_y * (level_extent_y / level_extent_x)
-        else:
-            max_x = max_x * (level_extent_x / level_extent_y)
-        thumbnail_org = await self.get_region(thumb_level, 0, 0, level_extent_x, level_extent_y,
-                                              settings.padding_color, 0, icc_profile_intent, icc_profile_strict)
-        if type(thumbnail_org) is np.ndarray:
-            thumbnail_resized = util.img_as_uint(transform.resize(thumbnail_org, (thumbnail_org.shape[0], max_y, max_x)))
-        else:
-            thumbnail_resized = thumbnail_org.resize((max_x, max_y), Image.LANCZOS)
-        return thumbnail_resized
+        if icc_profile_intent is not None:
+            thumbnail = self.__apply_icc_profile(0, thumbnail, icc_profile_intent, icc_profile_strict)
+        return thumbnail
 
     async def get_label(self):
         self.__get_associated_image("label")
@@ -108,7 +199,7 @@ class Slide(BaseSlide):
         self.__get_associated_image("macro")
 
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0,
-                       icc_profile_intent: str = None, icc_profile_strict: bool = False):
+                       icc_profile_intent: str = None, icc_profile_strict: bool = False, channels=None):
         return await self.get_region(
             level,
             tile_x * self.slide_info.tile_extent.x,
@@ -119,13 +210,36 @@ class Slide(BaseSlide):
             0,
             icc_profile_intent,
             icc_profile_strict,
+            channels,
         )
 
     async def get_icc_profile(self):
-        return self._icc.get_for_payload(self.tif_slide.series[0].levels[0].pages[0].tags.get("ICCProfile", None))
+        return self._icc.get_for_payload(self.__get_page(0, 0).tags.get("ICCProfile", None))
 
     # private
 
+    def __apply_icc_profile(self, level, result, icc_profile_intent, icc_profile_strict):
+        try:
+            profile = self.__get_page(level, 0).tags.get("ICCProfile")
+            result_data = convert_narray_to_pil_image(narray=result)
+            return self._icc.process_pil_image(result_data, profile, icc_profile_strict, icc_profile_intent, True)
+        except ICCProfileError as e:
+            raise HTTPException(status_code=e.payload["status_code"], detail=e.payload["detail"]) from e
+
+    async def __get_thumbnail(self, max_x, max_y):
+        # the coarsest level still covering the thumbnail is reduced by block means in its own dtype,
+        # only the small remaining resize is interpolated
+        base_extent = self.slide_info.levels[0].extent
+        size_x, size_y = get_thumbnail_size(base_extent.x, base_extent.y, max_x, max_y)
+        thumb_level = 0
+        for i, level in enumerate(self.slide_info.levels):
+            if level.extent.x >= size_x and level.extent.y >= size_y:
+                thumb_level = i
+        level_extent = self.slide_info.levels[thumb_level].extent
+        level_array = await self.get_region(thumb_level, 0, 0, level_extent.x, level_extent.y, settings.padding_color)
+        factor = max(1, min(level_extent.x // size_x, level_extent.y // size_y))
+        return resize_image_array(get_block_mean(level_array, factor), size_x, size_y)
+
     def __get_associated_image(self, associated_image_name):
         raise HTTPException(
             status_code=404,
@@ -145,25 +259,71 @@ class Slide(BaseSlide):
             rgb_color = 0
         return rgb_color
 
-    def __get_tif_level_for_slide_level(self, slide_level):
-        for level in self.tif_slide.series[0].levels:
-            keyframe = level.keyframe
-            if keyframe.imagelength == slide_level.extent.y and keyframe.imagewidth == slide_level.extent.x:
-                return level
-        return None
-
-    def __assemble_region(self, tif_level, start_x, start_y, size_x, size_y, padding_color):
+    def __create_page_index(self):
+        # locations of the pages of all levels of the series, the parsed pages are kept
+        base_path = os.path.dirname(os.path.realpath(self.filepath))
+        files, page_files, page_offsets = [], [], []
+        for level, tif_level in enumerate(self.tif_slide.series[0].levels):
+            level_files, level_offsets = [], []
+            for index, page in enumerate(tif_level.pages):
+                file = os.path.relpath(page.parent.filehandle.path, base_path)
+                if file not in files:
+                    files.append(file)
+                level_files.append(files.index(file))
+                level_offsets.append(page.offset)
+                self.pages[(level, index)] = page
+            page_files.append(np.array(level_files, dtype=np.int32))
+            page_offsets.append(np.array(level_offsets, dtype=np.int64))
+        return PageIndex(self.slide_info, self.layout, files, page_files, page_offsets)
+
+    def __get_page_count(self, level):
+        return len(self.page_index.page_offsets[level])
+
+    def __get_page(self, level, index):
+        page = self.pages.get((level, index))
+        if page is None:
+            # pages of a level share the tags of their first page, the others only read their data locations
+            keyframe = self.__get_page(level, 0) if index > 0 else None
+            with self.locker:
+                page = self.pages.get((level, index))
+                if page is None:
+                    tiff_file = self.__get_tiff_file(self.page_index.files[self.page_index.page_files[level][index]])
+                    offset = int(self.page_index.page_offsets[level][index])
+                    if keyframe is None:
+                        tiff_file.filehandle.seek(offset)
+                        page = tifffile.TiffPage(tiff_file, index=index)
+                    else:
+                        page = tifffile.TiffFrame(tiff_file, index=index, offset=offset, keyframe=keyframe)
+                    self.pages[(level, index)] = page
+        return page
+
+    def __get_tiff_file(self, file):
+        # called with self.locker held
+        path = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(self.filepath)), file))
+        tiff_file = self.tiff_files.get(path)
+        if tiff_file is None:
+            try:
+                tiff_file = tifffile.TiffFile(path)
+            except Exception as e:
+                raise HTTPException(status_code=404, detail=f"Failed to load tiff file. [{e}]")
+            self.tiff_files[path] = tiff_file
+        return tiff_file
+
+    def __get_file_fingerprint(self, path):
+        fingerprint = self.file_fingerprints.get(path)
+        if fingerprint is None:
+            fingerprint = self.file_fingerprints.setdefault(path, get_file_fingerprint(path))
+        return fingerprint
+
+    def __assemble_region(self, level, start_x, start_y, size_x, size_y, padding_color, channels=None):
         if self.layout == _LAYOUT_CHUNKY_SAMPLES:
             # Single page holds all channels in the last axis (samplesperpixel).
-            page = tif_level.pages[0]
+            page = self.__get_page(level, 0)
             if not page.keyframe.is_tiled:
                 # __read_region_of_page_untiled allocates a 2-D (H, W) output and would crash
                 # when assigning the (H, W, S) slice from page.asarray(). Read directly here.
                 page_frame = page.keyframe
                 page_width, page_height = page_frame.imagewidth, page_frame.imagelength
-                page_array = page.asarray()
-                if page_array.ndim == 2:
-                    page_array = np.expand_dims(page_array, axis=-1)
                 new_height = page_height - start_y if (start_y + size_y > page_height) else size_y
                 new_width = page_width - start_x if (start_x + size_x > page_width) else size_x
                 S = page_frame.samplesperpixel
@@ -172,9 +332,13 @@ class Slide(BaseSlide):
                     fill_val = self.__get_color_for_channel(s, self.slide_info.channel_depth, padding_color)
                     out[s].fill(fill_val)
                 if new_height > 0 and new_width > 0:
-                    crop = page_array[start_y : start_y + new_height, start_x : start_x + new_width]
+                    # only the strips covering the requested rows are read
+                    page_rows = self.__read_rows_of_page(page, start_y, start_y + new_height)
+                    if page_rows.ndim == 2:
+                        page_rows = np.expand_dims(page_rows, axis=-1)
+                    crop = page_rows[:, start_x : start_x + new_width]
                     out[:, 0:new_height, 0:new_width] = np.moveaxis(crop, -1, 0)
-                return out
+                return self.__select_channels(out, channels)
 
             channel_data = self.__read_region_of_page(page, 0, start_y, start_x, size_y, size_x, padding_color)
             # channel_data shape from tiled path: (Z, H, W, S); from untiled path: (1, H, W, 1).
@@ -186,24 +350,30 @@ class Slide(BaseSlide):
             elif arr.ndim == 3:
                 # (Z, H, W) for an untiled single-sample read — shouldn't happen for chunky, but guard.
                 arr = arr[0:1]
-            return arr
+            return self.__select_channels(arr, channels)
 
         if self.layout == _LAYOUT_SINGLE_CHANNEL:
-            page = tif_level.pages[0]
+            page = self.__get_page(level, 0)
             channel_data = self.__read_region_of_page(page, 0, start_y, start_x, size_y, size_x, padding_color)
             arr = np.asarray(channel_data)
             # Drop trailing sample axis if present (== 1), keep leading Z axis as the single channel.
             if arr.ndim == 4:
                 arr = arr[:, :, :, 0]
-            return arr
+            return self.__select_channels(arr, channels)
 
-        # _LAYOUT_PAGE_PER_CHANNEL — original behavior, one page per channel.
+        # _LAYOUT_PAGE_PER_CHANNEL — one page per channel, only the pages of requested channels are read.
+        channel_indices = range(self.__get_page_count(level)) if channels is None else channels
         result_array = []
-        for i, page in enumerate(tif_level.pages):
+        for i in channel_indices:
+            page = self.__get_page(level, i)
             temp_channel = self.__read_region_of_page(page, i, start_y, start_x, size_y, size_x, padding_color)
             result_array.append(temp_channel)
         return np.concatenate(result_array, axis=0)[:, :, :, 0]
 
+    def __select_channels(self, arr, channels):
+        # channels stored in the same page are read together and selected afterwards
+        return arr if channels is None else arr[list(channels)]
+
     def __read_region_of_page(self, page, channel_index, start_x, start_y, size_x, size_y, padding_color):
         page_frame = page.keyframe
 
@@ -233,10 +403,10 @@ class Slide(BaseSlide):
     def __read_region_of_page_untiled(self, page, channel_index, start_x, start_y, size_x, size_y, padding_color):
         page_frame = page.keyframe
         page_width, page_height = page_frame.imagewidth, page_frame.imagelength
-        page_array = page.asarray()
 
         new_height = page_height - start_x if (start_x + size_x > page_height) else size_x
         new_width = page_width - start_y if (start_y + size_y > page_width) else size_y
+        page_rows = self.__read_rows_of_page(page, start_x, start_x + new_height)
 
         out = np.full(
             (size_x, size_y),
@@ -244,7 +414,7 @@ class Slide(BaseSlide):
             dtype=page_frame.dtype,
         )
 
-        out[0:new_height, 0:new_width] = page_array[start_x : start_x + new_height, start_y : start_y + new_width]
+        out[0:new_height, 0:new_width] = page_rows[:, start_y : start_y + new_width]
         return np.expand_dims(np.expand_dims(out, axis=0), axis=3)
 
     def __read_region_of_page_tiled(self, page, channel_index, start_x, start_y, size_x, size_y, padding_color):
@@ -279,6 +449,42 @@ class Slide(BaseSlide):
             self.__get_color_for_channel(channel_index, self.slide_info.channel_depth, padding_color),
             dtype=page_frame.dtype,
         )
+
+        def insert_tile(tile, position):
+            # insert tile in temporary output array
+            i, j = position
+            tile_position_i = (i - start_tile_x0) * tile_height
+            tile_position_j = (j - start_tile_y0) * tile_width
+            out[
+                :,
+                tile_position_i : tile_position_i + tile_height,
+                tile_position_j : tile_position_j + tile_width :,
+            ] = tile
+
+        tiles = [
+            (int(i * tile_per_line + j), (i, j))
+            for i in range(start_tile_x0, end_tile_xn)
+            for j in range(start_tile_y0, end_tile_yn)
+        ]
+        self.__read_segments(page, tiles, insert_tile)
+
+        # determine the new start positions of our region
+        new_start_x = start_x - start_tile_x0 * tile_height
+        new_start_y = start_y - start_tile_y0 * tile_width
+
+        # restrict the output array to the requested region
+        result = out[:, new_start_x : new_start_x + size_x, new_start_y : new_start_y + size_y :]
+        return result
+
+    def __read_segments(self, page, segments, insert_segment):
+        """
+        Reads and decodes segments (tiles or strips) of page given as (index, position) and calls
+        insert_segment(decoded_segment, position) for each of them. Empty segments are skipped.
+
+        Segments sharing data (e.g. sparse tiles) are only read once, segments found in the decoded
+        tile cache are not read at all. The data of the remaining segments is fetched with few
+        coalesced positional reads and decoded in parallel while the next ranges are read.
+        """
         fh = page.parent.filehandle
 
         if fh is None:
@@ -291,48 +497,98 @@ class Slide(BaseSlide):
         if jpegtables is not None:
             jpegtables = jpegtables.value
 
-        used_offsets = []
-        # iterate through tiles starting at the top left to the bottom right
-        for i in range(start_tile_x0, end_tile_xn):
-            for j in range(start_tile_y0, end_tile_yn):
-                with self.locker:
-                    index = int(i * tile_per_line + j)
-
-                    if len(page.dataoffsets) <= index:
-                        continue
-
-                    offset = page.dataoffsets[index]
-                    bytecount = page.databytecounts[index]
-
-                    if offset in used_offsets:
-                        continue
-
-                    used_offsets.append(offset)
-
-                    # search to tile offset and read image tile
-                    fh.seek(offset)
-                    if fh.tell() != offset:
-                        raise HTTPException(status_code=500, detail="Failed reading to tile offset")
-                    data = fh.read(bytecount)
-                    tile, _, _ = page.decode(data, index, jpegtables=jpegtables)
-
-                    # insert tile in temporary output array
-                    tile_position_i = (i - start_tile_x0) * tile_height
-                    tile_position_j = (j - start_tile_y0) * tile_width
-
-                    out[
-                        :,
-                        tile_position_i : tile_position_i + tile_height,
-                        tile_position_j : tile_position_j + tile_width :,
-                    ] = tile
-
-        # determine the new start positions of our region
-        new_start_x = start_x - start_tile_x0 * tile_height
-        new_start_y = start_y - start_tile_y0 * tile_width
+        fingerprint = self.__get_file_fingerprint(fh.path)
+
+        def get_cache_key(index):
+            return (fh.path, fingerprint, page.offset, index)
+
+        def decode_segment(data, index, position):
+            segment, _, _ = page.decode(data, index, jpegtables=jpegtables)
+            if segment is None:
+                # empty segment, keep padding
+                return
+            if decoded_tile_cache.enabled:
+                decoded_tile_cache.put(get_cache_key(index), segment)
+            insert_segment(segment, position)
+
+        planned_segments = []
+        used_offsets = set()
+        for index, position in segments:
+            if len(page.dataoffsets) <= index:
+                continue
+            offset = page.dataoffsets[index]
+            if offset in used_offsets:
+                continue
+            used_offsets.add(offset)
+            if decoded_tile_cache.enabled:
+                segment = decoded_tile_cache.get(get_cache_key(index))
+                if segment is not None:
+                    insert_segment(segment, position)
+                    continue
+            planned_segments.append((offset, page.databytecounts[index], index, position))
+
+        reader = self.__get_reader(fh)
+        decode_executor = _get_decode_executor() if len(planned_segments) > 1 else None
+        futures = []
+        try:
+            for read_offset, read_length, read_segments in get_coalesced_reads(planned_segments):
+                data = reader.read(read_offset, read_length)
+                if len(data) != read_length:
+                    raise HTTPException(status_code=500, detail="Failed reading tiles, unexpected end of file")
+                for offset, bytecount, index, position in read_segments:
+                    segment_data = data[offset - read_offset : offset - read_offset + bytecount]
+                    if decode_executor is None:
+                        decode_segment(segment_data, index, position)
+                    else:
+                        futures.append(decode_executor.submit(decode_segment, segment_data, index, position))
+        finally:
+            # decodes still write into the output, wait for all of them even if a read failed
+            wait(futures)
+        for future in futures:
+            future.result()
+
+    def __read_rows_of_page(self, page, first_row, last_row):
+        """
+        Returns rows like page.asarray()[first_row:last_row] for untiled pages, only the strips
+        intersecting these rows are read and decoded.
+        """
+        page_frame = page.keyframe
+        page_height = page_frame.imagelength
+        samples = page_frame.samplesperpixel
+        rows = range(page_height)[first_row:last_row]
+        if page_frame.imagedepth > 1 or (page_frame.planarconfig == 2 and samples > 1):
+            # volumes and separately stored samples are decoded as a whole
+            return page.asarray()[first_row:last_row]
+        if len(rows) == 0:
+            # e.g. padding below the last row
+            return np.empty((0, page_frame.imagewidth) + ((samples,) if samples > 1 else ()), dtype=page_frame.dtype)
+
+        rows_per_strip = min(page_frame.rowsperstrip or page_height, page_height)
+        first_strip = rows.start // rows_per_strip
+        last_strip = -(-rows.stop // rows_per_strip)
+        out = np.zeros(
+            ((last_strip - first_strip) * rows_per_strip, page_frame.imagewidth, samples), dtype=page_frame.dtype
+        )
 
-        # restrict the output array to the requested region
-        result = out[:, new_start_x : new_start_x + size_x, new_start_y : new_start_y + size_y :]
-        return result
+        def insert_strip(strip, strip_index):
+            strip_position = (strip_index - first_strip) * rows_per_strip
+            out[strip_position : strip_position + strip.shape[1]] = strip[0]
+
+        strips = [(strip_index, strip_index) for strip_index in range(first_strip, last_strip)]
+        self.__read_segments(page, strips, insert_strip)
+        result = out[rows.start - first_strip * rows_per_strip : rows.stop - first_strip * rows_per_strip]
+        return result[:, :, 0] if samples == 1 else result
+
+    def __get_reader(self, fh):
+        reader = self.readers.get(fh.path)
+        if reader is None:
+            # only opening readers is synchronized, reads are positional and need no lock
+            with self.locker:
+                reader = self.readers.get(fh.path)
+                if reader is None:
+                    reader = PositionalFileReader(fh.path)
+                    self.readers[fh.path] = reader
+        return reader
 
     def __get_levels_from_series(self, tif_slide):
         levels = tif_slide.series[0].levels
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from wsi_service_plugin_tifffile import slide as slide_module
+from wsi_service_plugin_tifffile.page_index import PageIndexStore
+from wsi_service_plugin_tifffile.slide import Slide
+
+
+def write_pyramid(path, data):
+    metadata = {
+        "axes": "CYX",
+        "Channel": {"Name": [f"c{i}" for i in range(len(data))], "Color": [-1] * len(data)},
+        "PhysicalSizeX": 0.5,
+        "PhysicalSizeY": 0.5,
+        "PhysicalSizeXUnit": "µm",
+        "PhysicalSizeYUnit": "µm",
+    }
+    with tifffile.TiffWriter(path, ome=True) as tif:
+        tif.write(data, subifds=1, tile=(128, 128), compression="zlib", metadata=metadata)
+        tif.write(data[:, ::2, ::2], subfiletype=1, tile=(128, 128), compression="zlib")
+
+
+@pytest.mark.asyncio
+async def test_later_opens_use_the_page_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(slide_module, "_page_index_store", PageIndexStore(str(tmp_path / "index")))
+    path = str(tmp_path / "pyramid.ome.tif")
+    data = np.random.default_rng(0).integers(0, 255, (4, 512, 384), dtype=np.uint8)
+    write_pyramid(path, data)
+
+    slide = await Slide.create(path)
+    info = await slide.get_info()
+    await slide.close()
+    assert len(os.listdir(tmp_path / "index")) == 1
+
+    slide = await Slide.create(path)
+    # neither the series nor the OME-XML are parsed
+    assert "series" not in slide.tif_slide.__dict__
+    assert not hasattr(slide, "parsed_metadata")
+    assert await slide.get_info() == info
+    region = await slide.get_region(1, 64, 32, 100, 150, channels=[3, 1])
+    assert np.array_equal(region, data[[3, 1], ::2, ::2][:, 32:182, 64:164])
+    await slide.close()
+
+    # changed files get a new index
+    write_pyramid(path, data[:3])
+    slide = await Slide.create(path)
+    assert len((await slide.get_info()).channels) == 3
+    await slide.close()
+    assert len(os.listdir(tmp_path / "index")) == 2
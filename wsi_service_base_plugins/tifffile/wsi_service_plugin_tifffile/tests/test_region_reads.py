@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+import tifffile
+
+from wsi_service.utils.app_utils import get_channel_selection, make_response
+from wsi_service_plugin_tifffile import slide as slide_module
+from wsi_service_plugin_tifffile.decoded_tile_cache import DecodedTileCache
+from wsi_service_plugin_tifffile.slide import Slide, get_block_mean, get_coalesced_reads
+
+
+def get_ome_metadata(channels):
+    return {
+        "axes": "CYX",
+        "Channel": {"Name": [f"c{i}" for i in range(channels)], "Color": [-1] * channels},
+        "PhysicalSizeX": 0.5,
+        "PhysicalSizeY": 0.5,
+        "PhysicalSizeXUnit": "µm",
+        "PhysicalSizeYUnit": "µm",
+    }
+
+
+def test_nearby_segments_are_coalesced():
+    segments = [(100, 10, "c"), (0, 50, "a"), (60, 10, "b"), (1000, 5, "d")]
+    reads = get_coalesced_reads(segments, max_gap=20, max_size=200)
+    assert reads == [
+        (0, 70, [(0, 50, "a"), (60, 10, "b")]),
+        (100, 10, [(100, 10, "c")]),
+        (1000, 5, [(1000, 5, "d")]),
+    ]
+    # reads are split at max_size
+    assert len(get_coalesced_reads(segments, max_gap=1000, max_size=110)) == 2
+
+
+@pytest.mark.asyncio
+async def test_region_of_tiled_multichannel_tiff(tmp_path):
+    path = str(tmp_path / "multichannel.tif")
+    data = np.random.default_rng(0).integers(0, 255, (1024, 768, 3), dtype=np.uint8)
+    tifffile.imwrite(path, data, tile=(128, 128), compression="zlib", photometric="minisblack", planarconfig="contig")
+    slide = await Slide.create(path)
+    region = await slide.get_region(0, 100, 300, 500, 600)
+    assert region.shape == (3, 600, 500)
+    assert np.array_equal(region, np.moveaxis(data[300:900, 100:600], -1, 0))
+    await slide.close()
+
+
+@pytest.mark.asyncio
+async def test_overlapping_regions_use_decoded_tiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(slide_module, "decoded_tile_cache", DecodedTileCache(10_000_000))
+    path = str(tmp_path / "multichannel.tif")
+    data = np.random.default_rng(0).integers(0, 255, (512, 512, 2), dtype=np.uint8)
+    tifffile.imwrite(path, data, tile=(128, 128), compression="zlib", photometric="minisblack", planarconfig="contig")
+    slide = await Slide.create(path)
+    cache = slide_module.decoded_tile_cache
+
+    await slide.get_region(0, 0, 0, 256, 256)
+    assert (cache.hits, cache.misses) == (0, 4)
+    # shares two tiles with the first region
+    region = await slide.get_region(0, 128, 0, 256, 256)
+    assert (cache.hits, cache.misses) == (2, 6)
+    assert np.array_equal(region, np.moveaxis(data[0:256, 128:384], -1, 0))
+    await slide.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("image_format", ["png", "tiff"])
+@pytest.mark.parametrize("image_channels", [None, [4], [5, 1], [2, 0, 3], [0, 1, 2, 3, 4, 5]])
+async def test_only_requested_channels_are_read(tmp_path, monkeypatch, image_format, image_channels):
+    monkeypatch.setattr(slide_module, "decoded_tile_cache", DecodedTileCache(10_000_000))
+    path = str(tmp_path / "multichannel.ome.tif")
+    data = np.random.default_rng(0).integers(0, 255, (6, 256, 256), dtype=np.uint8)
+    tifffile.imwrite(path, data, tile=(128, 128), compression="zlib", metadata=get_ome_metadata(6), ome=True)
+    slide = await Slide.create(path)
+    info = await slide.get_info()
+    expected = make_response(slide, await slide.get_region(0, 0, 0, 128, 128), image_format, 100, image_channels)
+
+    cache = slide_module.decoded_tile_cache
+    # one tile lookup per page read
+    lookups = cache.hits + cache.misses
+    read_channels, response_channels = get_channel_selection(slide, info, image_channels, image_format)
+    region = await slide.get_region(0, 0, 0, 128, 128, channels=read_channels)
+    response = make_response(slide, region, image_format, 100, response_channels)
+    assert response.body == expected.body
+    assert cache.hits + cache.misses - lookups == (6 if read_channels is None else len(read_channels))
+    await slide.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("samples", [1, 3])
+async def test_only_intersecting_strips_are_read(tmp_path, monkeypatch, samples):
+    monkeypatch.setattr(slide_module, "decoded_tile_cache", DecodedTileCache(10_000_000))
+    path = str(tmp_path / "stripped.tif")
+    shape = (500, 300) if samples == 1 else (500, 300, samples)
+    data = np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)
+    tifffile.imwrite(path, data, rowsperstrip=16, compression="zlib", photometric="minisblack", planarconfig="contig")
+    slide = await Slide.create(path)
+    cache = slide_module.decoded_tile_cache
+
+    def as_region(array):
+        return np.moveaxis(array.reshape(array.shape[:2] + (samples,)), -1, 0)
+
+    region = await slide.get_region(0, 50, 100, 200, 40)
+    # rows 100 to 139 are stored in strips 6 to 8
+    assert cache.misses == 3
+    assert np.array_equal(region, as_region(data[100:140, 50:250]))
+
+    # region crossing the last, shorter strip
+    region = await slide.get_region(0, 0, 480, 300, 40)
+    assert np.array_equal(region[:, :20], as_region(data[480:]))
+
+    # regions below the last row are padding only and read nothing
+    def asarray(*args, **kwargs):
+        raise AssertionError("page decoded as a whole")
+
+    monkeypatch.setattr(tifffile.TiffPage, "asarray", asarray)
+    misses = cache.misses
+    region = await slide.get_region(0, 0, 500, 300, 40)
+    assert region.shape == (samples, 40, 300)
+    assert cache.misses == misses
+    await slide.close()
+
+
+def test_block_mean_keeps_dtype():
+    array = np.arange(2 * 4 * 6, dtype=np.uint16).reshape(2, 4, 6)
+    reduced = get_block_mean(array, 2)
+    assert reduced.dtype == np.uint16
+    assert reduced.shape == (2, 2, 3)
+    assert np.array_equal(reduced, np.rint(array.reshape(2, 2, 2, 3, 2).mean(axis=(2, 4))))
+
+
+@pytest.mark.asyncio
+async def test_thumbnail_is_computed_once_from_coarse_level(tmp_path, monkeypatch):
+    path = str(tmp_path / "pyramid.ome.tif")
+    data = np.random.default_rng(0).integers(0, 255, (3, 2048, 1024), dtype=np.uint8)
+    with tifffile.TiffWriter(path, ome=True) as tif:
+        tif.write(data, subifds=1, tile=(256, 256), metadata=get_ome_metadata(3))
+        tif.write(data[:, ::4, ::4], subfiletype=1, tile=(256, 256))
+    slide = await Slide.create(path)
+    assert [level.extent.x for level in (await slide.get_info()).levels] == [1024, 256]
+
+    read_levels = []
+    get_region = slide.get_region
+
+    async def get_region_spy(level, *args, **kwargs):
+        read_levels.append(level)
+        return await get_region(level, *args, **kwargs)
+
+    monkeypatch.setattr(slide, "get_region", get_region_spy)
+    thumbnail = await slide.get_thumbnail(100, 100)
+    assert thumbnail.dtype == np.uint8
+    assert thumbnail.shape == (3, 100, 50)
+    thumbnail = await slide.get_thumbnail(30, 40)
+    assert thumbnail.shape == (3, 40, 20)
+    # the coarse level covers the cached 250 x 500 thumbnail and is only read once
+    assert read_levels == [1]
+    assert slide.thumbnail.shape == (3, 500, 250)
+    await slide.close()
+
+
+@pytest.mark.asyncio
+async def test_decoded_tiles_of_multi_file_series_are_kept_apart(tmp_path, monkeypatch):
+    monkeypatch.setattr(slide_module, "decoded_tile_cache", DecodedTileCache(10_000_000))
+    tiff_data = "".join(
+        f'<TiffData FirstC="{c}" IFD="0" PlaneCount="1"><UUID FileName="c{c}.ome.tif">urn:uuid:{c}</UUID></TiffData>'
+        for c in range(2)
+    )
+    ome_xml = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<OME xmlns="http://www.openmicroscopy.org/Schemas/OME/2016-06" UUID="urn:uuid:0">'
+        '<Image ID="Image:0"><Pixels ID="Pixels:0" DimensionOrder="XYCZT" Type="uint8" SizeX="256" SizeY="256" '
+        'SizeC="2" SizeZ="1" SizeT="1" PhysicalSizeX="500" PhysicalSizeY="500" PhysicalSizeXUnit="nm" '
+        'PhysicalSizeYUnit="nm"><Channel ID="Channel:0:0" Name="c0" Color="-1" SamplesPerPixel="1"/>'
+        '<Channel ID="Channel:0:1" Name="c1" Color="-1" SamplesPerPixel="1"/>'
+        f"{tiff_data}</Pixels></Image></OME>"
+    )
+    # the first IFDs of both files are at the same offset
+    for c, value in enumerate([10, 200]):
+        description = ome_xml if c == 0 else None
+        data = np.full((256, 256), value, dtype=np.uint8)
+        tifffile.imwrite(str(tmp_path / f"c{c}.ome.tif"), data, tile=(128, 128), description=description, metadata=None)
+    slide = await Slide.create(str(tmp_path / "c0.ome.tif"))
+    assert np.all(await slide.get_region(0, 0, 0, 128, 128, channels=[0]) == 10)
+    assert np.all(await slide.get_region(0, 0, 0, 128, 128, channels=[1]) == 200)
+    await slide.close()
@@ -1,13 +1,14 @@
-import os
 import pathlib
 
 from wsi_service_plugin_tiffslide.slide import Slide
 
+from wsi_service.utils.sniff_utils import get_file_sniff
+
 priority = 1
 
 
 def is_supported(filepath):
-    if os.path.isfile(filepath):
+    if get_file_sniff(filepath).is_file:
         filename = pathlib.Path(filepath).name
         suffix = pathlib.Path(filepath).suffix
         if filename.endswith("ome.tif") or filename.endswith("ome.tiff"):
@@ -6,7 +6,8 @@ from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import settings
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.icc_profile import ICCProfile, ICCProfileError
-from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
+from wsi_service.utils.image_utils import check_complete_tile_overlap, rgba_to_rgb_with_background_color
+from wsi_service.utils.io_utils import PositionalFileReader
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list, get_tile_width
 
 
@@ -18,8 +19,11 @@ class Slide(BaseSlide):
         await self.open_slide()
         self.format = self.slide.detect_format(self.filepath)
         self.slide_info = self.__get_slide_info()
-        self.is_jpeg_compression = self.__is_jpeg_compression()
-        self.color_transform = self.__get_color_transform()
+        # pages whose jpeg tiles can be returned without decoding, per slide level
+        self.raw_tile_pages = [self.__get_raw_tile_page(level) for level in range(len(self.slide_info.levels))]
+        # reads of tifffile share one file handle and need its lock, raw tiles are read positionally without it
+        self.slide._tifffile.filehandle.set_lock(True)
+        self.reader = PositionalFileReader(self.slide._tifffile.filehandle.path)
         self._icc = ICCProfile()
 
     async def open_slide(self):
@@ -29,6 +33,7 @@ class Slide(BaseSlide):
             raise HTTPException(status_code=500, detail=f"TiffFileError: {e}")
 
     async def close(self):
+        self.reader.close()
         self.slide.close()
         self._icc.free_cache()
 
@@ -78,27 +83,16 @@ class Slide(BaseSlide):
         return self.__get_associated_image("macro", icc_profile_intent, icc_profile_strict)
 
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0, icc_profile_intent: str = None, icc_profile_strict: bool = False):
-        # todo: this returns padded tile with black colors
-        # if self.is_jpeg_compression:
-        #     tif_level = self.__get_tif_level_for_slide_level(level)
-        #     page = tif_level.pages[0]
-        #     tile_data = await self.__read_raw_tile(page, tile_x, tile_y)
-        #     self.__add_jpeg_headers(page, tile_data, self.color_transform)
-        #     if icc_profile_intent is not None:
-        #         try:
-        #             profile = self.slide._profile
-        #             img = Image.open(io.BytesIO(tile_data))
-        #             img = self._icc.process_pil_image(
-        #                 img, profile, icc_profile_strict, icc_profile_intent, True
-        #             )
-        #             img_byte_array = io.BytesIO()
-        #             img.save(img_byte_array)
-        #             tile_data = img_byte_array.getvalue()
-        #
-        #         except ICCProfileError as e:
-        #             raise HTTPException(status_code=e.payload["status_code"], detail=e.payload["detail"]) from e
-        #     return bytes(tile_data)
-        #else:
+        # interior jpeg tiles are returned as stored in the file, edge tiles are cropped and
+        # color managed tiles are transformed by get_region
+        page = self.raw_tile_pages[level]
+        if page is not None and icc_profile_intent is None and z == 0:
+            if check_complete_tile_overlap(self.slide_info, level, tile_x, tile_y):
+                tile_data = self.__read_raw_tile(page, tile_x, tile_y)
+                if tile_data is not None:
+                    self.__add_jpeg_headers(page, tile_data, self.__get_color_transform(page))
+                    return bytes(tile_data)
+
         tile_width, tile_height = get_tile_width(self.slide_info, level, tile_x, tile_y)
 
         return await self.get_region(
@@ -230,34 +224,49 @@ class Slide(BaseSlide):
             best_level += 1
         return best_level - 1
 
-    def __is_jpeg_compression(self):
-        tif_level = self.__get_tif_level_for_slide_level(0)
+    def __get_raw_tile_page(self, level):
+        tif_level = self.__get_tif_level_for_slide_level(level)
+        if tif_level is None:
+            return None
         page = tif_level.pages[0]
-        return page.jpegtables is not None
+        if (
+            not page.is_tiled
+            or not self.__is_jpeg_compression(page)
+            or page.tilewidth != self.slide_info.tile_extent.x
+            or page.tilelength != self.slide_info.tile_extent.y
+            or page.planarconfig != 1
+            or page.samplesperpixel != 3
+            or page.photometric not in (2, 6)
+        ):
+            return None
+        return page
 
-    def __get_color_transform(self):
-        tif_level = self.__get_tif_level_for_slide_level(0)
-        page = tif_level.pages[0]
+    def __is_jpeg_compression(self, page):
+        return page.compression == 7
+
+    def __get_color_transform(self, page):
         color_transform = "Unknown"
         if page.photometric == 6:
             color_transform = "YCbCr"
         return color_transform
 
-    async def __read_raw_tile(self, page, tile_x, tile_y):
+    def __read_raw_tile(self, page, tile_x, tile_y):
         image_width = page.keyframe.imagewidth
         tile_width = page.keyframe.tilewidth
         tile_per_line = int(np.ceil(image_width / tile_width))
         index = int(tile_y * tile_per_line + tile_x)
+        if index >= len(page.dataoffsets) or page.databytecounts[index] == 0:
+            # missing tile
+            return None
         offset = page.dataoffsets[index]
         bytecount = page.databytecounts[index]
-        self.slide._tifffile.filehandle.seek(offset)
-        data = self.slide._tifffile.filehandle.read(bytecount)
-        return bytearray(data)
+        return bytearray(self.reader.read(offset, bytecount))
 
     def __add_jpeg_headers(self, page, data, color_transform):
         # add jpeg tables
         pos = data.find(b"\xFF\xDA")
-        data[pos:pos] = page.jpegtables[2:-2]
+        if page.jpegtables is not None:
+            data[pos:pos] = page.jpegtables[2:-2]
         # check missing huffman tables
         if data.find(b"\xFF\xC4") < 0:
             data[pos:pos] = self.__get_default_huffman_tables()
@@ -0,0 +1,39 @@
+import os
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from wsi_service.plugins import load_slide
+
+slide_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "../../../../wsi_service/tests/unit/data/testcase/CMU-1-small.tiff",
+)
+
+
+@pytest.mark.asyncio
+async def test_get_tile_returns_raw_jpeg_for_interior_tiles():
+    slide = await load_slide(slide_path, plugin="tiffslide")
+    try:
+        tile = await slide.get_tile(0, 1, 0)
+        assert isinstance(tile, bytes)
+        assert tile[:2] == b"\xff\xd8"
+        region = await slide.get_region(0, 256, 0, 256, 256)
+        assert np.array_equal(np.asarray(Image.open(BytesIO(tile)).convert("RGB")), np.asarray(region))
+        # color managed tiles are decoded and transformed
+        assert not isinstance(await slide.get_tile(0, 1, 0, icc_profile_intent="perceptual"), bytes)
+    finally:
+        await slide.close()
+
+
+@pytest.mark.asyncio
+async def test_get_tile_crops_edge_tiles():
+    slide = await load_slide(slide_path, plugin="tiffslide")
+    try:
+        edge_tile = await slide.get_tile(0, 2, 1)
+        assert isinstance(edge_tile, Image.Image)
+        assert edge_tile.size == (718 - 512, 256)
+    finally:
+        await slide.close()
@@ -1,14 +1,14 @@
-import os
-import pathlib
-
 from wsi_service_plugin_wsidicom.slide import Slide
 
+from wsi_service.utils.sniff_utils import get_file_sniff
+
 
 def is_supported(filepath):
-    if os.path.isfile(filepath):
+    sniff = get_file_sniff(filepath)
+    if sniff.is_file:
         return False
     else:
-        return any(pathlib.Path(filepath).glob("*.dcm"))
+        return ".dcm" in sniff.get_folder_suffixes()
 
 
 async def open(filepath):
@@ -1,4 +1,5 @@
 from fastapi import HTTPException
+from pydicom.uid import JPEGBaseline8Bit
 from wsidicom import WsiDicom
 from wsidicom.errors import WsiDicomNotFoundError
 
@@ -6,7 +7,7 @@ from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import settings
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.icc_profile import ICCProfile, ICCProfileError
-from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
+from wsi_service.utils.image_utils import check_complete_tile_overlap, rgba_to_rgb_with_background_color
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
 
 
@@ -15,6 +16,8 @@ class Slide(BaseSlide):
         self.filepath = filepath
         await self.open_slide()
         self.slide_info = self.__get_slide_info_dicom()
+        # levels whose frames can be returned without decoding
+        self.encoded_tile_levels = [self.__has_passthrough_frames(level) for level in self.dicom_slide.levels]
         self._icc = ICCProfile()
         self._profile_data = False
 
@@ -90,6 +93,15 @@ class Slide(BaseSlide):
                        icc_profile_intent: str = None, icc_profile_strict: bool = False):
         try:
             level_dicom = self.dicom_slide.levels[level].level
+            # interior baseline jpeg frames are returned as stored, edge frames are padded to the
+            # tile size in the file and are decoded like all other frames
+            if (
+                self.encoded_tile_levels[level]
+                and icc_profile_intent is None
+                and z == 0
+                and check_complete_tile_overlap(self.slide_info, level, tile_x, tile_y)
+            ):
+                return self.dicom_slide.read_encoded_tile(level_dicom, (tile_x, tile_y))
             tile = self.dicom_slide.read_tile(level_dicom, (tile_x, tile_y))
             if icc_profile_intent is not None:
 
@@ -125,6 +137,17 @@ class Slide(BaseSlide):
         )
         return original_levels
 
+    def __has_passthrough_frames(self, level):
+        image_data = level.default_instance.image_data
+        return (
+            image_data.transfer_syntax == JPEGBaseline8Bit
+            # jpeg decoders expect YCbCr, frames stored as RGB would be displayed with wrong colors
+            and image_data.photometric_interpretation in ("YBR_FULL_422", "YBR_FULL")
+            and image_data.samples_per_pixel == 3
+            and level.tile_size.width == self.slide_info.tile_extent.x
+            and level.tile_size.height == self.slide_info.tile_extent.y
+        )
+
     def __get_pixel_size(self):
         mpp = self.dicom_slide.levels[0].mpp
         return SlidePixelSizeNm(x=1000.0 * mpp.width, y=1000.0 * mpp.height)
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+import wsi_service_plugin_wsidicom.slide as slide_module
+from PIL import Image
+from pydicom.uid import JPEG2000, JPEGBaseline8Bit
+from wsi_service_plugin_wsidicom.slide import Slide
+
+ENCODED_FRAME = b"\xff\xd8 stored frame \xff\xd9"
+
+
+class DummyDicomSlide:
+    def __init__(self, transfer_syntax=JPEGBaseline8Bit, photometric_interpretation="YBR_FULL_422"):
+        image_data = SimpleNamespace(
+            transfer_syntax=transfer_syntax,
+            photometric_interpretation=photometric_interpretation,
+            samples_per_pixel=3,
+        )
+        self.levels = [
+            SimpleNamespace(
+                level=0,
+                # the last column and row of frames only partially cover the image
+                size=SimpleNamespace(width=1000, height=700, to_tuple=lambda: (1000, 700)),
+                tile_size=SimpleNamespace(width=256, height=256),
+                mpp=SimpleNamespace(width=0.25, height=0.25),
+                default_instance=SimpleNamespace(image_data=image_data),
+            )
+        ]
+        self.metadata = SimpleNamespace(optical_paths=[SimpleNamespace(icc_profile=b"icc")])
+        self.encoded_reads = []
+        self.decoded_reads = []
+
+    def read_encoded_tile(self, level, tile):
+        self.encoded_reads.append(tile)
+        return ENCODED_FRAME
+
+    def read_tile(self, level, tile):
+        self.decoded_reads.append(tile)
+        return Image.new("RGB", (256, 256), (10, 20, 30))
+
+    def close(self):
+        pass
+
+
+class DummyICC:
+    def __init__(self):
+        self.calls = 0
+
+    def process_pil_image(self, image, icc_bytes, strict, intent, keep_alpha):
+        self.calls += 1
+        return image
+
+
+async def open_slide(monkeypatch, dicom_slide):
+    monkeypatch.setattr(slide_module.WsiDicom, "open", lambda filepath: dicom_slide)
+    slide = Slide()
+    await slide.open("slide.dcm")
+    return slide
+
+
+@pytest.mark.asyncio
+async def test_interior_baseline_jpeg_frames_are_returned_as_stored(monkeypatch):
+    dicom_slide = DummyDicomSlide()
+    slide = await open_slide(monkeypatch, dicom_slide)
+    assert await slide.get_tile(0, 1, 1) == ENCODED_FRAME
+    assert dicom_slide.encoded_reads == [(1, 1)]
+    assert dicom_slide.decoded_reads == []
+
+
+@pytest.mark.asyncio
+async def test_edge_frames_are_decoded(monkeypatch):
+    dicom_slide = DummyDicomSlide()
+    slide = await open_slide(monkeypatch, dicom_slide)
+    for tile in [(3, 0), (0, 2), (3, 2)]:
+        assert isinstance(await slide.get_tile(0, *tile, padding_color=(255, 255, 255)), Image.Image)
+    assert dicom_slide.encoded_reads == []
+    assert dicom_slide.decoded_reads == [(3, 0), (0, 2), (3, 2)]
+
+
+@pytest.mark.parametrize(
+    "transfer_syntax, photometric_interpretation",
+    [(JPEGBaseline8Bit, "RGB"), (JPEG2000, "YBR_ICT")],
+)
+@pytest.mark.asyncio
+async def test_frames_not_stored_as_baseline_ycbcr_jpeg_are_decoded(
+    monkeypatch, transfer_syntax, photometric_interpretation
+):
+    dicom_slide = DummyDicomSlide(transfer_syntax, photometric_interpretation)
+    slide = await open_slide(monkeypatch, dicom_slide)
+    assert isinstance(await slide.get_tile(0, 1, 1, padding_color=(255, 255, 255)), Image.Image)
+    assert dicom_slide.encoded_reads == []
+    assert dicom_slide.decoded_reads == [(1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_frames_are_decoded_for_icc_requests(monkeypatch):
+    dicom_slide = DummyDicomSlide()
+    slide = await open_slide(monkeypatch, dicom_slide)
+    slide._icc = DummyICC()
+    tile = await slide.get_tile(0, 1, 1, padding_color=(255, 255, 255), icc_profile_intent="perceptual")
+    assert isinstance(tile, Image.Image)
+    assert slide._icc.calls == 1
+    assert dicom_slide.encoded_reads == []
+    assert dicom_slide.decoded_reads == [(1, 1)]